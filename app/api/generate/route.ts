@@ -1,7 +1,42 @@
+import { createHash } from "crypto";
 import { NextRequest, NextResponse } from "next/server";
 
 const BACKEND_URL = process.env.BACKEND_URL || "http://localhost:8000";
 
+// The backend's dataset id is the sha256 of the workbook file
+async function datasetId(file: File): Promise<string> {
+  const bytes = Buffer.from(await file.arrayBuffer());
+  return createHash("sha256").update(bytes).digest("hex");
+}
+
+async function generateWithDataset(template: File, id: string): Promise<Response> {
+  const formData = new FormData();
+  formData.append("template", template);
+  formData.append("dataset_id", id);
+  return fetch(`${BACKEND_URL}/generate`, { method: "POST", body: formData });
+}
+
+// Generate from the stored dataset; the workbook is uploaded to /datasets only
+// when the backend does not have it yet. Returns null when datasets are not
+// available (then the workbook is sent with the request as before).
+async function generateFromDataset(template: File, excel: File): Promise<Response | null> {
+  const id = await datasetId(excel);
+  let response = await generateWithDataset(template, id);
+  if (response.status !== 404) {
+    return response;
+  }
+  console.log(`[API] Dataset ${id.slice(0, 12)} not stored, uploading workbook`);
+  const upload = new FormData();
+  upload.append("excel", excel);
+  const stored = await fetch(`${BACKEND_URL}/datasets`, { method: "POST", body: upload });
+  if (!stored.ok) {
+    console.log(`[API] Dataset upload failed (${stored.status}), sending the workbook instead`);
+    return null;
+  }
+  response = await generateWithDataset(template, id);
+  return response.status === 404 ? null : response;
+}
+
 export async function POST(request: NextRequest) {
   console.log("[API] Received POST request to /api/generate");
   
@@ -25,16 +60,19 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    // Forward the files to the Python backend
+    // Forward to the Python backend, reusing the stored dataset of this workbook
     console.log(`[API] Forwarding to backend: ${BACKEND_URL}/generate`);
-    const backendFormData = new FormData();
-    backendFormData.append("template", template);
-    backendFormData.append("excel", excel);
+    let response = await generateFromDataset(template, excel);
+    if (response === null) {
+      const backendFormData = new FormData();
+      backendFormData.append("template", template);
+      backendFormData.append("excel", excel);
 
-    const response = await fetch(`${BACKEND_URL}/generate`, {
-      method: "POST",
-      body: backendFormData,
-    });
+      response = await fetch(`${BACKEND_URL}/generate`, {
+        method: "POST",
+        body: backendFormData,
+      });
+    }
 
     console.log(`[API] Backend response status: ${response.status}`);
 
@@ -0,0 +1,338 @@
+"""
+Admission control: a per-process memory budget for generations.
+
+Before a generation starts, its memory cost is estimated from the template's
+ZIP directory (XML and media bytes, part count) and the workbook's
+dimensions, and `admit()` reserves that much of ADMISSION_BUDGET_MB. When the
+budget is taken the request waits, first come first served, and is rejected
+with `AdmissionRejected` (HTTP 503 + Retry-After) when ADMISSION_MAX_QUEUE
+requests are already waiting or it has waited ADMISSION_MAX_WAIT seconds.
+A request estimated above the whole budget is admitted alone, once nothing
+else is running. Latency under load then grows by queueing instead of the
+worker being killed for running out of memory.
+
+While admitted work runs, a sampler thread reads the process RSS every
+ADMISSION_SAMPLE_MS and records each request's peak growth next to its
+estimate (ppt_request_memory_bytes in /metrics), so the estimate can be
+checked against reality. Decisions, wait times, reserved bytes and the
+queue length are in /metrics too, and `stats()` is reported by /health.
+
+Cost model (calibrated on 30 KB - 40 MB decks, see `estimate`):
+- python-pptx fill, or any request compiling a template not yet cached:
+  ~4.5x the media bytes (package bytes, part blobs, compiled copy, output)
+  plus ~25x the XML bytes (lxml trees); the one-deck-per-dataset output
+  adds the slide XML bytes once more per extra copy
+- ooxml fill of a cached template: ~1x media plus ~12x XML
+- workbook: loaded cells x ~200 bytes
+
+Settings (env):
+- ADMISSION_BUDGET_MB: memory budget for concurrent generations; 0 disables (default 512)
+- ADMISSION_MAX_QUEUE: requests allowed to wait (default 8)
+- ADMISSION_MAX_WAIT: seconds a request may wait before it is rejected (default 30)
+- ADMISSION_SAMPLE_MS: RSS sampling interval; 0 disables sampling (default 50)
+"""
+
+import os
+import re
+import threading
+import time
+import zipfile
+from collections import deque
+from typing import NamedTuple
+
+import metrics
+from logs import get_logger
+
+log = get_logger("admission")
+
+MB = 1024 * 1024
+BASE_COST = 4 * MB
+PPTX_MEDIA_FACTOR = 4.5
+PPTX_XML_FACTOR = 25
+OOXML_MEDIA_FACTOR = 1.0
+OOXML_XML_FACTOR = 12
+CELL_BYTES = 200
+_XML_SUFFIXES = (".xml", ".rels")
+_SLIDE_PART = re.compile(r"ppt/slides/(_rels/)?slide\d+\.xml(\.rels)?$")
+
+
+class AdmissionRejected(Exception):
+    """The request could not get memory in time; retry later."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# ---------- Estimate ----------
+class TemplateInfo(NamedTuple):
+    size: int  # package bytes
+    xml_bytes: int  # uncompressed XML parts
+    media_bytes: int  # uncompressed other parts (images, media, embeddings)
+    parts: int
+    slide_xml_bytes: int = 0  # uncompressed slide parts and their rels (included in xml_bytes)
+
+
+def template_info(source) -> TemplateInfo:
+    """Read the sizes of a template's parts from its ZIP directory (bytes or seekable stream)."""
+    from io import BytesIO
+
+    stream = BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    pos = stream.tell()
+    size = stream.seek(0, os.SEEK_END)
+    try:
+        stream.seek(0)
+        with zipfile.ZipFile(stream) as zf:
+            infos = zf.infolist()
+    except zipfile.BadZipFile:
+        return TemplateInfo(size, 0, size, 0)
+    finally:
+        stream.seek(pos)
+    xml = sum(i.file_size for i in infos if i.filename.endswith(_XML_SUFFIXES))
+    media = sum(i.file_size for i in infos) - xml
+    slide_xml = sum(i.file_size for i in infos if _SLIDE_PART.match(i.filename))
+    return TemplateInfo(size, xml, media, len(infos), slide_xml)
+
+
+def workbook_shape(source, filename: str | None = None, rows: int | None = None) -> tuple[int, int]:
+    """
+    (rows, columns) a generation loads from a workbook: `rows` rows (all when
+    None) of every column of the first sheet. Rows are guessed from the file
+    size when the workbook does not declare them. A stored dataset
+    (datasets.Dataset) has its dimensions in its manifest.
+    """
+    import data_loader
+    import datasets
+
+    if isinstance(source, datasets.Dataset):
+        return (source.rows if rows is None else min(rows, source.rows)), len(source.columns)
+    stream = getattr(source, "stream", source)
+    fmt = data_loader.detect_format(stream, filename or getattr(source, "filename", None))
+    total, columns = data_loader.read_dimensions(stream, fmt)
+    if total is None:
+        pos = stream.tell()
+        size = stream.seek(0, os.SEEK_END)
+        stream.seek(pos)
+        total = size // max(columns * 10, 1)
+    return (total if rows is None else min(rows, total)), columns
+
+
+def estimate(template: TemplateInfo, cells: int = 0, engine: str = "pptx", compiled: bool = False,
+             copies: int = 1) -> int:
+    """
+    Estimated peak memory (bytes) of one generation. `compiled`: the template
+    is already in the template cache. `copies`: slide copies held at once
+    (the one-deck-per-dataset output clones every slide per row); only the
+    slide parts are copied, masters, layouts and theme are held once.
+    """
+    if engine == "ooxml" and compiled:
+        media_factor, xml_factor = OOXML_MEDIA_FACTOR, OOXML_XML_FACTOR
+    else:
+        media_factor, xml_factor = PPTX_MEDIA_FACTOR, PPTX_XML_FACTOR
+    xml_bytes = template.xml_bytes + template.slide_xml_bytes * (max(copies, 1) - 1)
+    cost = media_factor * template.media_bytes + xml_factor * xml_bytes
+    return int(BASE_COST + cost + cells * CELL_BYTES)
+
+
+# ---------- RSS sampling ----------
+def current_rss() -> int | None:
+    """Resident set size of this process, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class Ticket:
+    """An admitted request's reservation. `release()` is idempotent."""
+
+    def __init__(self, budget: "MemoryBudget | None", operation: str, estimate: int, reserved: int):
+        self.budget = budget
+        self.operation = operation
+        self.estimate = estimate
+        self.reserved = reserved
+        self.start_rss = current_rss()
+        self.peak_rss = self.start_rss
+        self.released = False
+
+    def sample(self, rss: int) -> None:
+        if self.peak_rss is None or rss > self.peak_rss:
+            self.peak_rss = rss
+
+    @property
+    def peak_growth(self) -> int | None:
+        if self.start_rss is None or self.peak_rss is None:
+            return None
+        return self.peak_rss - self.start_rss
+
+    def release(self) -> None:
+        if self.released:
+            return
+        self.released = True
+        if self.budget is not None:
+            self.budget.release(self)
+
+    def __enter__(self) -> "Ticket":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class MemoryBudget:
+    """Bytes of estimated memory handed out first come first served, up to `max_bytes`."""
+
+    def __init__(self, max_bytes: int, max_queue: int, max_wait: float, sample_interval: float):
+        self.max_bytes = max_bytes
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.sample_interval = sample_interval
+        self._cond = threading.Condition()
+        self._reserved = 0
+        self._waiting: deque = deque()
+        self._active: set[Ticket] = set()
+        self._sampler: threading.Thread | None = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.peak_reserved = 0
+
+    def acquire(self, cost: int, operation: str) -> Ticket:
+        """Reserve `cost` bytes, waiting for room if needed; raises AdmissionRejected."""
+        reserved = min(cost, self.max_bytes)  # an oversized request runs alone
+        waited = 0.0
+        with self._cond:
+            if self._waiting or self._reserved + reserved > self.max_bytes:
+                if len(self._waiting) >= self.max_queue:
+                    self._reject(operation, f"{len(self._waiting)} generations are already waiting for memory")
+                waited = self._wait(reserved, operation)
+            self._reserved += reserved
+            self.admitted += 1
+            self.peak_reserved = max(self.peak_reserved, self._reserved)
+            ticket = Ticket(self, operation, cost, reserved)
+            self._active.add(ticket)
+            self._publish()
+            self._start_sampler()
+        metrics.ADMISSION.inc(operation=operation, result="queued" if waited else "admitted")
+        if waited:
+            metrics.ADMISSION_WAIT.observe(waited, operation=operation)
+        metrics.REQUEST_MEMORY.observe(cost, operation=operation, kind="estimate")
+        return ticket
+
+    def _wait(self, reserved: int, operation: str) -> float:
+        """Queue until this request is first in line and fits (called with the lock held)."""
+        marker = object()
+        self._waiting.append(marker)
+        self.queued += 1
+        self._publish()
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        try:
+            while self._waiting[0] is not marker or self._reserved + reserved > self.max_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._reject(operation, f"no memory became available within {self.max_wait:g}s")
+                self._cond.wait(remaining)
+        finally:
+            self._waiting.remove(marker)
+            self._publish()
+            self._cond.notify_all()
+        return time.monotonic() - started
+
+    def _reject(self, operation: str, reason: str) -> None:
+        self.rejected += 1
+        metrics.ADMISSION.inc(operation=operation, result="rejected")
+        log.warning("admission_rejected", operation=operation, reason=reason,
+                    reserved_mb=round(self._reserved / MB, 1), waiting=len(self._waiting))
+        raise AdmissionRejected(f"Server is busy: {reason}. Retry later.", retry_after=max(1, int(self.max_wait)))
+
+    def release(self, ticket: Ticket) -> None:
+        with self._cond:
+            self._reserved -= ticket.reserved
+            self._active.discard(ticket)
+            self._publish()
+            self._cond.notify_all()
+        growth = ticket.peak_growth
+        if growth is not None:
+            metrics.REQUEST_MEMORY.observe(max(growth, 0), operation=ticket.operation, kind="peak_rss")
+        log.debug("admission_released", operation=ticket.operation, estimate_mb=round(ticket.estimate / MB, 1),
+                  peak_rss_growth_mb=None if growth is None else round(growth / MB, 1))
+
+    def _publish(self) -> None:
+        metrics.ADMISSION_RESERVED.set(self._reserved)
+        metrics.ADMISSION_QUEUED.set(len(self._waiting))
+
+    def _start_sampler(self) -> None:
+        """Run the RSS sampler while any ticket is active (called with the lock held)."""
+        if self.sample_interval <= 0 or (self._sampler is not None and self._sampler.is_alive()):
+            return
+        if current_rss() is None:
+            return
+        self._sampler = threading.Thread(target=self._sample_loop, name="rss-sampler", daemon=True)
+        self._sampler.start()
+
+    def _sample_loop(self) -> None:
+        while True:
+            rss = current_rss()
+            with self._cond:
+                if not self._active or rss is None:
+                    self._sampler = None
+                    return
+                for ticket in self._active:
+                    ticket.sample(rss)
+            time.sleep(self.sample_interval)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "budget_bytes": self.max_bytes,
+                "reserved_bytes": self._reserved,
+                "peak_reserved_bytes": self.peak_reserved,
+                "running": len(self._active),
+                "waiting": len(self._waiting),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+            }
+
+
+_budget = None
+_budget_pid = None
+_budget_lock = threading.Lock()
+
+
+def get_budget() -> MemoryBudget | None:
+    """Process-wide budget from ADMISSION_* settings; None when disabled."""
+    global _budget, _budget_pid
+    with _budget_lock:
+        if _budget_pid != os.getpid():
+            max_mb = _env_float("ADMISSION_BUDGET_MB", 512)
+            _budget = None if max_mb <= 0 else MemoryBudget(
+                int(max_mb * MB),
+                max(0, int(_env_float("ADMISSION_MAX_QUEUE", 8))),
+                max(0.0, _env_float("ADMISSION_MAX_WAIT", 30)),
+                max(0.0, _env_float("ADMISSION_SAMPLE_MS", 50)) / 1000,
+            )
+            _budget_pid = os.getpid()
+        return _budget
+
+
+def admit(cost: int, operation: str) -> Ticket:
+    """Reserve memory for a generation (a no-op ticket when admission control is disabled)."""
+    budget = get_budget()
+    if budget is None:
+        return Ticket(None, operation, cost, 0)
+    return budget.acquire(cost, operation)
+
+
+def stats() -> dict:
+    budget = get_budget()
+    return budget.stats() if budget is not None else {"enabled": False}
@@ -0,0 +1,118 @@
+"""
+Batch generation: render many Excel rows against one template.
+
+The workbook and template are parsed once in the web process; each deck is
+rendered in a worker process and appended to a ZIP that is streamed back to
+the client as soon as each deck finishes. Rows that fail are recorded in a
+`report.json` entry instead of aborting the whole batch.
+"""
+
+import json
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Template bytes for the current worker process (set by the pool initializer)
+_worker_template: bytes | None = None
+
+
+def get_max_workers() -> int:
+    """Number of worker processes (BATCH_MAX_WORKERS env, defaults to CPU count)."""
+    value = os.environ.get("BATCH_MAX_WORKERS", "")
+    try:
+        workers = int(value)
+    except ValueError:
+        workers = os.cpu_count() or 1
+    return max(1, workers)
+
+
+def _init_worker(template_bytes: bytes) -> None:
+    global _worker_template
+    _worker_template = template_bytes
+
+
+def _render_row(task: tuple[int, str, dict[str, str]]) -> tuple[int, str, bytes]:
+    """Render one deck in a worker process. Returns (row_index, filename, pptx bytes)."""
+    from io import BytesIO
+
+    import main
+
+    row_index, filename, replacements = task
+    out = main.apply_replacements_to_ppt(BytesIO(_worker_template), replacements)
+    return row_index, filename, out.getvalue()
+
+
+def deck_filename(row_index: int, label: str = "") -> str:
+    """Build a safe ZIP entry name for a row, e.g. '0003_Ann_Lee.pptx'."""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", str(label or "")).strip("._")[:60]
+    return f"{row_index:04d}_{slug}.pptx" if slug else f"{row_index:04d}.pptx"
+
+
+class _ZipChunkBuffer:
+    """Write-only, non-seekable sink for zipfile that hands written bytes to a generator."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_batch_zip(template_bytes: bytes, tasks: list[tuple[int, str, dict[str, str]]],
+                   errors: list[dict] | None = None, max_workers: int | None = None):
+    """
+    Render every task in a process pool and yield ZIP bytes as decks complete.
+
+    `tasks` are (row_index, filename, replacements) tuples. `errors` holds
+    rows that already failed while preparing replacements; they are merged
+    into the final `report.json` together with any rendering failures.
+    """
+    report: dict = {"generated": [], "errors": list(errors or [])}
+    sink = _ZipChunkBuffer()
+    zf = zipfile.ZipFile(sink, "w")
+    executor = None
+    try:
+        if tasks:
+            executor = ProcessPoolExecutor(
+                max_workers=min(max_workers or get_max_workers(), len(tasks)),
+                initializer=_init_worker,
+                initargs=(template_bytes,),
+            )
+            futures = {executor.submit(_render_row, task): task for task in tasks}
+            for future in as_completed(futures):
+                row_index, filename, _ = futures[future]
+                try:
+                    _, filename, data = future.result()
+                except Exception as e:
+                    report["errors"].append({"row_index": row_index, "error": str(e)})
+                    continue
+                # PPTX is already deflated; storing avoids compressing twice
+                zf.writestr(zipfile.ZipInfo(filename), data, compress_type=zipfile.ZIP_STORED)
+                report["generated"].append({"row_index": row_index, "file": filename})
+                yield sink.drain()
+
+        report["generated"].sort(key=lambda r: r["row_index"])
+        report["errors"].sort(key=lambda r: r["row_index"])
+        zf.writestr("report.json", json.dumps(report, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+        zf.close()
+        yield sink.drain()
+    finally:
+        if executor is not None:
+            # Client may disconnect mid-stream: drop pending rows
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,140 @@
+"""
+Benchmark: single-pass PlaceholderMatcher vs the previous per-placeholder loop
+in replace_in_text_runs.
+
+Builds a slide with many text runs and a replacement set as wide as a
+150-column Excel sheet, then times both implementations on fresh copies.
+
+Run from backend/:
+  python benchmarks/bench_replace.py --columns 150 --runs 400 --repeat 5
+"""
+
+import argparse
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pptx import Presentation
+from pptx.util import Inches
+
+import main
+from main import (
+    MISSING_FIELD_COLOR,
+    NAME_PLACEHOLDERS,
+    _highlight_name_in_paragraph,
+    _is_missing_field_text,
+    _split_run_for_name,
+)
+
+
+def legacy_replace_in_text_runs(text_frame, replacements: dict[str, str]) -> int:
+    """replace_in_text_runs as it was before the single-pass matcher."""
+    count = 0
+    placeholders = list(replacements.keys())
+    for paragraph in text_frame.paragraphs:
+        for run in paragraph.runs:
+            original = run.text
+            if not original:
+                continue
+            new_text = original
+            missing_highlight = False
+            for ph in placeholders:
+                if ph in new_text:
+                    replacement_text = replacements[ph]
+                    if ph in NAME_PLACEHOLDERS and not _is_missing_field_text(replacement_text):
+                        if _split_run_for_name(paragraph, run, ph, replacement_text):
+                            new_text = run.text
+                            continue
+                    new_text = new_text.replace(ph, replacement_text)
+                    if _is_missing_field_text(replacement_text):
+                        missing_highlight = True
+            if new_text != original:
+                run.text = new_text
+                if missing_highlight:
+                    run.font.color.rgb = MISSING_FIELD_COLOR
+                count += 1
+
+        para_text = "".join([r.text or "" for r in paragraph.runs])
+        if any(ph in para_text for ph in placeholders):
+            merged = para_text
+            missing_highlight = False
+            name_texts: list[str] = []
+            for ph in placeholders:
+                if ph in merged:
+                    replacement_text = replacements[ph]
+                    merged = merged.replace(ph, replacement_text)
+                    if _is_missing_field_text(replacement_text):
+                        missing_highlight = True
+                    if ph in NAME_PLACEHOLDERS and not _is_missing_field_text(replacement_text):
+                        name_texts.append(replacement_text)
+            if paragraph.runs:
+                first_run = paragraph.runs[0]
+                first_run.text = merged
+                if missing_highlight:
+                    first_run.font.color.rgb = MISSING_FIELD_COLOR
+                for r in paragraph.runs[1:]:
+                    r.text = ""
+            for name_text in name_texts:
+                _highlight_name_in_paragraph(paragraph, name_text)
+            count += 1
+    return count
+
+
+def build_template(columns: int, runs: int) -> bytes:
+    """One slide, one text box, `runs` runs spread over paragraphs of 4 runs each."""
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    tf = slide.shapes.add_textbox(0, 0, Inches(8), Inches(6)).text_frame
+    paragraph = tf.paragraphs[0]
+    for i in range(runs):
+        if i and i % 4 == 0:
+            paragraph = tf.add_paragraph()
+        run = paragraph.add_run()
+        run.text = f"Item {i}: [col_{i % columns}] and some plain text "
+    out = BytesIO()
+    prs.save(out)
+    return out.getvalue()
+
+
+def build_replacements(columns: int) -> dict[str, str]:
+    replacements = {f"[col_{i}]": f"value {i}" for i in range(columns)}
+    replacements["[candidate_name]"] = "Ann Lee"
+    return replacements
+
+
+def time_impl(func, data: bytes, replacements, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        prs = Presentation(BytesIO(data))
+        frames = [s.text_frame for s in prs.slides[0].shapes if s.has_text_frame]
+        start = time.perf_counter()
+        for tf in frames:
+            func(tf, replacements)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--columns", type=int, default=150)
+    parser.add_argument("--runs", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = build_template(args.columns, args.runs)
+    replacements = build_replacements(args.columns)
+
+    legacy = time_impl(legacy_replace_in_text_runs, data, replacements, args.repeat)
+    matcher = time_impl(main.replace_in_text_runs, data, main.PlaceholderMatcher(replacements), args.repeat)
+
+    print(f"columns={args.columns} runs={args.runs} (best of {args.repeat})")
+    print(f"  legacy loop : {legacy * 1000:8.2f} ms")
+    print(f"  matcher     : {matcher * 1000:8.2f} ms")
+    print(f"  speedup     : {legacy / matcher:8.2f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,455 @@
+"""
+Load test: the app under gunicorn, driven by a mix of generate, mapping read
+and mapping write requests at several concurrency levels.
+
+Starts `gunicorn main:app` from backend/ (gunicorn.conf.py applies: preloaded
+app, warm-up per worker) with the given worker class, workers and threads,
+waits for /health and runs --warmup seconds of untimed traffic. Then, for each
+--concurrency level, that many client threads send requests back to back for
+--duration seconds, each request drawn from --mix. Reported per level and per
+request type: throughput, p50/p95/p99 latency and error rate (with status
+codes), plus the peak RSS of every gunicorn worker while the level ran, with
+and without its child processes (fill pool). RSS is read from /proc (Linux).
+
+Database behind DATABASE_URL:
+- --database-url URL: an existing PostgreSQL
+- --postgres: a throwaway local cluster (initdb and pg_ctl on PATH, not as
+  root), removed afterwards
+- neither: the JSON-file fallback; mapping_config.json is restored afterwards
+db.py only speaks PostgreSQL; without DATABASE_URL the JSON file is the
+app's own local stand-in, so there is no SQLite mode.
+
+Mapping writes PUT back the mappings read at start: the content stays the
+same, but every write bumps the mapping version (and so the output store
+keys), as a real edit does. Generate requests use synthetic inputs (--preset,
+or --template / --excel) and a random row each; --dataset uploads the
+workbook to /datasets once and sends its dataset_id instead.
+
+Run from backend/:
+  python benchmarks/load_test.py --workers 2 --threads 4 --concurrency 1,4,16 --duration 20
+  python benchmarks/load_test.py --worker-class sync --workers 4 --postgres --output load.json
+  python benchmarks/load_test.py --env FILL_WORKERS=2 --env DB_POOL_MAX=2 --mix generate=1
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from run_benchmarks import PRESETS
+from synthetic import make_template, make_workbook
+
+OPERATIONS = ("generate", "mapping_read", "mapping_write")
+MB = 1024 * 1024
+
+
+# ---------- Server ----------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def local_postgres(workdir: Path):
+    """A throwaway PostgreSQL cluster; yields its URL."""
+    initdb, pg_ctl = shutil.which("initdb"), shutil.which("pg_ctl")
+    if not (initdb and pg_ctl):
+        raise SystemExit("--postgres needs initdb and pg_ctl on PATH (e.g. /usr/lib/postgresql/16/bin)")
+    data, port = workdir / "pgdata", free_port()
+    subprocess.run([initdb, "-D", str(data), "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([pg_ctl, "-D", str(data), "-l", str(workdir / "postgres.log"), "-w", "start",
+                    "-o", f"-p {port} -k {workdir} -c listen_addresses=127.0.0.1"],
+                   check=True, stdout=subprocess.DEVNULL)
+    try:
+        yield f"postgresql://postgres@127.0.0.1:{port}/postgres"
+    finally:
+        subprocess.run([pg_ctl, "-D", str(data), "-m", "fast", "-w", "stop"], stdout=subprocess.DEVNULL)
+
+
+@contextmanager
+def preserved(path: Path):
+    """Restore a file's content (or its absence) when the block ends."""
+    original = path.read_bytes() if path.exists() else None
+    try:
+        yield
+    finally:
+        if original is None:
+            path.unlink(missing_ok=True)
+        else:
+            path.write_bytes(original)
+
+
+@contextmanager
+def gunicorn(args, workdir: Path, database_url: str | None):
+    """Start gunicorn on a free port; yields (port, process)."""
+    port = free_port()
+    env = dict(os.environ)
+    env.pop("DATABASE_URL", None)
+    if database_url:
+        env["DATABASE_URL"] = database_url
+    # Stores in the work directory, so runs start cold and leave nothing behind
+    env.update(OUTPUT_STORE_DIR=str(workdir / "outputs"), DATASET_DIR=str(workdir / "datasets"),
+               IMAGE_CACHE_DIR=str(workdir / "images"))
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    cmd = [sys.executable, "-m", "gunicorn", "main:app", "--bind", f"127.0.0.1:{port}",
+           "--workers", str(args.workers), "--threads", str(args.threads),
+           "--worker-class", args.worker_class, "--timeout", str(args.timeout)]
+    log_path = workdir / "gunicorn.log"
+    with open(log_path, "wb") as log_file:
+        proc = subprocess.Popen(cmd, cwd=BACKEND, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                if proc.poll() is not None:
+                    raise SystemExit(f"gunicorn exited ({proc.returncode}):\n{_tail(log_path)}")
+                try:
+                    status, _ = request(http.client.HTTPConnection("127.0.0.1", port, timeout=5), "GET", "/health")
+                    if status == 200:
+                        break
+                except OSError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise SystemExit(f"gunicorn did not answer /health within 60s:\n{_tail(log_path)}")
+                time.sleep(0.2)
+            yield port, proc
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def _tail(path: Path, lines: int = 20) -> str:
+    """Last lines of the server log (the work directory is removed on exit)."""
+    return "\n".join(path.read_text(errors="replace").splitlines()[-lines:])
+
+
+# ---------- Process memory ----------
+def _children() -> dict[int, list[int]]:
+    """Parent pid -> child pids, from /proc."""
+    children: dict[int, list[int]] = {}
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        ppid = int(stat[stat.rindex(b")") + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry.name))
+    return children
+
+
+def _rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class RssSampler:
+    """Peak RSS of each gunicorn worker (alone and with its children), sampled in a thread."""
+
+    def __init__(self, master_pid: int, interval: float = 0.25):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.available = os.path.exists("/proc/self/statm")
+        self.master = 0
+        self.workers: dict[int, dict] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> None:
+        tree = _children()
+
+        def descendants(pid):
+            for child in tree.get(pid, []):
+                yield child
+                yield from descendants(child)
+
+        self.master = max(self.master, _rss(self.master_pid))
+        for pid in tree.get(self.master_pid, []):
+            own = _rss(pid)
+            total = own + sum(_rss(child) for child in descendants(pid))
+            peak = self.workers.setdefault(pid, {"rss": 0, "with_children": 0})
+            peak["rss"] = max(peak["rss"], own)
+            peak["with_children"] = max(peak["with_children"], total)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        if self.available:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self.available:
+            self._thread.join()
+            self._sample()
+
+    def report(self) -> dict | None:
+        if not self.available:
+            return None
+        return {"master_bytes": self.master,
+                "workers": [{"pid": pid, "peak_rss_bytes": p["rss"], "peak_rss_with_children_bytes": p["with_children"]}
+                            for pid, p in sorted(self.workers.items())]}
+
+
+# ---------- Client ----------
+def multipart(fields: dict[str, str], files: dict[str, tuple[str, bytes]]) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def request(conn: http.client.HTTPConnection, method: str, path: str, body: bytes | None = None,
+            content_type: str | None = None) -> tuple[int, bytes]:
+    headers = {"Content-Type": content_type} if content_type else {}
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+class Traffic:
+    """Builds the requests of each operation."""
+
+    def __init__(self, template: bytes, workbook: bytes, rows: int, mappings: list, dataset_id: str | None):
+        self.template = template
+        self.workbook = workbook
+        self.rows = rows
+        self.mappings_body = json.dumps({"mappings": mappings}).encode("utf-8")
+        self.dataset_id = dataset_id
+
+    def send(self, conn, operation: str, rng: random.Random) -> int:
+        if operation == "generate":
+            fields = {"row_index": str(rng.randrange(self.rows))}
+            files = {"template": ("template.pptx", self.template)}
+            if self.dataset_id:
+                fields["dataset_id"] = self.dataset_id
+            else:
+                files["excel"] = ("data.xlsx", self.workbook)
+            body, content_type = multipart(fields, files)
+            return request(conn, "POST", "/generate", body, content_type)[0]
+        if operation == "mapping_read":
+            return request(conn, "GET", "/mapping")[0]
+        return request(conn, "PUT", "/mapping", self.mappings_body, "application/json")[0]
+
+
+def drive(port: int, traffic: Traffic, mix: dict[str, float], concurrency: int, duration: float,
+          seed: int = 0) -> tuple[list[tuple[str, float, int]], float]:
+    """Run `concurrency` client threads for `duration` seconds. Returns ([(op, seconds, status)], elapsed)."""
+    operations, weights = zip(*mix.items())
+    results: list[tuple[str, float, int]] = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def client(index: int) -> None:
+        rng = random.Random(seed * 1000 + index)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+        local = []
+        while time.perf_counter() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                status = traffic.send(conn, operation, rng)
+            except (OSError, http.client.HTTPException):
+                status = 0  # connection error
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+            local.append((operation, time.perf_counter() - t0, status))
+        conn.close()
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+
+# ---------- Report ----------
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(results: list[tuple[str, float, int]], elapsed: float) -> dict:
+    groups = {"all": results}
+    for operation in OPERATIONS:
+        subset = [r for r in results if r[0] == operation]
+        if subset:
+            groups[operation] = subset
+    summary = {}
+    for name, items in groups.items():
+        latencies = sorted(r[1] for r in items)
+        statuses: dict[str, int] = {}
+        for r in items:
+            statuses[str(r[2])] = statuses.get(str(r[2]), 0) + 1
+        errors = sum(1 for r in items if not 200 <= r[2] < 400)
+        summary[name] = {
+            "requests": len(items),
+            "throughput_rps": len(items) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "error_rate": errors / len(items) if items else 0.0,
+            "statuses": statuses,
+        }
+    return summary
+
+
+def print_level(level: dict) -> None:
+    print(f"concurrency={level['concurrency']}  {level['seconds']:.1f}s")
+    print(f"  {'request':14s} {'count':>7s} {'req/s':>8s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'errors':>7s}")
+    for name, s in level["requests"].items():
+        print(f"  {name:14s} {s['requests']:7d} {s['throughput_rps']:8.1f} {s['p50_ms']:9.1f} {s['p95_ms']:9.1f}"
+              f" {s['p99_ms']:9.1f} {s['error_rate']:7.1%}"
+              + ("" if not s["error_rate"] else f"  {s['statuses']}"))
+    memory = level["memory"]
+    if memory:
+        workers = memory["workers"]
+        print(f"  master RSS {memory['master_bytes'] / MB:.0f} MB; worker peak RSS: "
+              + ", ".join(f"{w['pid']}: {w['peak_rss_bytes'] / MB:.0f} MB"
+                          + (f" ({w['peak_rss_with_children_bytes'] / MB:.0f} MB with children)"
+                             if w["peak_rss_with_children_bytes"] != w["peak_rss_bytes"] else "")
+                          for w in workers))
+
+
+# ---------- Main ----------
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown request type '{name}' (use {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs a positive weight")
+    return mix
+
+
+def run_load_test() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="threads per worker (gthread when above 1)")
+    parser.add_argument("--worker-class", default="sync", help="gunicorn worker class: sync (default), gthread")
+    parser.add_argument("--timeout", type=int, default=120, help="gunicorn worker timeout in seconds")
+    parser.add_argument("--concurrency", default="1,4,16", help="client concurrency levels, comma-separated")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=5, help="untimed seconds before the first level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("generate=6,mapping_read=3,mapping_write=1"),
+                        help="request weights, e.g. generate=6,mapping_read=3,mapping_write=1")
+    parser.add_argument("--preset", choices=PRESETS, default="small", help="synthetic template and workbook")
+    parser.add_argument("--template", help="template file instead of the synthetic one")
+    parser.add_argument("--excel", help="workbook file instead of the synthetic one")
+    parser.add_argument("--dataset", action="store_true", help="upload the workbook to /datasets once, send dataset_id")
+    database = parser.add_mutually_exclusive_group()
+    database.add_argument("--database-url", help="PostgreSQL for DATABASE_URL")
+    database.add_argument("--postgres", action="store_true", help="start a throwaway local PostgreSQL")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra server setting, e.g. DB_POOL_MAX=2 (repeatable)")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    config = PRESETS[args.preset]
+    template = Path(args.template).read_bytes() if args.template else make_template(
+        slides=config["slides"], shapes=config["shapes"], groups=config["groups"],
+        tables=config["tables"], splits=config["splits"], columns=config["columns"])
+    workbook = Path(args.excel).read_bytes() if args.excel else make_workbook(
+        rows=config["rows"], columns=config["columns"])
+    if args.excel:
+        from io import BytesIO
+
+        import data_loader
+        source = BytesIO(workbook)
+        rows = data_loader.read_dimensions(source, data_loader.detect_format(source, args.excel))[0] or 1
+    else:
+        rows = config["rows"]
+
+    workdir = Path(tempfile.mkdtemp(prefix="load_test_"))
+    try:
+        with local_postgres(workdir) if args.postgres else nullcontext(args.database_url) as database_url, \
+                nullcontext() if database_url else preserved(BACKEND / "mapping_config.json"), \
+                gunicorn(args, workdir, database_url) as (port, proc):
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+            status, body = request(conn, "GET", "/mapping")
+            if status != 200:
+                raise SystemExit(f"GET /mapping returned {status}: {body[:200]!r}")
+            mappings = json.loads(body)["mappings"]
+            dataset_id = None
+            if args.dataset:
+                upload, content_type = multipart({}, {"excel": ("data.xlsx", workbook)})
+                status, body = request(conn, "POST", "/datasets", upload, content_type)
+                if status not in (200, 201):
+                    raise SystemExit(f"POST /datasets returned {status}: {body[:200]!r}")
+                dataset_id = json.loads(body)["dataset_id"]
+            conn.close()
+            traffic = Traffic(template, workbook, rows, mappings, dataset_id)
+
+            print(f"gunicorn: {args.workers} x {args.worker_class} worker(s), {args.threads} thread(s); "
+                  f"database: {'PostgreSQL' if database_url else 'JSON file'}; "
+                  f"mix: {', '.join(f'{k}={v:g}' for k, v in args.mix.items())}; "
+                  f"inputs: {len(template) / 1e3:.0f} KB template, {len(workbook) / 1e3:.0f} KB workbook, {rows} rows")
+            if args.warmup > 0:
+                drive(port, traffic, args.mix, max(levels), args.warmup, seed=-1)
+
+            results = []
+            for n, concurrency in enumerate(levels):
+                with RssSampler(proc.pid) as sampler:
+                    raw, elapsed = drive(port, traffic, args.mix, concurrency, args.duration, seed=n)
+                level = {"concurrency": concurrency, "seconds": elapsed,
+                         "requests": summarize(raw, elapsed), "memory": sampler.report()}
+                print_level(level)
+                results.append(level)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        settings = {k: v for k, v in vars(args).items() if k not in ("output", "database_url")}
+        settings["database"] = "postgres" if (args.postgres or args.database_url) else "file"
+        Path(args.output).write_text(json.dumps({"settings": settings, "levels": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_load_test())
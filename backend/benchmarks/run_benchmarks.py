@@ -0,0 +1,258 @@
+"""
+Stage benchmarks for the generation pipeline on synthetic inputs.
+
+Times each stage (cold import of the app, Excel load, mapping load, template
+parse, replacement, save, plus the end-to-end fill and the output optimization pass), records
+peak Python memory per stage with tracemalloc, and writes the results as JSON (with the deck
+size before and after optimization). With --baseline, exits with
+status 1 if any stage is slower than the baseline by more than --threshold.
+With --fill-workers N, the ooxml fill is also timed without the slide cache,
+serially and across N processes (parallel_fill.py).
+
+Run from backend/:
+  python benchmarks/run_benchmarks.py --preset medium --output results.json
+  python benchmarks/run_benchmarks.py --preset medium --save-baseline baseline.json
+  python benchmarks/run_benchmarks.py --preset medium --baseline baseline.json --threshold 0.25
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from pptx import Presentation
+
+import main
+import optimize
+import template_cache
+from synthetic import make_template, make_workbook
+
+PRESETS = {
+    "small": dict(slides=5, shapes=6, groups=1, tables=1, splits=2, rows=50, columns=20),
+    "medium": dict(slides=30, shapes=10, groups=2, tables=1, splits=3, rows=2000, columns=60),
+    "large": dict(slides=150, shapes=12, groups=2, tables=2, splits=3, rows=40000, columns=150),
+}
+
+
+def measure(func, repeat: int) -> dict:
+    """Best wall time over `repeat` runs, and the peak traced memory of one run."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak}
+
+
+_IMPORT_SCRIPT = """
+import sys, time, tracemalloc
+if sys.argv[1] == "1":
+    tracemalloc.start()
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start, tracemalloc.get_traced_memory()[1])
+"""
+
+
+def measure_import(repeat: int) -> dict:
+    """`import main` in a fresh interpreter: what a cold start pays before serving /health."""
+    backend = Path(__file__).resolve().parent.parent
+
+    def once(trace: bool) -> tuple[float, int]:
+        out = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT, "1" if trace else "0"], cwd=backend,
+                             capture_output=True, text=True, check=True).stdout.split()
+        return float(out[0]), int(out[1])
+
+    best = min(once(False)[0] for _ in range(repeat))
+    return {"seconds": best, "peak_bytes": once(True)[1]}
+
+
+_fill_runs = itertools.count()
+
+
+def uncached_fill(template: bytes, replacements: dict, workers: int):
+    """An ooxml fill rendering every slide, in `workers` processes when above 1."""
+    def fill():
+        # Fresh values each run, so no slide is served by the slide cache
+        run_id = next(_fill_runs)
+        values = {key: f"{value} {run_id}" for key, value in replacements.items()}
+        saved = {k: os.environ.get(k) for k in ("FILL_WORKERS", "FILL_PARALLEL_MIN_SLIDES")}
+        os.environ.update(FILL_WORKERS=str(workers), FILL_PARALLEL_MIN_SLIDES="1")
+        try:
+            main.apply_replacements_to_ppt(BytesIO(template), values, engine="ooxml")
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+    return fill
+
+
+def run(config: dict, repeat: int, row_index: int, fill_workers: int = 0) -> dict:
+    template = make_template(
+        slides=config["slides"], shapes=config["shapes"], groups=config["groups"],
+        tables=config["tables"], splits=config["splits"], columns=config["columns"],
+    )
+    workbook = make_workbook(rows=config["rows"], columns=config["columns"])
+    compiled = template_cache.compile_template(template)
+    stages: dict[str, dict] = {}
+
+    stages["import_main"] = measure_import(repeat)
+    stages["excel_load_full"] = measure(lambda: main.load_excel_df(BytesIO(workbook), filename="b.xlsx"), repeat)
+    stages["excel_load_projected"] = measure(
+        lambda: main.load_excel_df(
+            BytesIO(workbook),
+            columns=lambda header: main.referenced_columns(compiled.text, header),
+            nrows=row_index + 1,
+            filename="b.xlsx",
+        ),
+        repeat,
+    )
+
+    def load_mapping_cold():
+        main._file_snapshot["stamp"] = None
+        main.load_mapping_config()
+
+    stages["mapping_load"] = measure(load_mapping_cold, repeat)
+
+    df = main.load_excel_df(BytesIO(workbook), filename="b.xlsx")
+    row = main.select_row(df, row_index)
+    replacements = main.build_replacements(row)
+    stages["build_replacements"] = measure(lambda: main.build_replacements(row), repeat)
+    # Every row at once, as /generate/batch does
+    mapping = main.get_full_mapping(row)
+    stages["build_replacement_table"] = measure(lambda: main.build_replacement_table(df, mapping), repeat)
+
+    stages["template_parse"] = measure(lambda: Presentation(BytesIO(template)), repeat)
+    stages["template_compile"] = measure(lambda: template_cache.compile_template(template), repeat)
+
+    def replace_only(prs):
+        matcher = main.PlaceholderMatcher(replacements)
+        for slide in prs.slides:
+            for shape in main.iter_all_shapes(slide):
+                if shape.has_text_frame:
+                    main.replace_in_text_runs(shape.text_frame, matcher)
+                if getattr(shape, "has_table", False) and shape.has_table:
+                    for table_row in shape.table.rows:
+                        for cell in table_row.cells:
+                            main.replace_in_text_runs(cell.text_frame, matcher)
+
+    # Replacement alone, on a freshly parsed deck each time (parse not timed)
+    best = float("inf")
+    for _ in range(repeat):
+        prs = Presentation(BytesIO(template))
+        start = time.perf_counter()
+        replace_only(prs)
+        best = min(best, time.perf_counter() - start)
+    prs = Presentation(BytesIO(template))
+    tracemalloc.start()
+    replace_only(prs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    stages["replace"] = {"seconds": best, "peak_bytes": peak}
+
+    stages["save"] = measure(lambda: prs.save(BytesIO()), repeat)
+
+    for engine in main.FILL_ENGINES:
+        stages[f"fill_{engine}"] = measure(
+            lambda: main.apply_replacements_to_ppt(BytesIO(template), replacements, engine=engine), repeat
+        )
+
+    if fill_workers > 1:
+        stages["fill_ooxml_serial"] = measure(uncached_fill(template, replacements, 1), repeat)
+        uncached_fill(template, replacements, fill_workers)()  # start the pool outside the timing
+        stages["fill_ooxml_parallel"] = measure(uncached_fill(template, replacements, fill_workers), repeat)
+
+    filled = main.apply_replacements_to_ppt(BytesIO(template), replacements).getvalue()
+    stages["optimize"] = measure(lambda: optimize.optimize_package(filled), repeat)
+    _, report = optimize.optimize_package(filled)
+
+    return {
+        "config": config,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "template_bytes": len(template),
+        "workbook_bytes": len(workbook),
+        "output_bytes": {"before": report.before, "after": report.after},
+        "stages": stages,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Stages slower than baseline * (1 + threshold)."""
+    regressions = []
+    for name, stage in results["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+        limit = base["seconds"] * (1 + threshold)
+        if stage["seconds"] > limit:
+            regressions.append(
+                f"{name}: {stage['seconds'] * 1000:.1f} ms > {limit * 1000:.1f} ms "
+                f"(baseline {base['seconds'] * 1000:.1f} ms)"
+            )
+    return regressions
+
+
+def run_benchmarks() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=PRESETS, default="small")
+    for key in ("slides", "shapes", "groups", "tables", "splits", "rows", "columns"):
+        parser.add_argument(f"--{key}", type=int, help=f"override the preset's {key}")
+    parser.add_argument("--row-index", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fill-workers", type=int, default=0, help="also time the ooxml fill across N processes")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--save-baseline", help="write results JSON as the new baseline")
+    args = parser.parse_args()
+
+    config = dict(PRESETS[args.preset])
+    for key in config:
+        value = getattr(args, key)
+        if value is not None:
+            config[key] = value
+
+    results = run(config, args.repeat, args.row_index, args.fill_workers)
+
+    print(f"preset={args.preset} {config}")
+    for name, stage in results["stages"].items():
+        print(f"  {name:22s} {stage['seconds'] * 1000:9.2f} ms   peak {stage['peak_bytes'] / 1e6:8.2f} MB")
+    sizes = results["output_bytes"]
+    print(f"  output {sizes['before'] / 1e3:.1f} KB -> {sizes['after'] / 1e3:.1f} KB optimized")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No stage regressed more than {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_benchmarks())
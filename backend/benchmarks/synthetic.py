@@ -0,0 +1,71 @@
+"""
+Synthetic inputs for benchmarks: PPTX templates and XLSX workbooks of a given shape.
+
+Templates use [col_N] placeholders that match the workbook's col_N columns.
+"""
+
+from io import BytesIO
+
+from openpyxl import Workbook
+from pptx import Presentation
+from pptx.util import Inches, Pt
+
+
+def _add_text(shapes, text: str, left, top, splits: int) -> None:
+    """Add a text box; the placeholder in `text` is split across `splits` + 1 runs."""
+    tf = shapes.add_textbox(left, top, Inches(3), Inches(0.6)).text_frame
+    paragraph = tf.paragraphs[0]
+    chunk = max(1, len(text) // (splits + 1))
+    pieces = [text[i:i + chunk] for i in range(0, len(text), chunk)] if splits else [text]
+    for piece in pieces:
+        run = paragraph.add_run()
+        run.text = piece
+        run.font.size = Pt(14)
+
+
+def make_template(slides: int = 10, shapes: int = 8, groups: int = 1, tables: int = 1,
+                  splits: int = 1, columns: int = 30) -> bytes:
+    """
+    Build a template with `slides` slides, each holding `shapes` text boxes,
+    `groups` group shapes (2 text boxes each) and `tables` 3x3 tables.
+    Every `splits`-th text box has its placeholder split across runs.
+    """
+    prs = Presentation()
+    layout = prs.slide_layouts[6]
+    col = 0
+
+    def next_placeholder() -> str:
+        nonlocal col
+        col += 1
+        return f"[col_{col % columns}]"
+
+    for _ in range(slides):
+        slide = prs.slides.add_slide(layout)
+        for i in range(shapes):
+            split = splits if splits and i % max(1, splits) == 0 else 0
+            _add_text(slide.shapes, f"Label {i}: {next_placeholder()} end", Inches(0.2), Inches(0.2 + 0.5 * i), split)
+        for _ in range(groups):
+            group = slide.shapes.add_group_shape()
+            _add_text(group.shapes, f"Group {next_placeholder()}", Inches(5), Inches(0.5), 0)
+            _add_text(group.shapes, f"Group {next_placeholder()}", Inches(5), Inches(1.2), 0)
+        for _ in range(tables):
+            table = slide.shapes.add_table(3, 3, Inches(5), Inches(3), Inches(4), Inches(1.5)).table
+            for r in range(3):
+                for c in range(3):
+                    table.cell(r, c).text = next_placeholder()
+
+    out = BytesIO()
+    prs.save(out)
+    return out.getvalue()
+
+
+def make_workbook(rows: int = 100, columns: int = 30) -> bytes:
+    """Workbook with columns col_0..col_{columns-1} and `rows` rows of text."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([f"col_{c}" for c in range(columns)])
+    for r in range(rows):
+        ws.append([f"value {r}-{c} with some text" for c in range(columns)])
+    out = BytesIO()
+    wb.save(out)
+    return out.getvalue()
@@ -0,0 +1,244 @@
+"""
+Tabular data loading for XLSX, CSV and Parquet inputs.
+
+All formats go through `load_table`, which can:
+- read only the columns a caller needs (`columns`)
+- stop once `nrows` data rows have been read
+
+XLSX files are streamed with openpyxl in read-only mode instead of being
+materialized whole by pandas, so a one-row generation from a 40k-row export
+only parses the header and the rows up to the one requested. Parquet support
+needs the optional `pyarrow` package.
+"""
+
+from collections.abc import Callable, Iterable
+from pathlib import Path
+
+import pandas as pd
+
+# Column selection: a list of names, or a function of the header row
+ColumnSelector = Iterable[str] | Callable[[list[str]], Iterable[str]] | None
+
+
+def detect_format(source, filename: str | None = None) -> str:
+    """Guess the input format from the file name, falling back to magic bytes."""
+    name = filename or getattr(source, "filename", None) or getattr(source, "name", None)
+    if name is None and isinstance(source, (str, Path)):
+        name = str(source)
+    suffix = Path(str(name or "")).suffix.lower()
+    if suffix in (".xlsx", ".xlsm"):
+        return "xlsx"
+    if suffix in (".csv", ".txt"):
+        return "csv"
+    if suffix in (".parquet", ".pq"):
+        return "parquet"
+
+    head = _peek(source, 4)
+    if head.startswith(b"PK"):
+        return "xlsx"
+    if head == b"PAR1":
+        return "parquet"
+    return "csv"
+
+
+def _peek(source, size: int) -> bytes:
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            return f.read(size)
+    pos = source.tell()
+    data = source.read(size)
+    source.seek(pos)
+    return data
+
+
+def _header_names(raw: Iterable) -> list[str]:
+    """Name header cells the way pandas does: 'Unnamed: i' for blanks, 'x.1' for duplicates."""
+    names: list[str] = []
+    seen: dict[str, int] = {}
+    for i, value in enumerate(raw):
+        name = f"Unnamed: {i}" if value is None or str(value).strip() == "" else str(value)
+        if name in seen:
+            seen[name] += 1
+            candidate = f"{name}.{seen[name]}"
+            while candidate in seen:
+                seen[name] += 1
+                candidate = f"{name}.{seen[name]}"
+            seen[candidate] = 0
+            name = candidate
+        else:
+            seen[name] = 0
+        names.append(name.strip())
+    return names
+
+
+def _resolve_columns(header: list[str], columns: ColumnSelector) -> list[str]:
+    if columns is None:
+        return list(header)
+    wanted = columns(header) if callable(columns) else columns
+    wanted = set(wanted)
+    return [c for c in header if c in wanted]
+
+
+# ---------- XLSX ----------
+def _open_sheet(source):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    return wb, wb.worksheets[0]
+
+
+def _read_worksheet(ws, columns: ColumnSelector, nrows: int | None) -> pd.DataFrame:
+    rows_iter = ws.iter_rows(values_only=True)
+    header = _header_names(next(rows_iter, ()))
+    selected = _resolve_columns(header, columns)
+    indices = [header.index(c) for c in selected]
+
+    data: list[tuple] = []
+    trailing_blank = 0
+    for values in rows_iter:
+        if nrows is not None and len(data) - trailing_blank >= nrows:
+            break
+        values = tuple(values) + (None,) * (len(header) - len(values))
+        data.append(tuple(values[i] for i in indices))
+        # Like pandas, drop fully blank rows at the end of the sheet
+        trailing_blank = trailing_blank + 1 if all(v is None for v in values) else 0
+    if trailing_blank:
+        del data[-trailing_blank:]
+    if nrows is not None:
+        del data[nrows:]
+    return pd.DataFrame(data, columns=selected)
+
+
+def _read_xlsx(source, columns: ColumnSelector, nrows: int | None) -> pd.DataFrame:
+    wb, ws = _open_sheet(source)
+    try:
+        return _read_worksheet(ws, columns, nrows)
+    finally:
+        wb.close()
+
+
+# ---------- CSV ----------
+def _read_csv(source, columns: ColumnSelector, nrows: int | None) -> pd.DataFrame:
+    if columns is None:
+        usecols = None
+    else:
+        header = read_header(source, "csv")
+        selected = set(_resolve_columns(header, columns))
+        usecols = lambda c: str(c).strip() in selected  # noqa: E731
+    return pd.read_csv(source, usecols=usecols, nrows=nrows)
+
+
+# ---------- Parquet ----------
+def _parquet_file(source):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet input requires the 'pyarrow' package.")
+    return pq.ParquetFile(source)
+
+
+def _read_parquet(source, columns: ColumnSelector, nrows: int | None) -> pd.DataFrame:
+    pf = _parquet_file(source)
+    header = list(pf.schema_arrow.names)
+    selected = _resolve_columns([str(c).strip() for c in header], columns)
+    source_cols = [c for c in header if str(c).strip() in selected]
+    if nrows is None:
+        return pf.read(columns=source_cols).to_pandas()
+
+    import pyarrow as pa
+    batches = []
+    remaining = nrows
+    for batch in pf.iter_batches(batch_size=max(1, min(nrows, 65536)), columns=source_cols):
+        batches.append(batch.slice(0, remaining))
+        remaining -= min(remaining, batch.num_rows)
+        if remaining <= 0:
+            break
+    if not batches:
+        return pd.DataFrame(columns=source_cols)
+    return pa.Table.from_batches(batches).to_pandas()
+
+
+# ---------- Public API ----------
+def read_header(source, fmt: str | None = None) -> list[str]:
+    """Return the (stripped) column names without reading any data rows."""
+    fmt = fmt or detect_format(source)
+    rewind = getattr(source, "seek", None)
+    try:
+        if fmt == "xlsx":
+            wb, ws = _open_sheet(source)
+            try:
+                return _header_names(next(ws.iter_rows(values_only=True), ()))
+            finally:
+                wb.close()
+        if fmt == "parquet":
+            return [str(c).strip() for c in _parquet_file(source).schema_arrow.names]
+        return [str(c).strip() for c in pd.read_csv(source, nrows=0).columns]
+    finally:
+        if rewind:
+            rewind(0)
+
+
+def read_dimensions(source, fmt: str | None = None) -> tuple[int | None, int]:
+    """
+    (data rows, columns) of the first sheet without reading its rows. Rows
+    come from the sheet's declared dimension (XLSX) or the file metadata
+    (Parquet); None when unknown (CSV, or an XLSX without a dimension).
+    """
+    fmt = fmt or detect_format(source)
+    rewind = getattr(source, "seek", None)
+    try:
+        if fmt == "xlsx":
+            wb, ws = _open_sheet(source)
+            try:
+                max_row, max_col = ws.max_row, ws.max_column
+            finally:
+                wb.close()
+            if max_col:
+                return (max(max_row - 1, 0) if max_row else None), max_col
+        elif fmt == "parquet":
+            metadata = _parquet_file(source).metadata
+            return metadata.num_rows, metadata.num_columns
+    finally:
+        if rewind:
+            rewind(0)
+    return None, len(read_header(source, fmt))
+
+
+def load_sheets(source, filename: str | None = None) -> dict[str, pd.DataFrame]:
+    """
+    Load every sheet of a workbook, in workbook order (the first one is the
+    main data sheet). CSV and Parquet inputs have a single sheet named after
+    the file.
+    """
+    fmt = detect_format(source, filename)
+    if fmt != "xlsx":
+        name = Path(str(filename or getattr(source, "name", "") or "data")).stem
+        return {name: load_table(source, filename, fmt=fmt)}
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        return {ws.title: _read_worksheet(ws, None, None) for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def load_table(source, filename: str | None = None, columns: ColumnSelector = None,
+               nrows: int | None = None, fmt: str | None = None) -> pd.DataFrame:
+    """
+    Load a table from an XLSX/CSV/Parquet path or file object.
+
+    - `columns`: names to keep, or a function of the header returning them
+    - `nrows`: stop after this many data rows
+    Column names are stripped of surrounding whitespace.
+    """
+    fmt = fmt or detect_format(source, filename)
+    if fmt == "xlsx":
+        df = _read_xlsx(source, columns, nrows)
+    elif fmt == "parquet":
+        df = _read_parquet(source, columns, nrows)
+    else:
+        df = _read_csv(source, columns, nrows)
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
@@ -0,0 +1,106 @@
+"""
+One deck for a whole dataset.
+
+`render_dataset_deck` clones the template's slides once per row inside a
+single Presentation and fills each copy with that row's values. A clone
+relates to the same image, media and chart parts as the slide it was copied
+from, so each picture is stored once however many rows there are: the
+output grows with the text, not with media x rows.
+"""
+
+from copy import deepcopy
+from io import BytesIO
+
+from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+_R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_P_NS = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+
+# Relationships a clone gets on its own (layout from add_slide) or should not share (notes)
+_SKIP_RELS = (RT.SLIDE_LAYOUT, RT.NOTES_SLIDE)
+# Slide-level elements copied after the shape tree
+_SLIDE_EXTRAS = (f"{_P_NS}transition", f"{_P_NS}timing")
+
+
+def clone_slide(prs, source):
+    """Append a copy of `source` that shares its images, media and other related parts."""
+    slide = prs.slides.add_slide(source.slide_layout)
+    c_sld = slide._element.cSld
+    # The copied shapes replace the placeholders add_slide took from the layout. The
+    # spTree element itself is kept: slide.shapes already holds a proxy for it.
+    sp_tree = c_sld.spTree
+    for child in list(sp_tree):
+        sp_tree.remove(child)
+    for child in source._element.cSld.spTree:
+        sp_tree.append(deepcopy(child))
+    if source._element.cSld.bg is not None:
+        c_sld.insert(0, deepcopy(source._element.cSld.bg))
+    for child in source._element:
+        if child.tag in _SLIDE_EXTRAS:
+            slide._element.append(deepcopy(child))
+
+    rid_map = {}
+    for rid, rel in source.part.rels.items():
+        if rel.reltype in _SKIP_RELS:
+            continue
+        if rel.is_external:
+            rid_map[rid] = slide.part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+        else:
+            rid_map[rid] = slide.part.relate_to(rel.target_part, rel.reltype)
+    if any(old != new for old, new in rid_map.items()):
+        for el in slide._element.iter():
+            for attr, value in el.attrib.items():
+                if attr.startswith(_R_NS) and value in rid_map:
+                    el.set(attr, rid_map[value])
+    return slide
+
+
+def render_dataset_deck(template, rows: list[dict[str, str]], progress=None, out=None):
+    """
+    Fill one copy of the template's slides per entry of `rows` (replacement
+    dicts, in order) and save them as a single deck.
+
+    `template` is bytes or a seekable binary stream. `progress(slides_done,
+    slides_total)` is called as slides are filled. The deck is written to `out`
+    when given, else to a new BytesIO, which is returned rewound.
+    """
+    import metrics
+    import optimize
+    import template_cache
+    from main import PlaceholderMatcher, fill_slide
+
+    if not rows:
+        raise ValueError("No rows to render.")
+
+    compiled = template_cache.get_compiled_template(template)
+    with metrics.span("template_parse"):
+        prs = Presentation(BytesIO(compiled.data))
+    originals = list(prs.slides)
+
+    # Clone from the untouched originals before any of them is filled
+    with metrics.span("clone"):
+        groups = [originals] + [[clone_slide(prs, s) for s in originals] for _ in rows[1:]]
+
+    total = len(rows) * len(originals)
+    done = 0
+    for slides, replacements in zip(groups, rows):
+        matcher = PlaceholderMatcher(replacements)
+        for i, slide in enumerate(slides):
+            fill_slide(slide, matcher, first_slide=i == 0)
+            done += 1
+            if progress:
+                progress(done, total)
+
+    if optimize.enabled():
+        def save(sink):
+            with metrics.span("save"):
+                prs.save(sink)
+        return optimize.optimize_output(save, out)
+
+    target = out if out is not None else BytesIO()
+    with metrics.span("save"):
+        prs.save(target)
+    if out is None:
+        target.seek(0)
+    return target
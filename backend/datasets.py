@@ -0,0 +1,227 @@
+"""
+Dataset registry: workbooks uploaded once and kept as memory-mapped Arrow files.
+
+POST /datasets stores a workbook (XLSX, CSV or Parquet) under its dataset
+id, the sha256 of the uploaded bytes, so the same file always gets the same
+id and is converted once. Every sheet is converted to an uncompressed Arrow
+IPC file, which can be memory-mapped: opening a dataset reads no cell data,
+and a generation only touches the pages of the row and columns it uses.
+/generate and /jobs accept `dataset_id` in place of the `excel` file, so
+moving between rows of the same workbook repeats neither the upload nor the
+XLSX parsing. Since the id is a plain content hash, a client can compute it
+and upload only when the id is unknown (404).
+
+Each dataset is a directory in a BoundedFileStore (see output_store.py):
+`dataset.json` (original file name, sheets with their row and column
+counts) and `<n>.arrow` per sheet, in workbook order. Datasets are evicted
+least recently used first once DATASET_MAX_MB is exceeded, or after
+DATASET_TTL seconds unused; a generation that has a dataset open keeps
+reading it even if it is evicted meanwhile.
+
+Cell values are kept with their types (numbers, dates, text), typed per
+column over the whole sheet as for a key lookup on an uploaded workbook (a
+number column with blank cells reads as decimals). A column that mixes
+numbers and text is stored as text. Needs the optional `pyarrow` package.
+
+Settings (env):
+- DATASET_DIR: directory (default backend/temp/datasets)
+- DATASET_MAX_MB: total size budget; 0 disables datasets (default 1024)
+- DATASET_TTL: seconds an unused dataset is kept (default 604800)
+"""
+
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+import metrics
+from logs import get_logger
+
+log = get_logger("datasets")
+
+MANIFEST = "dataset.json"
+BATCH_ROWS = 65536  # rows per Arrow record batch
+_DATASET_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError("Datasets require the 'pyarrow' package.")
+    return pa
+
+
+class SheetInfo(NamedTuple):
+    name: str
+    rows: int
+    columns: list[str]
+
+
+class Dataset:
+    """A stored workbook; every sheet is memory-mapped when the dataset is opened."""
+
+    def __init__(self, dataset_id: str, path: Path):
+        pa = _pyarrow()
+        manifest = json.loads((path / MANIFEST).read_text(encoding="utf-8"))
+        self.id = dataset_id
+        self.filename = manifest.get("filename")
+        self.sheets = [SheetInfo(s["name"], s["rows"], s["columns"]) for s in manifest["sheets"]]
+        # Zero-copy: the tables' buffers point into the mapped files
+        self._tables = [pa.ipc.open_file(pa.memory_map(str(path / f"{n}.arrow"), "r")).read_all()
+                        for n in range(len(self.sheets))]
+
+    @property
+    def columns(self) -> list[str]:
+        """Columns of the main (first) sheet."""
+        return self.sheets[0].columns
+
+    @property
+    def rows(self) -> int:
+        return self.sheets[0].rows
+
+    def read(self, columns=None, start: int = 0, stop: int | None = None, sheet: int = 0):
+        """
+        Rows [start, stop) of a sheet as a DataFrame indexed by row position.
+        `columns`: names to keep, or a function of the header returning them.
+        """
+        import data_loader
+
+        table = self._tables[sheet]
+        selected = data_loader._resolve_columns(self.sheets[sheet].columns, columns)
+        stop = table.num_rows if stop is None else min(stop, table.num_rows)
+        start = min(max(start, 0), stop)
+        df = table.select(selected).slice(start, stop - start).to_pandas()
+        df.index = range(start, stop)
+        return df
+
+    def row(self, row_index: int, columns=None):
+        """One row of the main sheet as a Series, with the same range check as select_row."""
+        if row_index < 0 or row_index >= self.rows:
+            raise ValueError(f"row_index out of range. Got {row_index}, Excel has {self.rows} rows.")
+        return self.read(columns, row_index, row_index + 1).iloc[0]
+
+    def load_sheets(self) -> dict:
+        """Every sheet as a DataFrame, in workbook order (as data_loader.load_sheets)."""
+        return {info.name: table.to_pandas() for info, table in zip(self.sheets, self._tables)}
+
+    def info(self) -> dict:
+        return {
+            "dataset_id": self.id,
+            "filename": self.filename,
+            "rows": self.rows,
+            "columns": self.columns,
+            "sheets": [{"name": s.name, "rows": s.rows, "columns": len(s.columns)} for s in self.sheets],
+        }
+
+    def close(self) -> None:
+        """Release the mapped tables (they are also released when the dataset is collected)."""
+        self._tables = []
+
+
+# ---------- Conversion ----------
+def _to_arrow(df):
+    """A DataFrame as an Arrow table; columns Arrow cannot type (mixed cells) become text."""
+    import pandas as pd
+
+    pa = _pyarrow()
+    arrays = []
+    for name in df.columns:
+        values = df[name]
+        try:
+            arrays.append(pa.array(values, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            arrays.append(pa.array([None if pd.isna(v) else str(v) for v in values], type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+
+
+def _write_dataset(directory: Path, sheets: dict, filename: str | None) -> None:
+    pa = _pyarrow()
+    manifest = {"filename": filename, "sheets": []}
+    for n, (name, df) in enumerate(sheets.items()):
+        table = _to_arrow(df)
+        with pa.OSFile(str(directory / f"{n}.arrow"), "wb") as sink, \
+                pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=BATCH_ROWS)
+        manifest["sheets"].append({"name": name, "rows": table.num_rows, "columns": table.column_names})
+    # Written last: a directory with a manifest is complete
+    (directory / MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+
+
+# ---------- Registry ----------
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_dataset_store():
+    """Process-wide dataset store from the DATASET_* settings; None when disabled."""
+    from output_store import BoundedFileStore
+
+    global _store
+    with _store_lock:
+        if _store is None:
+            max_mb = _env_float("DATASET_MAX_MB", 1024)
+            if max_mb <= 0:
+                return None
+            root = os.environ.get("DATASET_DIR") or Path(__file__).parent / "temp" / "datasets"
+            _store = BoundedFileStore(Path(root), int(max_mb * 1024 * 1024), _env_float("DATASET_TTL", 604800))
+        return _store
+
+
+def get_dataset(dataset_id: str) -> Dataset | None:
+    """Open a stored dataset (marking it as recently used); None if unknown, evicted or disabled."""
+    store = get_dataset_store()
+    if store is None or not _DATASET_ID.match(dataset_id or ""):
+        return None
+    path = store.get(dataset_id)
+    if path is None or not (path / MANIFEST).exists():
+        metrics.DATASETS.inc(operation="open", result="miss")
+        return None
+    try:
+        dataset = Dataset(dataset_id, path)
+    except FileNotFoundError:  # evicted while opening
+        metrics.DATASETS.inc(operation="open", result="miss")
+        return None
+    metrics.DATASETS.inc(operation="open", result="hit")
+    return dataset
+
+
+def register(source, filename: str | None = None) -> tuple[Dataset, bool]:
+    """
+    Store a workbook (seekable binary stream) unless a dataset with the same
+    content exists. Returns (dataset, created).
+    """
+    import data_loader
+    import template_cache
+
+    _pyarrow()
+    store = get_dataset_store()
+    if store is None:
+        raise ValueError("Datasets are disabled (DATASET_MAX_MB=0).")
+    dataset_id = template_cache.stream_hash(source)
+    dataset = get_dataset(dataset_id)
+    if dataset is not None:
+        metrics.DATASETS.inc(operation="upload", result="existing")
+        return dataset, False
+
+    with metrics.span("excel_load"):
+        try:
+            sheets = data_loader.load_sheets(source, filename)
+        except Exception as e:
+            raise ValueError(f"Could not read the workbook: {e}") from e
+    with metrics.span("dataset_write"), store.open_dir(dataset_id) as directory:
+        _write_dataset(directory, sheets, filename)
+    metrics.DATASETS.inc(operation="upload", result="created")
+    dataset = Dataset(dataset_id, store.path_for(dataset_id))
+    log.info("dataset_created", dataset_id=dataset_id, filename=filename, sheets=len(dataset.sheets),
+             rows=dataset.rows, columns=len(dataset.columns))
+    return dataset, True
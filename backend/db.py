@@ -1,9 +1,29 @@
 """
 Database module for persistent storage on Render.
 Uses PostgreSQL when DATABASE_URL is set; otherwise falls back to JSON file (local dev).
+
+- Connections come from a small per-process pool (DB_POOL_MAX env, default 5).
+- Tables are created on first use in each process rather than at import, so
+  a cold start does not wait for the database.
+- Mappings are served from an in-memory snapshot tagged with the version stored
+  in `mapping_meta`. The version is re-checked at most every
+  MAPPING_VERSION_TTL seconds (default 2) and the rows are only re-read when it
+  changed, so lookups on the hot path do not touch the database. The version
+  and rows are read in one REPEATABLE READ transaction, so they always match.
+- Saving replaces all rows and bumps the version in a single statement, so
+  readers see either the old or the new set, never an empty table.
+- Join declarations (related workbook sheets, see workbook_cache.py) live in
+  `mapping_joins` and share the mappings' version and snapshot.
 """
 
 import os
+import threading
+import time
+from contextlib import contextmanager
+
+from logs import get_logger
+
+log = get_logger("db")
 
 
 def get_db_url() -> str | None:
@@ -12,75 +32,246 @@ def get_db_url() -> str | None:
     return url if url and url.strip() else None
 
 
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# ---------- Connection pool ----------
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Create the pool lazily, once per process (gunicorn forks after import)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            from psycopg2.pool import ThreadedConnectionPool
+            max_conn = max(1, int(_env_float("DB_POOL_MAX", 5)))
+            _pool = ThreadedConnectionPool(1, max_conn, get_db_url())
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@contextmanager
+def _connection():
+    """Borrow a pooled connection; commit on success, roll back on error."""
+    pool = _get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
 def init_db():
-    """Create mappings table if it doesn't exist."""
+    """Create mappings and mapping_meta tables if they don't exist."""
     url = get_db_url()
     if not url:
         return
     try:
-        import psycopg2
-        conn = psycopg2.connect(url)
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS mappings (
-                id SERIAL PRIMARY KEY,
-                ppt_placeholder VARCHAR(512) NOT NULL,
-                excel_column VARCHAR(512) NOT NULL
+        with _connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS mappings (
+                    id SERIAL PRIMARY KEY,
+                    ppt_placeholder VARCHAR(512) NOT NULL,
+                    excel_column VARCHAR(512) NOT NULL
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS mapping_joins (
+                    id SERIAL PRIMARY KEY,
+                    sheet VARCHAR(512) NOT NULL,
+                    sheet_column VARCHAR(512) NOT NULL,
+                    excel_column VARCHAR(512) NOT NULL
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS mapping_meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version BIGINT NOT NULL
+                )
+            """)
+            cur.execute(
+                "INSERT INTO mapping_meta (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING"
             )
-        """)
-        conn.commit()
-        cur.close()
-        conn.close()
     except Exception as e:
-        print(f"[DB] Init warning: {e}")
+        log.warning("db_init_failed", error=str(e))
+
+
+_schema_pid = None
+_schema_lock = threading.Lock()
+
+
+def _ensure_schema() -> None:
+    """Run init_db once per process, before the first query."""
+    global _schema_pid
+    if _schema_pid == os.getpid():
+        return
+    with _schema_lock:
+        if _schema_pid != os.getpid():
+            init_db()
+            _schema_pid = os.getpid()
+
+
+# ---------- Versioned snapshot ----------
+_snapshot: dict = {"version": None, "mappings": None, "joins": None, "checked_at": 0.0}
+_snapshot_lock = threading.Lock()
+
+
+def _read_version(cur) -> int:
+    cur.execute("SELECT version FROM mapping_meta WHERE id = 1")
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def mappings_version() -> int | None:
+    """Version of the mapping snapshot (0 = never saved). None if DB not configured or unreadable."""
+    if load_mappings_from_db() is None:
+        return None
+    return _snapshot["version"]
 
 
 def load_mappings_from_db() -> list[dict] | None:
-    """Load mappings from PostgreSQL. Returns None if DB not configured."""
+    """Load mappings from PostgreSQL. Returns None if DB not configured.
+
+    The returned list is the shared snapshot; callers must not modify it.
+    """
     url = get_db_url()
     if not url:
         return None
+
+    ttl = _env_float("MAPPING_VERSION_TTL", 2.0)
+    now = time.monotonic()
+    with _snapshot_lock:
+        if _snapshot["mappings"] is not None and now - _snapshot["checked_at"] < ttl:
+            return _snapshot["mappings"]
+
+    _ensure_schema()
     try:
-        import psycopg2
-        conn = psycopg2.connect(url)
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT ppt_placeholder, excel_column FROM mappings ORDER BY id"
-        )
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
-        return [
-            {"pptPlaceholder": r[0], "excelColumn": r[1]}
-            for r in rows
-        ]
+        with _connection() as conn, conn.cursor() as cur:
+            # One snapshot for the version and row reads (READ COMMITTED takes
+            # one per statement, so a save could land between them)
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            version = _read_version(cur)
+            with _snapshot_lock:
+                if _snapshot["mappings"] is not None and _snapshot["version"] == version:
+                    _snapshot["checked_at"] = now
+                    return _snapshot["mappings"]
+            # Same snapshot as the version read: rows match that version
+            cur.execute(
+                "SELECT ppt_placeholder, excel_column FROM mappings ORDER BY id"
+            )
+            rows = cur.fetchall()
+            cur.execute(
+                "SELECT sheet, sheet_column, excel_column FROM mapping_joins ORDER BY id"
+            )
+            join_rows = cur.fetchall()
     except Exception as e:
-        print(f"[DB] Load error: {e}")
+        log.error("mapping_load_failed", error=str(e))
+        return None
+
+    mappings = [
+        {"pptPlaceholder": r[0], "excelColumn": r[1]}
+        for r in rows
+    ]
+    joins = [
+        {"sheet": r[0], "sheetColumn": r[1], "excelColumn": r[2]}
+        for r in join_rows
+    ]
+    with _snapshot_lock:
+        _snapshot.update(version=version, mappings=mappings, joins=joins, checked_at=now)
+    return mappings
+
+
+def load_joins_from_db() -> list[dict] | None:
+    """Join declarations from the same snapshot as the mappings. None if DB not configured."""
+    if load_mappings_from_db() is None:
         return None
+    return _snapshot["joins"]
 
 
-def save_mappings_to_db(mappings: list[dict]) -> bool:
-    """Save mappings to PostgreSQL. Returns True on success, False otherwise."""
+def save_mappings_to_db(mappings: list[dict], joins: list[dict] | None = None) -> bool:
+    """
+    Save mappings (and join declarations, unless None: the stored ones are
+    kept) to PostgreSQL. Returns True on success, False otherwise.
+    """
     url = get_db_url()
     if not url:
         return False
+    pairs = [
+        (m.get("pptPlaceholder", ""), m.get("excelColumn", ""))
+        for m in mappings
+    ]
+    pairs = [(ph, col) for ph, col in pairs if ph and col]
+    join_rows = None
+    if joins is not None:
+        join_rows = [
+            (j.get("sheet", ""), j.get("sheetColumn") or j.get("excelColumn", ""), j.get("excelColumn", ""))
+            for j in joins
+        ]
+        join_rows = [r for r in join_rows if r[0] and r[2]]
+    _ensure_schema()
     try:
-        import psycopg2
-        conn = psycopg2.connect(url)
-        cur = conn.cursor()
-        cur.execute("DELETE FROM mappings")
-        for m in mappings:
-            ph = m.get("pptPlaceholder", "")
-            col = m.get("excelColumn", "")
-            if ph and col:
-                cur.execute(
-                    "INSERT INTO mappings (ppt_placeholder, excel_column) VALUES (%s, %s)",
-                    (ph, col)
+        with _connection() as conn, conn.cursor() as cur:
+            # Serialize writers; readers are not blocked
+            cur.execute("LOCK TABLE mappings IN SHARE ROW EXCLUSIVE MODE")
+            cur.execute(
+                """
+                WITH bumped AS (
+                    UPDATE mapping_meta SET version = version + 1 WHERE id = 1
+                    RETURNING version
+                ),
+                deleted AS (
+                    DELETE FROM mappings
+                ),
+                inserted AS (
+                    INSERT INTO mappings (ppt_placeholder, excel_column)
+                    SELECT ph, col
+                    FROM unnest(%s::varchar[], %s::varchar[]) WITH ORDINALITY AS t(ph, col, ord)
+                    ORDER BY ord
+                )
+                SELECT version FROM bumped
+                """,
+                ([ph for ph, _ in pairs], [col for _, col in pairs]),
+            )
+            row = cur.fetchone()
+            version = row[0] if row else None
+            if join_rows is not None:
+                # Same transaction as the version bump
+                cur.execute("DELETE FROM mapping_joins")
+                cur.executemany(
+                    "INSERT INTO mapping_joins (sheet, sheet_column, excel_column) VALUES (%s, %s, %s)",
+                    join_rows,
                 )
-        conn.commit()
-        cur.close()
-        conn.close()
-        return True
     except Exception as e:
-        print(f"[DB] Save error: {e}")
+        log.error("mapping_save_failed", error=str(e))
         return False
+
+    with _snapshot_lock:
+        _snapshot.update(
+            version=version,
+            mappings=[{"pptPlaceholder": ph, "excelColumn": col} for ph, col in pairs],
+            checked_at=time.monotonic(),
+        )
+        if join_rows is not None:
+            _snapshot["joins"] = [
+                {"sheet": s, "sheetColumn": sc, "excelColumn": ec} for s, sc, ec in join_rows
+            ]
+    return True
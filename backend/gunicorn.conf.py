@@ -0,0 +1,28 @@
+"""
+Gunicorn settings, read automatically when gunicorn starts in this directory
+(`gunicorn main:app`, as in render.yaml).
+
+- The app is preloaded: `main` is imported once in the master (it only
+  imports Flask up front) and workers are forked from it.
+- Each worker starts the warm-up (warmup.py) in a background thread once it
+  has started, so /health answers immediately while pandas / python-pptx
+  are imported, the mapping snapshot is loaded and WARMUP_TEMPLATES are
+  compiled. WARMUP=0 turns it off.
+- The master logs how long the app took to import and to become ready.
+"""
+
+import time
+
+_config_loaded = time.perf_counter()
+
+preload_app = True
+
+
+def when_ready(server):
+    server.log.info("ready in %.3fs (config to listening, app import included)",
+                    time.perf_counter() - _config_loaded)
+
+
+def post_worker_init(worker):
+    import warmup
+    warmup.start()
@@ -0,0 +1,385 @@
+"""
+Image placeholders: pictures replaced by image files named in the workbook.
+
+A picture in the template whose alt text (or shape name) holds a
+placeholder, e.g. `{{photo}}` or `[logo]`, is an image placeholder. The
+column it maps to holds an image path, relative to IMAGE_ROOT. The template's
+picture is a stand-in that sets the frame; it is kept when the value is
+missing or the file cannot be read as an image.
+
+Each image is fitted to its frame before it goes into the deck: turned
+upright from its EXIF orientation, centre-cropped to the frame's aspect
+ratio, downscaled to the frame's size at IMAGE_DPI (never upscaled) and
+recompressed (JPEG, or PNG when it has transparency). An 8 MB camera photo
+in a 4 cm frame becomes a few tens of KB. Prepared images are kept in an
+on-disk cache keyed by the source's content hash and the target size, so an
+image is decoded and resized once per frame size, across requests and
+worker processes.
+
+Identical prepared images are stored as one media part: python-pptx reuses
+image parts by SHA-1, and the ooxml engine names media parts by content hash.
+
+Settings (env):
+- IMAGE_ROOT: directory image paths are resolved against; paths outside it
+  are ignored (default backend/images)
+- IMAGE_DPI: pixels per inch of frame size (default 150)
+- IMAGE_QUALITY: JPEG quality (default 85)
+- IMAGE_CACHE_DIR: prepared-image cache directory (default backend/temp/images)
+- IMAGE_CACHE_MAX_MB: cache size budget; 0 disables the cache (default 200)
+- IMAGE_CACHE_TTL: seconds an unused prepared image is kept (default 604800)
+"""
+
+import hashlib
+import math
+import os
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import NamedTuple
+
+import metrics
+from logs import get_logger
+
+log = get_logger("images")
+
+EMU_PER_INCH = 914400
+MAX_SIDE = 2000  # px, for frames whose size is not known
+_SOURCE_HASHES_MAX = 4096
+
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    ext: str  # "jpeg" or "png"
+    digest: str  # sha256 of data
+
+    @property
+    def content_type(self) -> str:
+        return f"image/{self.ext}"
+
+    @property
+    def part_name(self) -> str:
+        """Media part name for the ooxml engine; equal images share it."""
+        return f"ppt/media/filled_{self.digest[:20]}.{self.ext}"
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def image_root() -> Path:
+    return Path(os.environ.get("IMAGE_ROOT") or Path(__file__).parent / "images").resolve()
+
+
+def resolve_path(value: str) -> Path | None:
+    """The image file a cell value names, or None if it is not a file under IMAGE_ROOT."""
+    root = image_root()
+    try:
+        path = (root / value.strip()).resolve()
+    except (OSError, ValueError):
+        return None
+    if not path.is_relative_to(root) or not path.is_file():
+        return None
+    return path
+
+
+def image_value(tokens, replacements: dict[str, str]) -> str | None:
+    """The first usable value among a picture's placeholders (missing-field texts are not)."""
+    from main import _is_missing_field_text
+
+    for ph in tokens:
+        value = replacements.get(ph)
+        if value and value.strip() and not _is_missing_field_text(value):
+            return value
+    return None
+
+
+# ---------- Preparation ----------
+_source_hashes: dict[tuple[str, int, int], str] = {}
+_source_lock = threading.Lock()
+
+
+def _source_hash(path: Path) -> str:
+    """sha256 of a source image, remembered while its size and mtime are unchanged."""
+    st = path.stat()
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    with _source_lock:
+        digest = _source_hashes.get(key)
+    if digest is not None:
+        return digest
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _source_lock:
+        if len(_source_hashes) >= _SOURCE_HASHES_MAX:
+            _source_hashes.clear()
+        _source_hashes[key] = digest
+    return digest
+
+
+def source_key(value: str) -> str | None:
+    """Content hash of the image a value names (None if there is none), for output keys."""
+    path = resolve_path(value)
+    if path is None:
+        return None
+    try:
+        return _source_hash(path)
+    except OSError:
+        return None
+
+
+def target_size(cx: int | None, cy: int | None) -> tuple[int, int] | None:
+    """Pixel size of a frame of cx x cy EMU at IMAGE_DPI, or None if unknown."""
+    if not cx or not cy or cx <= 0 or cy <= 0:
+        return None
+    dpi = max(_env_float("IMAGE_DPI", 150), 1)
+    return max(1, math.ceil(cx / EMU_PER_INCH * dpi)), max(1, math.ceil(cy / EMU_PER_INCH * dpi))
+
+
+def fit_image(source, size: tuple[int, int] | None, quality: int = 85) -> tuple[bytes, str]:
+    """
+    Crop and downscale an image (path or file) to `size`, never upscaling,
+    and recompress it. Returns (data, "jpeg" | "png").
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as img:
+        if size is not None:
+            # JPEG: let the decoder downscale by up to 8x instead of decoding every pixel
+            img.draft("RGB", (max(size), max(size)))  # either way up, before EXIF rotation
+        img = ImageOps.exif_transpose(img)
+        if size is None:
+            img.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+        else:
+            w, h = size
+            # Largest centred box of the frame's aspect ratio, then shrink it to the frame
+            scale = min(img.width / w, img.height / h)
+            crop_w, crop_h = min(img.width, round(w * scale)), min(img.height, round(h * scale))
+            left, top = (img.width - crop_w) // 2, (img.height - crop_h) // 2
+            box = (left, top, left + crop_w, top + crop_h)
+            if scale > 1:
+                img = img.resize((w, h), Image.LANCZOS, box=box, reducing_gap=3.0)
+            else:
+                img = img.crop(box)
+
+        transparent = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        out = BytesIO()
+        if transparent:
+            img.save(out, "PNG", optimize=True)
+            return out.getvalue(), "png"
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+        return out.getvalue(), "jpeg"
+
+
+def _prepared(data: bytes) -> PreparedImage:
+    ext = "png" if data.startswith(b"\x89PNG") else "jpeg"
+    return PreparedImage(data, ext, hashlib.sha256(data).hexdigest())
+
+
+def prepare_image(value: str, cx: int | None, cy: int | None) -> PreparedImage | None:
+    """
+    The image named by a cell value, fitted to a cx x cy EMU frame (from the
+    cache when it was prepared before). None if it cannot be used.
+    """
+    path = resolve_path(value)
+    if path is None:
+        log.warning("image_not_found", value=value)
+        return None
+    size = target_size(cx, cy)
+    quality = int(_env_float("IMAGE_QUALITY", 85))
+    try:
+        source_hash = _source_hash(path)
+        store = get_image_cache()
+        key = hashlib.sha256(f"{source_hash}\n{size}\n{quality}".encode()).hexdigest()
+        if store is not None:
+            cached = store.get(key)
+            metrics.IMAGE_CACHE.inc(result="hit" if cached is not None else "miss")
+            if cached is not None:
+                return _prepared(cached.read_bytes())
+        with metrics.span("image_resize"):
+            data, _ = fit_image(path, size, quality)
+        if store is not None:
+            store.put(key, data)
+        return _prepared(data)
+    except Exception as e:  # unreadable, not an image, decompression bomb...
+        log.warning("image_failed", value=value, error=str(e))
+        return None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Process-wide prepared-image store from the IMAGE_CACHE_* settings; None when disabled."""
+    from output_store import BoundedFileStore
+
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            max_mb = _env_float("IMAGE_CACHE_MAX_MB", 200)
+            if max_mb <= 0:
+                return None
+            root = os.environ.get("IMAGE_CACHE_DIR") or Path(__file__).parent / "temp" / "images"
+            _cache = BoundedFileStore(Path(root), int(max_mb * 1024 * 1024), _env_float("IMAGE_CACHE_TTL", 604800))
+        return _cache
+
+
+# ---------- python-pptx ----------
+def picture_tokens(shape) -> tuple[str, ...]:
+    """Placeholders in a picture shape's alt text and name (empty for other shapes)."""
+    from pptx.oxml.ns import qn
+    from template_cache import PLACEHOLDER_PATTERN
+
+    element = shape._element
+    if element.tag != qn("p:pic"):
+        return ()
+    c_nv_pr = element.find(f"{qn('p:nvPicPr')}/{qn('p:cNvPr')}")
+    if c_nv_pr is None:
+        return ()
+    text = f"{c_nv_pr.get('descr', '')}\n{c_nv_pr.get('name', '')}"
+    return tuple(dict.fromkeys(PLACEHOLDER_PATTERN.findall(text)))
+
+
+def fill_picture(slide, shape, tokens, replacements: dict[str, str]) -> bool:
+    """Point a picture shape at its placeholder's image. Returns True if it changed."""
+    from pptx.oxml.ns import qn
+
+    value = image_value(tokens, replacements)
+    if value is None:
+        return False
+    prepared = prepare_image(value, shape.width, shape.height)
+    if prepared is None:
+        return False
+    blip_fill = shape._element.find(qn("p:blipFill"))
+    blip = blip_fill.find(qn("a:blip")) if blip_fill is not None else None
+    if blip is None:
+        return False
+    # get_or_add_image_part reuses the package's part (and the slide's relationship) for equal bytes
+    _, r_id = slide.part.get_or_add_image_part(BytesIO(prepared.data))
+    old = blip.get(qn("r:embed"))
+    blip.set(qn("r:embed"), r_id)
+    src_rect = blip_fill.find(qn("a:srcRect"))
+    if src_rect is not None:  # the image is already cropped to the frame
+        blip_fill.remove(src_rect)
+    if old and old != r_id and old not in slide._element.xpath("//@r:embed | //@r:link | //@r:id"):
+        slide.part.rels.pop(old)
+    return True
+
+
+def fill_pictures(slide, replacements: dict[str, str]) -> int:
+    """Fill every image placeholder of a slide (groups included). Returns the number filled."""
+    from template_cache import _iter_shapes_with_path
+
+    filled = 0
+    for _, shape in _iter_shapes_with_path(slide.shapes):
+        tokens = picture_tokens(shape)
+        if tokens and fill_picture(slide, shape, tokens, replacements):
+            filled += 1
+    return filled
+
+
+# ---------- OOXML ----------
+class PictureSlot(NamedTuple):
+    index: int  # position among the slide's p:pic elements
+    tokens: tuple[str, ...]
+    cx: int | None
+    cy: int | None
+
+
+def slide_pictures(xml: bytes) -> tuple[PictureSlot, ...]:
+    """Image placeholders of a slide part."""
+    from lxml import etree
+
+    from ooxml_engine import _qn
+    from template_cache import PLACEHOLDER_PATTERN
+
+    if b"<p:pic" not in xml:
+        return ()
+    slots = []
+    for index, pic in enumerate(etree.fromstring(xml).iter(_qn("p:pic"))):
+        c_nv_pr = pic.find(f"{_qn('p:nvPicPr')}/{_qn('p:cNvPr')}")
+        if c_nv_pr is None:
+            continue
+        tokens = PLACEHOLDER_PATTERN.findall(f"{c_nv_pr.get('descr', '')}\n{c_nv_pr.get('name', '')}")
+        if not tokens:
+            continue
+        ext = pic.find(f"{_qn('p:spPr')}/{_qn('a:xfrm')}/{_qn('a:ext')}")
+        cx = int(ext.get("cx")) if ext is not None else None
+        cy = int(ext.get("cy")) if ext is not None else None
+        slots.append(PictureSlot(index, tuple(dict.fromkeys(tokens)), cx, cy))
+    return tuple(slots)
+
+
+def relationship_id(image: PreparedImage) -> str:
+    """Relationship id for a filled image: one per media part, so equal images share it."""
+    return f"rIdFilled{image.digest[:12]}"
+
+
+def set_pictures(root, embeds: dict[int, str]) -> None:
+    """Point the p:pic elements at `embeds` positions of a slide tree to new relationship ids (dropping their crop)."""
+    from ooxml_engine import _qn
+
+    for index, pic in enumerate(root.iter(_qn("p:pic"))):
+        r_id = embeds.get(index)
+        if r_id is None:
+            continue
+        blip_fill = pic.find(_qn("p:blipFill"))
+        blip = blip_fill.find(_qn("a:blip")) if blip_fill is not None else None
+        if blip is None:
+            continue
+        blip.set(_qn("r:embed"), r_id)
+        src_rect = blip_fill.find(_qn("a:srcRect"))
+        if src_rect is not None:
+            blip_fill.remove(src_rect)
+
+
+def sources_key(pictures, replacements: dict[str, str]) -> str:
+    """
+    Content hashes of the images a fill uses ("" when none), for output keys:
+    replacing an image file under the same path changes the key.
+    """
+    keys = []
+    for tokens in pictures:
+        value = image_value(tokens, replacements)
+        if value is not None:
+            keys.append(source_key(value) or "")
+    return ",".join(keys)
+
+
+def add_image_relationships(rels_xml: bytes, targets: dict[str, str]) -> bytes:
+    """A slide's .rels with an image relationship per (id -> media part name) added."""
+    from lxml import etree
+
+    from ooxml_engine import NS
+
+    root = etree.fromstring(rels_xml)
+    existing = {rel.get("Id") for rel in root}
+    for r_id, part_name in targets.items():
+        if r_id in existing:
+            continue
+        etree.SubElement(root, f"{{{NS['rel']}}}Relationship", Id=r_id,
+                         Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image",
+                         Target=f"../media/{part_name.rsplit('/', 1)[-1]}")
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+def add_content_types(content_types_xml: bytes, extensions: set[str]) -> bytes:
+    """[Content_Types].xml with a Default entry for each image extension it lacks."""
+    from lxml import etree
+
+    ct_ns = "http://schemas.openxmlformats.org/package/2006/content-types"
+    root = etree.fromstring(content_types_xml)
+    known = {d.get("Extension", "").lower() for d in root.iter(f"{{{ct_ns}}}Default")}
+    missing = sorted(ext for ext in extensions if ext not in known)
+    if not missing:
+        return content_types_xml
+    for ext in missing:
+        root.insert(0, etree.Element(f"{{{ct_ns}}}Default", Extension=ext, ContentType=f"image/{ext}"))
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
@@ -0,0 +1,142 @@
+"""
+Asynchronous generation jobs.
+
+`/jobs` endpoints hand generations to a job queue instead of running them in
+the request thread. The queue backend is chosen with JOB_BACKEND; the only
+backend shipped is "inprocess": a bounded thread pool inside the web process,
+meant for local use and single-worker deployments (job state lives in that
+process's memory, so polls must reach the same worker).
+
+Settings (env):
+- JOB_MAX_WORKERS: generations running at once (default 2)
+- JOB_MAX_QUEUE: jobs waiting or running before new submissions are rejected (default 20)
+- JOB_RESULT_TTL: seconds a finished job and its result are kept (default 600)
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from logs import get_logger
+
+log = get_logger("jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+class InProcessJobQueue:
+    """Bounded thread pool + in-memory job table."""
+
+    def __init__(self, max_workers: int, max_queue: int, result_ttl: float):
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _active_count(self) -> int:
+        return sum(1 for job in self._jobs.values() if job["status"] in (QUEUED, RUNNING))
+
+    def _expire(self) -> None:
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] and now - job["finished_at"] > self.result_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, func, *args, **kwargs) -> str:
+        """
+        Queue `func(*args, progress=..., **kwargs)`; it must return the result bytes.
+        Raises QueueFullError when JOB_MAX_QUEUE jobs are already pending.
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            if self._active_count() >= self.max_queue:
+                raise QueueFullError(f"Job queue is full ({self.max_queue} jobs pending).")
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": QUEUED,
+                "slides_done": 0,
+                "slides_total": None,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+            }
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id: str, func, args, kwargs) -> None:
+        job = self._jobs[job_id]
+
+        def progress(done: int, total: int) -> None:
+            job["slides_done"] = done
+            job["slides_total"] = total
+
+        job["status"] = RUNNING
+        job["started_at"] = time.time()
+        try:
+            job["result"] = func(*args, progress=progress, **kwargs)
+            job["status"] = DONE
+        except Exception as e:
+            log.exception("job_failed", job_id=job_id, error=str(e))
+            job["error"] = str(e)
+            job["status"] = FAILED
+        finally:
+            job["finished_at"] = time.time()
+
+    def status(self, job_id: str) -> dict | None:
+        """Public view of a job (everything except the result bytes)."""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: v for k, v in job.items() if k != "result"}
+
+    def result(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job["result"] if job else None
+
+
+JOB_BACKENDS = {"inprocess": InProcessJobQueue}
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Process-wide job queue, created on first use from the JOB_* settings."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            backend = os.environ.get("JOB_BACKEND", "inprocess").strip().lower()
+            if backend not in JOB_BACKENDS:
+                raise ValueError(f"Unknown JOB_BACKEND '{backend}'. Available: {', '.join(JOB_BACKENDS)}")
+            _queue = JOB_BACKENDS[backend](
+                max_workers=_env_int("JOB_MAX_WORKERS", 2),
+                max_queue=_env_int("JOB_MAX_QUEUE", 20),
+                result_ttl=float(_env_int("JOB_RESULT_TTL", 600)),
+            )
+        return _queue
@@ -0,0 +1,109 @@
+"""
+Structured, sampled, level-controlled logging for the backend.
+
+Loggers come from `get_logger(name)` and take the event as the message and
+any details as keyword fields:
+
+    log = get_logger("backend")
+    log.info("excel_loaded", rows=12, columns=30)
+
+Records are written to stderr as one JSON object per line (or as plain
+`event key=value` text) under the "ppt" logger namespace, which does not
+propagate to the root logger.
+
+Settings (env):
+- LOG_LEVEL: DEBUG / INFO / WARNING / ERROR (default INFO)
+- LOG_FORMAT: json or text (default json)
+- LOG_SAMPLE_RATE: fraction of DEBUG/INFO records kept, 0..1 (default 1).
+  Warnings and errors are never sampled out.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+ROOT_LOGGER = "ppt"
+
+# LoggerAdapter keywords that belong to logging itself, not to the event fields
+_LOGGING_KWARGS = ("exc_info", "stack_info", "stacklevel", "extra")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{k}={v}" for k, v in getattr(record, "fields", {}).items())
+        line = f"[{record.levelname}] {record.name}: {record.getMessage()}" + (f" {fields}" if fields else "")
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class SampleFilter(logging.Filter):
+    """Keep a random `rate` fraction of records below WARNING."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Moves keyword arguments into the record's `fields`."""
+
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs) if k not in _LOGGING_KWARGS}
+        kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+        return msg, kwargs
+
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure() -> None:
+    """Attach the handler to the "ppt" logger from the LOG_* settings (once per process)."""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        level = os.environ.get("LOG_LEVEL", "INFO").strip().upper()
+        try:
+            rate = min(1.0, max(0.0, float(os.environ.get("LOG_SAMPLE_RATE", "1"))))
+        except ValueError:
+            rate = 1.0
+        handler = logging.StreamHandler(sys.stderr)
+        if os.environ.get("LOG_FORMAT", "json").strip().lower() == "text":
+            handler.setFormatter(TextFormatter())
+        else:
+            handler.setFormatter(JsonFormatter())
+        handler.addFilter(SampleFilter(rate))
+
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.setLevel(getattr(logging, level, logging.INFO))
+        logger.addHandler(handler)
+        logger.propagate = False
+        _configured = True
+
+
+def get_logger(name: str) -> StructuredLogger:
+    configure()
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
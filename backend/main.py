@@ -14,22 +14,57 @@ Run:
 POST:
   /generate
   FormData with 'template' (PPTX) and 'excel' (XLSX) files
+
+  /generate/batch
+  Same files; renders a range of rows and streams back a ZIP of decks
+
+  /jobs
+  Same files as /generate; queues the generation and returns a job id to poll
+
+  /datasets
+  An Excel file, stored once as a memory-mapped dataset; /generate and /jobs
+  then take its `dataset_id` instead of the file (see datasets.py)
+
+  A row can also be picked by key (key_column / key_value), and mappings can
+  pull fields from related sheets through joins (see workbook_cache.py)
+
+GET:
+  /metrics
+  Prometheus metrics: per-stage timings and per-generation counts
 """
 
+from __future__ import annotations
+
+import functools
 import json
 import os
 import re
-import uuid
+import tempfile
+from dataclasses import dataclass
 from io import BytesIO
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import pandas as pd
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, Request, Response, request, send_file, jsonify, make_response
 from flask_cors import CORS
-from pptx import Presentation
-from pptx.dml.color import RGBColor
+from werkzeug.exceptions import HTTPException
+
+import metrics
+from admission import AdmissionRejected
+from logs import get_logger
+
+# pandas, numpy and python-pptx are imported where they are used, so importing
+# this module (and answering /health after a cold start) does not wait for them.
+# warmup.py loads them in the background once the server is up.
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    from pptx import Presentation
+
+log = get_logger("backend")
 
 # ---------- Temp directory ----------
+# Generated decks are kept in a bounded store under here (see output_store.py)
 TEMP_DIR = Path(__file__).parent / "temp"
 TEMP_DIR.mkdir(exist_ok=True)
 
@@ -76,32 +111,81 @@ _DEFAULT_MAPPINGS = [
 ]
 
 
+# JSON-file snapshot: re-read only when the file's mtime/size change
+_file_snapshot: dict = {"stamp": None, "mappings": None, "joins": None}
+
+
+def _file_stamp() -> tuple[int, int] | None:
+    try:
+        st = MAPPING_CONFIG_PATH.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
 def load_mapping_config() -> list:
-    """Load mappings from database (if DATABASE_URL) or JSON file."""
+    """Load mappings from database (if DATABASE_URL) or JSON file.
+
+    Both sources are served from an in-memory snapshot that is only refreshed
+    when the stored version changes. Treat the returned list as read-only.
+    """
     import db as db_module
     db_mappings = db_module.load_mappings_from_db()
     if db_mappings is not None:
-        if not db_mappings:
+        if not db_mappings and db_module.mappings_version() == 0:
+            # Never saved: seed the defaults
             save_mapping_config(_DEFAULT_MAPPINGS)
             return _DEFAULT_MAPPINGS
         return db_mappings
     # Fallback: JSON file (local dev)
-    if MAPPING_CONFIG_PATH.exists():
+    stamp = _file_stamp()
+    if stamp is not None:
+        if _file_snapshot["stamp"] == stamp:
+            return _file_snapshot["mappings"]
         with open(MAPPING_CONFIG_PATH, "r", encoding="utf-8") as f:
             data = json.load(f)
-            return data.get("mappings", [])
+        _file_snapshot.update(stamp=stamp, mappings=data.get("mappings", []), joins=data.get("joins", []))
+        return _file_snapshot["mappings"]
     save_mapping_config(_DEFAULT_MAPPINGS)
     return _DEFAULT_MAPPINGS
 
 
-def save_mapping_config(mappings: list[dict]) -> None:
-    """Save mappings to database (if DATABASE_URL) or JSON file."""
+def load_join_config() -> list:
+    """
+    Join declarations for related workbook sheets, stored with the mappings:
+    [{"sheet": "projects", "sheetColumn": "candidate_id", "excelColumn": "candidate_id"}].
+    Treat the returned list as read-only.
+    """
+    import db as db_module
+    db_joins = db_module.load_joins_from_db()
+    if db_joins is not None:
+        return db_joins
+    load_mapping_config()  # refreshes the file snapshot
+    return _file_snapshot["joins"] or []
+
+
+def save_mapping_config(mappings: list[dict], joins: list[dict] | None = None) -> None:
+    """Save mappings (and joins; None keeps the current ones) to database (if DATABASE_URL) or JSON file."""
     import db as db_module
-    if db_module.save_mappings_to_db(mappings):
+    if db_module.save_mappings_to_db(mappings, joins):
         return
-    # Fallback: JSON file (local dev)
-    with open(MAPPING_CONFIG_PATH, "w", encoding="utf-8") as f:
-        json.dump({"mappings": mappings}, f, indent=2)
+    if joins is None:
+        joins = load_join_config() if _file_stamp() is not None else []
+    # Fallback: JSON file (local dev). Write-then-rename so readers never see a partial file.
+    tmp_path = MAPPING_CONFIG_PATH.with_name(f"{MAPPING_CONFIG_PATH.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"mappings": mappings, "joins": joins} if joins else {"mappings": mappings}, f, indent=2)
+    os.replace(tmp_path, MAPPING_CONFIG_PATH)
+
+
+def get_mapping_version() -> str:
+    """Identifier of the mapping config currently in effect (changes on every save)."""
+    import db as db_module
+    version = db_module.mappings_version()
+    if version is not None:
+        return f"db:{version}"
+    stamp = _file_stamp()
+    return f"file:{stamp[0]}:{stamp[1]}" if stamp else "default"
 
 
 def get_full_mapping(row: pd.Series) -> dict[str, str]:
@@ -129,11 +213,45 @@ def get_full_mapping(row: pd.Series) -> dict[str, str]:
 def _normalize(s: str) -> str:
     return re.sub(r"\s+", " ", str(s or "")).strip()
 
-def load_excel_df(excel_file) -> pd.DataFrame:
-    """Load Excel from file object or path."""
-    df = pd.read_excel(excel_file, engine="openpyxl")
-    df.columns = [str(c).strip() for c in df.columns]
-    return df
+def load_excel_df(excel_file, columns=None, nrows: int | None = None, filename: str | None = None) -> pd.DataFrame:
+    """Load Excel (or CSV / Parquet) from file object or path.
+
+    - `columns`: only read these columns (names, or a function of the header)
+    - `nrows`: stop reading after this many rows
+    - `filename`: used to detect the format when `excel_file` has no name
+    """
+    import data_loader
+    filename = filename or getattr(excel_file, "filename", None)
+    source = getattr(excel_file, "stream", excel_file)
+    return data_loader.load_table(source, filename=filename, columns=columns, nrows=nrows)
+
+def referenced_columns(template_text: str, header: list[str]) -> list[str]:
+    """Excel columns the template can use: mapped columns and [column] name matches found in its text."""
+    wanted = set()
+    for item in load_mapping_config():
+        ph = item.get("pptPlaceholder", "")
+        col = item.get("excelColumn", "")
+        if ph and col and ph in template_text:
+            wanted.add(col)
+    wanted.update(col for col in header if f"[{col}]" in template_text)
+    return [col for col in header if col in wanted]
+
+def joined_fields(template_text: str, joins: dict) -> list[str]:
+    """
+    Mapped columns the template uses that name a field of a related sheet
+    ('sheet!column' / 'sheet[n]!column', for a sheet with a declared join).
+    """
+    import workbook_cache
+    fields = []
+    for item in load_mapping_config():
+        ph = item.get("pptPlaceholder", "")
+        col = item.get("excelColumn", "")
+        if not (ph and col and ph in template_text) or col in fields:
+            continue
+        joined = workbook_cache.parse_joined_field(col)
+        if joined is not None and joined.sheet in joins:
+            fields.append(col)
+    return fields
 
 def select_row(df: pd.DataFrame, row_index: int = 0) -> pd.Series:
     """Select a row from the dataframe."""
@@ -141,16 +259,128 @@ def select_row(df: pd.DataFrame, row_index: int = 0) -> pd.Series:
         raise ValueError(f"row_index out of range. Got {row_index}, Excel has {len(df)} rows.")
     return df.iloc[row_index]
 
-def build_replacements(row: pd.Series) -> dict[str, str]:
+def select_rows(
+    df: pd.DataFrame,
+    start: int = 0,
+    end: int | None = None,
+    filter_column: str | None = None,
+    filter_value: str | None = None,
+) -> pd.DataFrame:
+    """Select rows [start, end) and optionally keep only rows where filter_column == filter_value."""
+    if start < 0 or start > len(df):
+        raise ValueError(f"start out of range. Got {start}, Excel has {len(df)} rows.")
+    if end is None or end > len(df):
+        end = len(df)
+    if end < start:
+        raise ValueError(f"end must be >= start. Got start={start}, end={end}.")
+    rows = df.iloc[start:end]
+    if filter_column:
+        if filter_column not in df.columns:
+            raise ValueError(f"Unknown filter column '{filter_column}'.")
+        values = normalize_values(rows[filter_column].to_numpy(dtype=object))
+        import pandas as pd
+        rows = rows[pd.Series(values, index=rows.index).fillna("") == _normalize(filter_value or "")]
+    return rows
+
+
+@functools.cache
+def _whitespace_collapser():
+    r"""
+    Vectorized re.sub(r"\s+", " ", str(v)).strip(): str.split() splits on
+    exactly the characters \s matches, without the regex engine.
+    """
+    import numpy as np
+    return np.frompyfunc(lambda v: " ".join(str(v).split()), 1, 1)
+
+
+def normalize_values(values: np.ndarray, blank_as_missing: bool = False) -> np.ndarray:
+    """
+    _normalize for an object array of cell values (any shape), in one
+    vectorized pass over all of them.
+
+    Missing cells (NaN/None/NaT) become NaN, as do whitespace-only cells with
+    blank_as_missing (the build_replacements rule).
+    """
+    import numpy as np
+    import pandas as pd
+
+    missing = pd.isna(values.ravel())
+    text = _whitespace_collapser()(values.ravel())
+    if blank_as_missing:
+        missing |= text == ""
+    # _normalize maps falsy values (0, False, "") to ""
+    # (only asked of present cells: bool(pd.NA) raises)
+    present = ~missing
+    falsy = np.zeros_like(missing)
+    falsy[present] = ~values.ravel()[present].astype(bool)
+    text[falsy] = ""
+    text[missing] = np.nan
+    return text.reshape(values.shape)
+
+
+@dataclass
+class ReplacementTable:
+    """
+    Replacement values for many rows: one column per placeholder, one row per
+    DataFrame row, all plain strings. Missing-field texts are shared objects.
+    """
+    placeholders: list[str]
+    values: np.ndarray  # shape (rows, placeholders), dtype object
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def row(self, i: int) -> dict[str, str]:
+        """The build_replacements() dict for the i-th row."""
+        return dict(zip(self.placeholders, self.values[i]))
+
+
+def build_replacement_table(df: pd.DataFrame, mapping: dict[str, str] | None = None) -> ReplacementTable:
+    """
+    build_replacements for every row of df at once.
+
+    Each mapped column is normalized once for all rows with vectorized string
+    operations, and missing / blank cells get the same 'No X field in excel'
+    text build_replacements uses. The mapping is resolved once (pass `mapping`
+    to reuse one from get_full_mapping).
+    """
+    import numpy as np
+    import pandas as pd
+
+    if mapping is None:
+        mapping = get_full_mapping(pd.Series(index=df.columns, dtype=object))
+
+    # All mapped columns are normalized together, each only once
+    columns = list(dict.fromkeys(col for col in mapping.values() if col in df.columns))
+    normalized = normalize_values(df[columns].to_numpy(dtype=object), blank_as_missing=True)
+    position = {col: k for k, col in enumerate(columns)}
+
+    placeholders = list(mapping)
+    values = np.empty((len(df), len(placeholders)), dtype=object)
+    for j, (placeholder, col) in enumerate(mapping.items()):
+        missing_text = f"No {placeholder.strip('[]')} field in excel"
+        if col not in position:
+            values[:, j] = missing_text
+            continue
+        column_values = normalized[:, position[col]]
+        values[:, j] = np.where(pd.isna(column_values), missing_text, column_values)
+    return ReplacementTable(placeholders, values)
+
+
+def build_replacements(row: pd.Series, mapping: dict[str, str] | None = None) -> dict[str, str]:
     """Build replacement dict using the mapping.
 
     - Uses config mapping + auto name-matching (PPT [X] -> Excel column X).
     - Normal values are normalized.
     - Empty/missing values are replaced with a red warning text like:
       'No quality_1_title field in excel'.
+    - Pass `mapping` (from get_full_mapping) to reuse it across many rows.
     """
+    import pandas as pd
+
     replacements: dict[str, str] = {}
-    mapping = get_full_mapping(row)
+    if mapping is None:
+        mapping = get_full_mapping(row)
 
     for placeholder, col in mapping.items():
         field_name = placeholder.strip("[]")
@@ -166,39 +396,85 @@ def build_replacements(row: pd.Series) -> dict[str, str]:
     
     return replacements
 
-from pptx.util import Pt
-
 NAME_PLACEHOLDERS = {"[candidate_name]", "[Name]"}
-NAME_COLOR = RGBColor(0, 102, 204)  # a pleasant blue for names
-MISSING_FIELD_COLOR = RGBColor(220, 53, 69)  # a nice red for missing fields
+# Hex strings; _rgb() turns them into python-pptx colors when a run is colored
+NAME_COLOR = "0066CC"  # a pleasant blue for names
+MISSING_FIELD_COLOR = "DC3545"  # a nice red for missing fields
+
+
+@functools.cache
+def _rgb(hex_color: str):
+    from pptx.dml.color import RGBColor
+    return RGBColor.from_string(hex_color)
+
+
+DEFAULT_FONT_SIZE = 18  # pt, assumed for runs that inherit their size
 
 
-def auto_fit_text(text_frame, max_font_size=None, min_font_size=8):
-    """Auto-fit text by reducing font size if content overflows while preserving style."""
+def text_frame_extents(shape, cell: tuple[int, int] | None = None) -> tuple[int, int] | None:
+    """(width, height) in EMU of a shape's text box, or of a table cell's."""
+    try:
+        if cell is not None:
+            table = shape.table
+            return table.columns[cell[1]].width, table.rows[cell[0]].height
+        if shape.width is None or shape.height is None:
+            return None
+        return shape.width, shape.height
+    except Exception:
+        return None
+
+
+def auto_fit_text(text_frame, max_font_size=None, min_font_size=8, extents=None):
+    """Auto-fit text by reducing font size if content overflows while preserving style.
+
+    - Turns on word wrap and caps sizes at `max_font_size`.
+    - With `extents` (box width, height in EMU), measures the wrapped text with
+      font metrics (see text_fit.py) and scales every run down proportionally
+      until it fits, but not below `min_font_size`.
+    """
     if not text_frame or not text_frame.text.strip():
         return
-    
+    from pptx.util import Pt
+
     text_frame.word_wrap = True
     
     # Get original font size
     original_size = None
+    font_name = None
     for paragraph in text_frame.paragraphs:
         for run in paragraph.runs:
             if run.font.size:
                 original_size = run.font.size
+                font_name = run.font.name
                 break
         if original_size:
             break
     
-    if not original_size:
-        return
-    
     # Apply max font size limit
-    if max_font_size and original_size > Pt(max_font_size):
+    if original_size and max_font_size and original_size > Pt(max_font_size):
         for paragraph in text_frame.paragraphs:
             for run in paragraph.runs:
                 if run.font.size:
                     run.font.size = Pt(max_font_size)
+        original_size = Pt(max_font_size)
+
+    if not extents:
+        return
+
+    # Shrink to fit the box
+    import text_fit
+    size_pt = original_size.pt if original_size else DEFAULT_FONT_SIZE
+    width_pt = (extents[0] - text_frame.margin_left - text_frame.margin_right) / 12700
+    height_pt = (extents[1] - text_frame.margin_top - text_frame.margin_bottom) / 12700
+    paragraphs = tuple(p.text for p in text_frame.paragraphs)
+    fitted = text_fit.fit_font_size(paragraphs, font_name, size_pt, min_font_size, width_pt, height_pt)
+    if fitted >= size_pt:
+        return
+    scale = fitted / size_pt
+    for paragraph in text_frame.paragraphs:
+        for run in paragraph.runs:
+            current = run.font.size.pt if run.font.size else size_pt
+            run.font.size = Pt(max(min_font_size, round(current * scale * 2) / 2))
 
 def _is_missing_field_text(text: str) -> bool:
     return text.startswith("No ") and text.endswith(" field in excel")
@@ -243,7 +519,7 @@ def _split_run_for_name(paragraph, run, placeholder, replacement_text):
     name_run = paragraph.add_run()
     name_run.text = replacement_text
     _copy_run_format(run, name_run)
-    name_run.font.color.rgb = NAME_COLOR
+    name_run.font.color.rgb = _rgb(NAME_COLOR)
     # Insert new runs directly after the original run using underlying XML
     run._r.addnext(name_run._r)
 
@@ -277,7 +553,7 @@ def _highlight_name_in_paragraph(paragraph, name_text: str):
         name_run = paragraph.add_run()
         name_run.text = name_text
         _copy_run_format(run, name_run)
-        name_run.font.color.rgb = NAME_COLOR
+        name_run.font.color.rgb = _rgb(NAME_COLOR)
         run._r.addnext(name_run._r)
 
         # After run
@@ -290,9 +566,86 @@ def _highlight_name_in_paragraph(paragraph, name_text: str):
         break
 
 
-def replace_in_text_runs(text_frame, replacements: dict[str, str]) -> int:
+class PlaceholderMatcher:
+    """All placeholders of one replacement set compiled into a single regex.
+
+    Build it once per replacement dict and reuse it for every run; one
+    `finditer` over a run finds every placeholder occurrence, instead of one
+    substring test and `str.replace` per placeholder.
+    """
+
+    def __init__(self, replacements: dict[str, str]):
+        self.replacements = replacements
+        # Longest first so "[name_full]" wins over a "[name" prefix at the same offset
+        keys = sorted((ph for ph in replacements if ph), key=len, reverse=True)
+        self.pattern = re.compile("|".join(map(re.escape, keys))) if keys else None
+
+    def __bool__(self) -> bool:
+        return self.pattern is not None
+
+    def finditer(self, text: str):
+        return self.pattern.finditer(text) if self.pattern else iter(())
+
+    def search(self, text: str):
+        return self.pattern.search(text) if self.pattern else None
+
+
+def _as_matcher(replacements) -> PlaceholderMatcher:
+    if isinstance(replacements, PlaceholderMatcher):
+        return replacements
+    return PlaceholderMatcher(replacements)
+
+
+def replace_in_run(paragraph, run, matcher: PlaceholderMatcher) -> bool:
+    """Replace placeholders inside a single run in one scan. Returns True if the run changed."""
+    original = run.text
+    if not original:
+        return False
+
+    pieces: list[str] = []
+    pos = 0
+    missing_highlight = False
+    name_match = None
+    for match in matcher.finditer(original):
+        ph = match.group(0)
+        replacement_text = matcher.replacements[ph]
+        # For name placeholders, split the run so only the
+        # name substring is colored, not the whole line.
+        if ph in NAME_PLACEHOLDERS and not _is_missing_field_text(replacement_text):
+            name_match = match
+            break
+        pieces.append(original[pos:match.start()])
+        pieces.append(replacement_text)
+        pos = match.end()
+        if _is_missing_field_text(replacement_text):
+            missing_highlight = True
+
+    if name_match is None and not pieces:
+        return False
+
+    if name_match is not None:
+        ph = name_match.group(0)
+        run.text = "".join(pieces) + original[pos:]
+        _split_run_for_name(paragraph, run, ph, matcher.replacements[ph])
+        # The text after the name went to its own run; fill that one too
+        if original[name_match.end():]:
+            runs = paragraph.runs
+            idx = next(i for i, r in enumerate(runs) if r._r is run._r)
+            replace_in_run(paragraph, runs[idx + 2], matcher)
+    else:
+        pieces.append(original[pos:])
+        run.text = "".join(pieces)
+
+    if missing_highlight:
+        run.font.color.rgb = _rgb(MISSING_FIELD_COLOR)
+    return True
+
+
+def replace_in_text_runs(text_frame, replacements) -> int:
     """Replace placeholders while preserving formatting (font, color, style).
 
+    `replacements` is a placeholder -> text dict or a prebuilt PlaceholderMatcher.
+
     Additionally:
     - Candidate name placeholders (`[candidate_name]`, `[Name]`) are colored `NAME_COLOR`.
     - Missing/empty fields (text like 'No quality_1_title field in excel') are colored `MISSING_FIELD_COLOR`.
@@ -301,64 +654,47 @@ def replace_in_text_runs(text_frame, replacements: dict[str, str]) -> int:
     if not text_frame:
         return 0
 
-    placeholders = list(replacements.keys())
-    if not placeholders:
+    matcher = _as_matcher(replacements)
+    if not matcher:
         return 0
 
     for paragraph in text_frame.paragraphs:
         # First pass: run-level replace (preserves formatting)
         for run in paragraph.runs:
-            original = run.text
-            if not original:
-                continue
-            new_text = original
-            missing_highlight = False
-            for ph in placeholders:
-                if ph in new_text:
-                    replacement_text = replacements[ph]
-                    # For name placeholders, split the run so only the
-                    # name substring is colored, not the whole line.
-                    if ph in NAME_PLACEHOLDERS and not _is_missing_field_text(replacement_text):
-                        if _split_run_for_name(paragraph, run, ph, replacement_text):
-                            new_text = run.text  # "before" part; name+after handled by new runs
-                            continue
-                    new_text = new_text.replace(ph, replacement_text)
-                    if _is_missing_field_text(replacement_text):
-                        missing_highlight = True
-            if new_text != original:
-                run.text = new_text
-                if missing_highlight:
-                    run.font.color.rgb = MISSING_FIELD_COLOR
+            if replace_in_run(paragraph, run, matcher):
                 count += 1
 
         # Second pass: handle placeholders spanning runs
         para_text = "".join([r.text or "" for r in paragraph.runs])
-        if any(ph in para_text for ph in placeholders):
-            merged = para_text
+        if matcher.search(para_text):
             missing_highlight = False
             name_texts: list[str] = []
-            for ph in placeholders:
-                if ph in merged:
-                    replacement_text = replacements[ph]
-                    merged = merged.replace(ph, replacement_text)
-                    if _is_missing_field_text(replacement_text):
-                        missing_highlight = True
-                    if ph in NAME_PLACEHOLDERS and not _is_missing_field_text(replacement_text):
-                        name_texts.append(replacement_text)
+
+            def _substitute(match):
+                nonlocal missing_highlight
+                ph = match.group(0)
+                replacement_text = matcher.replacements[ph]
+                if _is_missing_field_text(replacement_text):
+                    missing_highlight = True
+                elif ph in NAME_PLACEHOLDERS:
+                    name_texts.append(replacement_text)
+                return replacement_text
+
+            merged = matcher.pattern.sub(_substitute, para_text)
 
             if paragraph.runs:
                 # Preserve first run's formatting
                 first_run = paragraph.runs[0]
                 first_run.text = merged
                 if missing_highlight:
-                    first_run.font.color.rgb = MISSING_FIELD_COLOR
+                    first_run.font.color.rgb = _rgb(MISSING_FIELD_COLOR)
                 for r in paragraph.runs[1:]:
                     r.text = ""
             else:
                 new_run = paragraph.add_run()
                 new_run.text = merged
                 if missing_highlight:
-                    new_run.font.color.rgb = MISSING_FIELD_COLOR
+                    new_run.font.color.rgb = _rgb(MISSING_FIELD_COLOR)
 
             # After merging, highlight each name substring individually
             for name_text in name_texts:
@@ -381,62 +717,415 @@ def _iter_shape(shape):
         for s in shape.shapes:
             yield from _iter_shape(s)
 
-def apply_replacements_to_ppt(template_file, replacements: dict[str, str]) -> BytesIO:
-    """Apply replacements to the presentation while preserving formatting."""
-    prs = Presentation(template_file)
+FILL_ENGINES = ("pptx", "ooxml")
 
-    for slide_idx, slide in enumerate(prs.slides):
-        for shape in iter_all_shapes(slide):
-            if hasattr(shape, "has_text_frame") and shape.has_text_frame:
-                replace_in_text_runs(shape.text_frame, replacements)
-                
-                # Auto-fit for first slide
-                if slide_idx == 0:
-                    auto_fit_text(shape.text_frame, max_font_size=44)
+
+def get_fill_engine() -> str:
+    """Fill engine from PPT_FILL_ENGINE env: 'pptx' (default) or 'ooxml'."""
+    engine = os.environ.get("PPT_FILL_ENGINE", "pptx").strip().lower()
+    return engine if engine in FILL_ENGINES else "pptx"
+
+
+def apply_replacements_to_ppt(template_file, replacements: dict[str, str], engine: str | None = None,
+                              progress=None, out=None, template_key: str | None = None):
+    """Apply replacements to the presentation while preserving formatting.
+
+    engine:
+    - "pptx": uses the compiled template cache (see template_cache.py) so repeated
+      fills of the same template only touch the indexed placeholder runs. Falls back
+      to a full scan when a replacement key is not in a recognised placeholder syntax.
+    - "ooxml": edits slide XML directly and copies every other part byte-for-byte
+      (see ooxml_engine.py); slides whose values did not change since an earlier
+      fill are reused from the slide cache (see slide_cache.py).
+    Pass the template's content hash as `template_key` if it is already known.
+    Defaults to get_fill_engine().
+
+    `progress(slides_done, slides_total)` is called as slides are filled.
+
+    `template_file` is a path, bytes or a seekable binary stream. The result is
+    written to `out` (any writable file object, seekable or not) when given,
+    else to a new BytesIO, which is returned rewound. With OUTPUT_OPTIMIZE on,
+    it goes through the optimization pass first (see optimize.py).
+    """
+    import optimize
+
+    if optimize.enabled():
+        return optimize.optimize_output(
+            lambda sink: _fill_package(template_file, replacements, engine, progress, sink, template_key), out)
+    return _fill_package(template_file, replacements, engine, progress, out, template_key)
+
+
+def _fill_package(template_file, replacements: dict[str, str], engine: str | None = None,
+                  progress=None, out=None, template_key: str | None = None):
+    import template_cache
+
+    if isinstance(template_file, (str, Path)):
+        template_file = template_cache.read_template_bytes(template_file)
+    if (engine or get_fill_engine()) == "ooxml":
+        import ooxml_engine
+        return ooxml_engine.apply_replacements(template_file, replacements, progress, out, template_key)
+
+    compiled = template_cache.get_compiled_template(template_file, template_key)
+    if compiled.covers(replacements):
+        return template_cache.fill_compiled(compiled, replacements, progress, out)
+    return _apply_replacements_full_scan(BytesIO(compiled.data), replacements, progress, out)
+
+
+def fill_slide(slide, matcher: PlaceholderMatcher, first_slide: bool = False) -> None:
+    """Replace placeholders in every shape and table of one slide, then auto-fit its text and fill its images."""
+    import images
+
+    for shape in iter_all_shapes(slide):
+        if hasattr(shape, "has_text_frame") and shape.has_text_frame:
+            with metrics.span("replace"):
+                replace_in_text_runs(shape.text_frame, matcher)
+            
+            # Auto-fit for first slide
+            with metrics.span("auto_fit"):
+                if first_slide:
+                    auto_fit_text(shape.text_frame, max_font_size=44, extents=text_frame_extents(shape))
                 else:
-                    auto_fit_text(shape.text_frame)
+                    auto_fit_text(shape.text_frame, extents=text_frame_extents(shape))
+
+        # Tables
+        if hasattr(shape, "has_table") and shape.has_table:
+            for r, row in enumerate(shape.table.rows):
+                for c, cell in enumerate(row.cells):
+                    with metrics.span("replace"):
+                        replace_in_text_runs(cell.text_frame, matcher)
+                    with metrics.span("auto_fit"):
+                        auto_fit_text(cell.text_frame, extents=text_frame_extents(shape, (r, c)))
+
+    with metrics.span("images"):
+        images.fill_pictures(slide, matcher.replacements)
+
+
+def _apply_replacements_full_scan(template_file, replacements: dict[str, str], progress=None, out=None):
+    """Walk every shape of the presentation and replace placeholders."""
+    from pptx import Presentation
+
+    with metrics.span("template_parse"):
+        prs = Presentation(template_file)
+    matcher = PlaceholderMatcher(replacements)
+    total = len(prs.slides)
+
+    for slide_idx, slide in enumerate(prs.slides):
+        fill_slide(slide, matcher, first_slide=slide_idx == 0)
+        if progress:
+            progress(slide_idx + 1, total)
+
+    target = out if out is not None else BytesIO()
+    with metrics.span("save"):
+        prs.save(target)
+    if out is None:
+        target.seek(0)
+    return target
+
+
+def prepare_deck(template, excel_file, row_index: int = 0,
+                 excel_filename: str | None = None, key_column: str | None = None,
+                 key_value: str | None = None, template_key: str | None = None):
+    """
+    Compile the template (bytes or a seekable binary stream) and build the
+    replacements for one row: the row at `row_index`, or with `key_column`,
+    the first row whose key_column equals `key_value`. `excel_file` is an
+    upload, path or stream, or a stored datasets.Dataset. `template_key`: the
+    template's content hash, if already known. Returns (compiled, replacements).
+    """
+    import datasets
+    import template_cache
+    import workbook_cache
+    with metrics.span("template_parse"):
+        compiled = template_cache.get_compiled_template(template, template_key)
+
+    joins = workbook_cache.parse_joins(load_join_config())
+    fields = joined_fields(compiled.text, joins)
+    dataset = excel_file if isinstance(excel_file, datasets.Dataset) else None
+    if key_column or fields:
+        # The whole workbook, cached by content hash with its key indexes
+        with metrics.span("excel_load"):
+            if dataset is not None:
+                workbook = workbook_cache.get_dataset_workbook(dataset)
+            else:
+                workbook = workbook_cache.get_workbook(
+                    getattr(excel_file, "stream", excel_file),
+                    excel_filename or getattr(excel_file, "filename", None),
+                )
+        if key_column:
+            row_index = workbook.find_row(key_column, key_value)
+        select_row(workbook.main, row_index=row_index)  # range check
+        with metrics.span("join"):
+            rows = workbook.add_joined_columns(workbook.main.iloc[row_index:row_index + 1], fields, joins)
+        row = rows.iloc[0]
+    elif dataset is not None:
+        # Only the row and the columns the template uses are read from the mapped dataset
+        with metrics.span("excel_load"):
+            row = dataset.row(row_index, columns=lambda header: referenced_columns(compiled.text, header))
+    else:
+        # Load only the rows up to row_index and the columns the template uses
+        with metrics.span("excel_load"):
+            df = load_excel_df(
+                excel_file,
+                columns=lambda header: referenced_columns(compiled.text, header),
+                nrows=max(row_index, 0) + 1,
+                filename=excel_filename,
+            )
+        log.debug("excel_loaded", rows=len(df), columns=len(df.columns))
+
+        # Select row
+        row = select_row(df, row_index=row_index)
+    
+    # Build replacements
+    with metrics.span("mapping_fetch"):
+        mapping = get_full_mapping(row)
+    replacements = build_replacements(row, mapping)
+    _count_filled(compiled, replacements)
+    return compiled, replacements
+
+
+def _count_filled(compiled, replacements: dict[str, str]) -> None:
+    """Report the shapes, runs and placeholders this fill touches to the current trace."""
+    shapes = set()
+    runs = placeholders = 0
+    for loc, tokens in compiled.runs.items():
+        hits = sum(1 for ph in tokens if ph in replacements)
+        if hits:
+            shapes.add((loc.slide, loc.shape_path))
+            runs += 1
+            placeholders += hits
+    metrics.count("shapes", len(shapes))
+    metrics.count("runs", runs)
+    metrics.count("placeholders", placeholders)
+
+
+def generate_deck(template, excel_file, row_index: int = 0, progress=None,
+                  excel_filename: str | None = None) -> BytesIO:
+    """Full single-deck pipeline: load the needed Excel data, build replacements, fill the template."""
+    _, replacements = prepare_deck(template, excel_file, row_index, excel_filename)
+    return apply_replacements_to_ppt(template, replacements, progress=progress)
+
+
+def render_output(template, excel_file, row_index: int = 0, progress=None,
+                  excel_filename: str | None = None, stream: bool = False,
+                  key_column: str | None = None, key_value: str | None = None,
+                  template_key: str | None = None) -> dict:
+    """
+    Generate a deck through the output store.
+
+    `template` is bytes or a seekable binary stream; the row is picked as in
+    prepare_deck. Returns {"etag": key, "file": open file} when the deck is in
+    the store (a repeat request with identical inputs is served from it without
+    generating); the caller closes the file. Otherwise:
+    - stream=True: {"etag": key, "open_stream": callable}; calling it returns an
+      iterator that generates the deck as it is read, teeing it into the store.
+      Nothing is generated unless it is called. It keeps the current metrics
+      trace open until the stream ends.
+    - stream=False: the deck is written straight into the store and returned
+      as {"etag": key, "file": open file}, or as {"etag": key, "data": BytesIO}
+      when the store is disabled.
+    """
+    import images
+    import optimize
+    import output_store
+
+    compiled, replacements = prepare_deck(template, excel_file, row_index, excel_filename, key_column, key_value,
+                                          template_key)
+    engine = get_fill_engine()
+    key = output_store.output_key(compiled.content_hash, replacements, get_mapping_version(),
+                                  engine + optimize.settings_key(),
+                                  images.sources_key(compiled.pictures.values(), replacements))
+    store = output_store.get_output_store()
+    if store is not None:
+        # Opened now: an eviction before the response is sent cannot remove it
+        stored = store.open(key)
+        metrics.OUTPUT_STORE.inc(result="hit" if stored is not None else "miss")
+        if stored is not None:
+            log.info("output_store_hit", key=key)
+            if progress:
+                progress(1, 1)
+            return {"etag": key, "file": stored}
+
+    def write(sink):
+        apply_replacements_to_ppt(template, replacements, engine=engine, progress=progress, out=sink,
+                                  template_key=compiled.content_hash)
+
+    if stream:
+        def open_stream():
+            import streaming
+            trace = metrics.current_trace()
+            if trace is not None:
+                trace.defer()
+            tmp = store.temp_path() if store is not None else None
+
+            def on_close(completed: bool) -> None:
+                if completed and store is not None:
+                    store.commit(key, tmp)
+                if trace is not None:
+                    trace.finish("ok" if completed else "error")
+
+            return streaming.stream_writes(write, tmp, on_close)
+
+        return {"etag": key, "open_stream": open_stream}
+
+    if store is None:
+        return {"etag": key, "data": apply_replacements_to_ppt(template, replacements, engine=engine,
+                                                               progress=progress,
+                                                               template_key=compiled.content_hash)}
+    return {"etag": key, "file": store.write(key, write)}
+
+
+def _admit(operation: str, template, excel_file, excel_filename: str | None = None, rows: int | None = None,
+           copies: int | None = 1, processes: int = 1, first_row: int = 0, template_key: str | None = None):
+    """
+    Estimate a generation's memory from the template's parts and the workbook's
+    dimensions and reserve it from the admission budget (see admission.py).
+    `rows`: rows loaded (all when None). `copies`: slide copies held at once,
+    None for one per loaded row from `first_row` on. `processes`: decks
+    rendered at once. `template_key`: the template's content hash (see
+    template_cache.content_hash); pass it on to the generation so the
+    template is hashed once.
+    Returns the Ticket to release when the generation ends; raises AdmissionRejected.
+    """
+    import admission
+    import template_cache
+
+    info = admission.template_info(template)
+    try:
+        loaded, columns = admission.workbook_shape(excel_file, excel_filename, rows)
+    except Exception:
+        loaded, columns = 0, 0  # an unreadable workbook fails later, with a proper error
+    cells = loaded * columns
+    if copies is None:
+        copies = max(loaded - first_row, 1)
+    processes = max(1, min(processes, loaded or 1))
+    if template_key is None:
+        template_key = template_cache.content_hash(template)
+    compiled = template_cache.get_cached_template(template_key) is not None
+    per_process = admission.estimate(info, engine=get_fill_engine(), compiled=compiled, copies=copies)
+    cost = per_process * processes + cells * admission.CELL_BYTES
+    return admission.admit(cost, operation)
+
+
+PPTX_MIMETYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+
+def send_output(output: dict):
+    """Response for a render_output() result, with ETag / If-None-Match support."""
+    # Werkzeug only evaluates conditionals for GET/HEAD; /generate is a POST
+    if request.if_none_match.contains(output["etag"]):
+        if "file" in output:
+            output["file"].close()
+        response = Response(status=304)
+        response.set_etag(output["etag"])
+        return response
+    if "open_stream" in output:
+        response = Response(
+            output["open_stream"](),
+            mimetype=PPTX_MIMETYPE,
+            headers={"Content-Disposition": 'attachment; filename="generated.pptx"'},
+        )
+        response.set_etag(output["etag"])
+        response.cache_control.no_cache = True
+        return response
+    return send_file(
+        output.get("file") or output.get("data"),
+        as_attachment=True,
+        download_name="generated.pptx",
+        mimetype=PPTX_MIMETYPE,
+        etag=output["etag"],
+        conditional=True,
+        max_age=0,
+    )
+
+
+# ---------- Uploads ----------
+def _setting_bytes(name: str, default_mb: float) -> int:
+    """Size setting given in MB in the environment, as bytes (0 = no limit)."""
+    try:
+        return int(float(os.environ.get(name, default_mb)) * 1024 * 1024)
+    except ValueError:
+        return int(default_mb * 1024 * 1024)
 
-            # Tables
-            if hasattr(shape, "has_table") and shape.has_table:
-                for row in shape.table.rows:
-                    for cell in row.cells:
-                        replace_in_text_runs(cell.text_frame, replacements)
-                        auto_fit_text(cell.text_frame)
 
-    out = BytesIO()
-    prs.save(out)
-    out.seek(0)
-    return out
+class SpoolingRequest(Request):
+    """Keeps uploads up to UPLOAD_SPOOL_MB in memory and spools larger ones to a temp file."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=_setting_bytes("UPLOAD_SPOOL_MB", 1), mode="rb+")
+
+
+def _upload_size(file_storage) -> int:
+    stream = file_storage.stream
+    pos = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(pos)
+    return size
+
+
+def _template_size_error(file_storage):
+    """413 response if the template upload is over MAX_TEMPLATE_MB, else None."""
+    limit = _setting_bytes("MAX_TEMPLATE_MB", 50)
+    if limit and _upload_size(file_storage) > limit:
+        return jsonify({"error": f"Template is larger than the {limit / (1024 * 1024):g} MB limit."}), 413
+    return None
+
+
+def _detach_upload(file_storage):
+    """
+    Take an upload's stream away from the request, so it stays open after the
+    request ends (for a streamed response or a queued job). The caller closes it.
+    """
+    stream = file_storage.stream
+    stream.seek(0)
+    file_storage.stream = BytesIO()
+    return stream
 
 
 # ---------- Flask App ----------
 app = Flask(__name__)
+app.request_class = SpoolingRequest
+# Whole-request limit; larger uploads are rejected with 413 before being read
+app.config["MAX_CONTENT_LENGTH"] = _setting_bytes("MAX_UPLOAD_MB", 100) or None
 CORS(app)
 
-def _init_db_once():
-    try:
-        import db as db_module
-        db_module.init_db()
-    except Exception as e:
-        print(f"[Backend] DB init skipped: {e}")
 
-_init_db_once()
+@app.errorhandler(AdmissionRejected)
+def admission_rejected(e):
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    limit = app.config["MAX_CONTENT_LENGTH"]
+    return jsonify({"error": f"Upload is larger than the {limit / (1024 * 1024):g} MB limit."}), 413
 
 @app.get("/health")
 def health():
-    return jsonify({"ok": True})
+    import admission
+    import warmup
+    return jsonify({"ok": True, "warmup": warmup.status(), "admission": admission.stats()})
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text-format metrics for this worker process."""
+    return Response(metrics.render_metrics(), mimetype="text/plain; version=0.0.4")
 
 
 @app.get("/mapping")
 def get_mapping():
-    """Return current placeholder -> Excel column mappings."""
+    """Return current placeholder -> Excel column mappings and sheet joins."""
     mappings = load_mapping_config()
-    return jsonify({"mappings": mappings})
+    return jsonify({"mappings": mappings, "joins": load_join_config()})
 
 
 @app.put("/mapping")
 def put_mapping():
-    """Save placeholder -> Excel column mappings."""
+    """Save placeholder -> Excel column mappings (and sheet joins, when 'joins' is given)."""
     try:
         data = request.get_json()
         if not data or "mappings" not in data:
@@ -444,37 +1133,175 @@ def put_mapping():
         mappings = data["mappings"]
         if not isinstance(mappings, list):
             return jsonify({"error": "'mappings' must be an array"}), 400
-        save_mapping_config(mappings)
-        return jsonify({"ok": True, "mappings": mappings})
+        joins = data.get("joins")
+        if joins is not None and not (
+            isinstance(joins, list) and all(isinstance(j, dict) and j.get("sheet") and j.get("excelColumn")
+                                            for j in joins)
+        ):
+            return jsonify({"error": "'joins' must be an array of {sheet, excelColumn, sheetColumn}"}), 400
+        save_mapping_config(mappings, joins)
+        return jsonify({"ok": True, "mappings": mappings, "joins": load_join_config()})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.post("/template/inspect")
+def inspect_template():
+    """
+    POST FormData:
+      - template: PPTX file, or
+      - template_hash: the `template_hash` of an earlier call (skips the upload
+        while the compiled template is still cached; 404 otherwise)
+      - excel: (optional) workbook; only its header row is read
+      - dataset_id: (optional, instead of excel) a workbook stored with POST /datasets
+
+    Response:
+      every placeholder ({{X}} and [X]) with its slide / shape locations
+      (`split` marks placeholders that spanned several runs), the Excel column
+      each one maps to under the mapping in effect, and, with a workbook,
+      which placeholders its columns cover
+    """
+    import data_loader
+    import template_cache
+
+    template_hash = request.form.get("template_hash", "").strip()
+    if 'template' in request.files and request.files['template'].filename:
+        size_error = _template_size_error(request.files['template'])
+        if size_error:
+            return size_error
+        compiled = template_cache.get_compiled_template(request.files['template'].stream)
+    elif template_hash:
+        compiled = template_cache.get_cached_template(template_hash)
+        if compiled is None:
+            return jsonify({"error": "Template is no longer cached; upload it again."}), 404
+    else:
+        return jsonify({"error": "Missing 'template' file or 'template_hash'"}), 400
+
+    header = None
+    excel_file = request.files.get('excel')
+    if request.form.get("dataset_id", "").strip():
+        dataset, error = _workbook_source()
+        if error:
+            return error
+        header = dataset.columns
+    elif excel_file is not None and excel_file.filename:
+        try:
+            fmt = data_loader.detect_format(excel_file.stream, excel_file.filename)
+            header = data_loader.read_header(excel_file.stream, fmt)
+        except Exception as e:
+            return jsonify({"error": f"Could not read the workbook header: {e}"}), 400
+
+    mapping_config = load_mapping_config()
+    configured = {
+        item.get("pptPlaceholder", ""): item.get("excelColumn", "")
+        for item in mapping_config
+        if item.get("pptPlaceholder") and item.get("excelColumn")
+    }
+
+    placeholders = []
+    for entry in compiled.placeholder_index:
+        ph = entry["placeholder"]
+        # Same rules as get_full_mapping: configured mapping first, then [X] -> column X
+        column = configured.get(ph) or (entry["name"] if entry["syntax"] == "brackets" else None)
+        item = dict(entry, column=column, mapped_by="config" if ph in configured else ("name" if column else None))
+        if header is not None:
+            item["covered"] = column in header
+        placeholders.append(item)
+
+    result = {
+        "template_hash": compiled.content_hash,
+        "placeholders": placeholders,
+        "mapping": mapping_config,
+        "mapping_version": get_mapping_version(),
+    }
+    if header is not None:
+        used = {p["column"] for p in placeholders if p["covered"]}
+        result["coverage"] = {
+            "columns": header,
+            "covered": sum(1 for p in placeholders if p["covered"]),
+            "total": len(placeholders),
+            "missing": [p["placeholder"] for p in placeholders if not p["covered"]],
+            "unused_columns": [c for c in header if c not in used],
+        }
+    return jsonify(result)
+
+
+@app.post("/datasets")
+def upload_dataset():
+    """
+    POST FormData:
+      - excel: XLSX file with data (CSV and Parquet are also accepted)
+
+    Stores the workbook as a memory-mapped dataset (see datasets.py) for
+    /generate and /jobs to use by `dataset_id`, which is the sha256 of the
+    file. Uploading the same file again does not convert it again.
+
+    Response:
+      201 (200 when it was already stored): dataset_id, filename, rows and
+      columns of the main sheet, and the sheets
+    """
+    import admission
+    import datasets
+
+    excel_file = request.files.get('excel')
+    if excel_file is None or excel_file.filename == '':
+        return jsonify({"error": "Missing 'excel' file"}), 400
+    try:
+        loaded, columns = admission.workbook_shape(excel_file, excel_file.filename)
+    except Exception:
+        loaded, columns = 0, 0  # an unreadable workbook fails below, with a proper error
+    try:
+        # The whole workbook is loaded once to convert it
+        with metrics.trace("dataset"), \
+                admission.admit(admission.BASE_COST + loaded * columns * admission.CELL_BYTES, "dataset"):
+            dataset, created = datasets.register(excel_file.stream, excel_file.filename)
+    except AdmissionRejected:
+        raise
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        log.exception("dataset_failed", error=str(e))
+        return jsonify({"error": str(e)}), 500
+    return jsonify(dict(dataset.info(), created=created)), 201 if created else 200
+
+
+@app.get("/datasets/<dataset_id>")
+def dataset_info(dataset_id):
+    """A stored dataset's sheets and columns; 404 when unknown or evicted."""
+    import datasets
+
+    dataset = datasets.get_dataset(dataset_id)
+    if dataset is None:
+        return jsonify({"error": "Unknown dataset"}), 404
+    return jsonify(dataset.info())
+
+
 @app.post("/generate")
 def generate():
     """
     POST FormData:
       - template: PPTX file with {{PLACEHOLDER}} tags
-      - excel: XLSX file with data
+      - excel: XLSX file with data (CSV and Parquet are also accepted)
+      - dataset_id: (instead of excel) id of a workbook stored with POST /datasets
       - row_index: (optional) which row to use, defaults to 0
+      - key_column / key_value: (optional) use the row whose key_column equals
+        key_value instead of row_index
 
     Response:
-      returns the filled pptx file
+      returns the filled pptx file (404 when dataset_id is unknown or evicted)
     """
     try:
         # Get uploaded files
         if 'template' not in request.files:
             return jsonify({"error": "Missing 'template' file"}), 400
-        if 'excel' not in request.files:
-            return jsonify({"error": "Missing 'excel' file"}), 400
-        
+
         template_file = request.files['template']
-        excel_file = request.files['excel']
-        
+
         if template_file.filename == '':
             return jsonify({"error": "Empty template filename"}), 400
-        if excel_file.filename == '':
-            return jsonify({"error": "Empty excel filename"}), 400
-        
+        excel_file, error = _workbook_source()
+        if error:
+            return error
+
         # Get optional row index
         row_index_str = request.form.get("row_index", "0")
         try:
@@ -482,47 +1309,368 @@ def generate():
         except (TypeError, ValueError):
             return jsonify({"error": "Invalid 'row_index'. It must be an integer."}), 400
         
-        print(f"[Backend] Processing files: {template_file.filename}, {excel_file.filename}")
-        print(f"[Backend] Using row index: {row_index}")
-        
-        # Load Excel data
-        df = load_excel_df(excel_file)
-        print(f"[Backend] Excel loaded: {len(df)} rows, columns: {list(df.columns)}")
-        
-        # Select row
-        row = select_row(df, row_index=row_index)
-        
-        # Build replacements
-        replacements = build_replacements(row)
-        print(f"[Backend] Replacements: {replacements}")
-        
-        # Apply replacements
-        template_file.seek(0)  # Reset file pointer again
-        ppt_bytes = apply_replacements_to_ppt(template_file, replacements)
-        
-        # Save to temp directory
-        output_filename = f"{uuid.uuid4()}_output.pptx"
-        output_path = TEMP_DIR / output_filename
-        with open(output_path, "wb") as f:
-            f.write(ppt_bytes.getbuffer())
-        print(f"[Backend] Saved output to: {output_path}")
+        key_column, key_value = _row_key()
+
+        size_error = _template_size_error(template_file)
+        if size_error:
+            return size_error
+
+        log.info("generate", template=template_file.filename, excel=excel_file.filename, row_index=row_index,
+                 key_column=key_column)
         
-        ppt_bytes.seek(0)
-        return send_file(
-            ppt_bytes,
-            as_attachment=True,
-            download_name="generated.pptx",
-            mimetype="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        )
+        import template_cache
+
+        # The response body is generated while it is sent, after the request has ended
+        template_stream = _detach_upload(template_file)
+        with metrics.trace("generate") as trace:
+            ticket = None
+            try:
+                with metrics.span("template_parse"):
+                    template_key = template_cache.content_hash(template_stream)
+                ticket = _admit("generate", template_stream, excel_file,
+                                rows=_rows_loaded(excel_file, row_index, key_column), template_key=template_key)
+                output = render_output(template_stream, excel_file, row_index, stream=True,
+                                       key_column=key_column, key_value=key_value, template_key=template_key)
+                response = send_output(output)
+            except BaseException:
+                if ticket is not None:
+                    ticket.release()
+                template_stream.close()
+                raise
+        if "open_stream" in output:
+            response.call_on_close(ticket.release)
+            response.call_on_close(template_stream.close)
+        else:
+            # Served from the store: send_file responses are passed through
+            # without running close callbacks, and the template is not needed
+            ticket.release()
+            template_stream.close()
+        if metrics.server_timing_enabled():
+            response.headers["Server-Timing"] = trace.server_timing()
+        return response
+
+    except (HTTPException, AdmissionRejected):
+        raise  # e.g. 413 from the upload size limit, 503 when out of memory budget
+    except Exception as e:
+        log.exception("generate_failed", error=str(e))
+        return jsonify({"error": str(e)}), 500
+
 
+def _workbook_source():
+    """
+    The workbook of a generation: the stored dataset named by the 'dataset_id'
+    form field, else the uploaded 'excel' file. Returns (source, None) or
+    (None, error response).
+    """
+    import datasets
+
+    dataset_id = request.form.get("dataset_id", "").strip()
+    if dataset_id:
+        try:
+            dataset = datasets.get_dataset(dataset_id)
+        except ValueError as e:
+            return None, (jsonify({"error": str(e)}), 400)
+        if dataset is None:
+            return None, (jsonify({"error": "Unknown dataset; upload the workbook to /datasets again."}), 404)
+        return dataset, None
+    if 'excel' not in request.files:
+        return None, (jsonify({"error": "Missing 'excel' file or 'dataset_id'"}), 400)
+    excel_file = request.files['excel']
+    if excel_file.filename == '':
+        return None, (jsonify({"error": "Empty excel filename"}), 400)
+    return excel_file, None
+
+
+def _rows_loaded(excel_file, row_index: int, key_column: str | None) -> int | None:
+    """Workbook rows a single-deck generation loads (None for all), for admission."""
+    import datasets
+
+    if key_column:
+        return None  # a key lookup loads every row
+    if isinstance(excel_file, datasets.Dataset):
+        return 1  # only the row itself is read from a dataset
+    return max(row_index, 0) + 1
+
+
+def _row_key() -> tuple[str | None, str | None]:
+    """The optional key_column / key_value form fields."""
+    key_column = request.form.get("key_column", "").strip() or None
+    return key_column, request.form.get("key_value", "") if key_column else None
+
+
+def _optional_int(name: str) -> int | None:
+    value = request.form.get(name, "").strip()
+    if value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid '{name}'. It must be an integer.")
+
+
+@app.post("/generate/batch")
+def generate_batch():
+    """
+    POST FormData:
+      - template: PPTX file with placeholders
+      - excel: XLSX file with data (CSV and Parquet are also accepted)
+      - start: (optional) first row index, defaults to 0
+      - end: (optional) row index to stop before, defaults to the last row
+      - filter_column / filter_value: (optional) only rows where column == value
+      - name_column: (optional) column used to name each deck in the ZIP
+      - output: (optional) "zip" (default) or "deck"
+
+    Response:
+      zip: streams a ZIP with one pptx per row plus report.json listing
+      generated files and per-row errors
+      deck: streams a single pptx holding a copy of the template's slides per
+      row, all sharing the template's images and media (rows whose values
+      could not be built are listed in the X-Skipped-Rows header)
+    """
+    import batch
+
+    if 'template' not in request.files:
+        return jsonify({"error": "Missing 'template' file"}), 400
+    if 'excel' not in request.files:
+        return jsonify({"error": "Missing 'excel' file"}), 400
+
+    ticket = None
+    try:
+        start = _optional_int("start") or 0
+        end = _optional_int("end")
+        filter_column = request.form.get("filter_column", "").strip() or None
+        filter_value = request.form.get("filter_value", "")
+        name_column = request.form.get("name_column", "").strip()
+        output = request.form.get("output", "zip").strip().lower() or "zip"
+        if output not in ("zip", "deck"):
+            raise ValueError("Invalid 'output'. It must be 'zip' or 'deck'.")
+
+        size_error = _template_size_error(request.files['template'])
+        if size_error:
+            return size_error
+
+        import template_cache
+        import workbook_cache
+        template_bytes = request.files['template'].read()
+        template_key = template_cache.template_hash(template_bytes)
+        # deck: one copy of the slides per row; zip: a deck per worker process at once
+        ticket = _admit("batch", template_bytes, request.files['excel'], rows=end,
+                        copies=None if output == "deck" else 1, first_row=start,
+                        processes=1 if output == "deck" else batch.get_max_workers(), template_key=template_key)
+        compiled = template_cache.get_compiled_template(template_bytes, template_key)
+
+        joins = workbook_cache.parse_joins(load_join_config())
+        fields = joined_fields(compiled.text, joins)
+        if fields:
+            # Related sheets are needed: use the cached, indexed workbook
+            excel_file = request.files['excel']
+            workbook = workbook_cache.get_workbook(excel_file.stream, excel_file.filename)
+            df = workbook.main
+            rows = workbook.add_joined_columns(select_rows(df, start, end, filter_column, filter_value),
+                                               fields, joins)
+        else:
+            extra = [c for c in (filter_column, name_column) if c]
+            df = load_excel_df(
+                request.files['excel'],
+                columns=lambda header: referenced_columns(compiled.text, header) + extra,
+                nrows=end,
+            )
+            rows = select_rows(df, start, end, filter_column, filter_value)
+    except AdmissionRejected:
+        raise
+    except ValueError as e:
+        if ticket is not None:
+            ticket.release()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"[Backend] Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        if ticket is not None:
+            ticket.release()
+        log.exception("batch_failed", error=str(e))
         return jsonify({"error": str(e)}), 500
 
+    try:
+        # make_response: _batch_response answers (body, 400) when no row can be rendered
+        response = make_response(_batch_response(batch, template_bytes, df, rows, name_column, output))
+    except BaseException:
+        ticket.release()
+        raise
+    # The body is rendered while it is sent; the memory is held until then
+    response.call_on_close(ticket.release)
+    return response
+
+
+def _batch_response(batch, template_bytes: bytes, df, rows, name_column: str, output: str):
+    """Build the replacements of the selected rows and the streamed zip or deck response."""
+    import pandas as pd
+
+    log.info("batch", rows_selected=len(rows), rows_read=len(df))
+
+    # Mapping is loaded once and shared by every row
+    mapping = get_full_mapping(df.iloc[0]) if len(df) else {}
+    positions = df.index.get_indexer(rows.index)
+    labels = (rows[name_column].where(rows[name_column].notna(), "") if name_column in rows.columns
+              else pd.Series("", index=rows.index))
+    tasks = []
+    errors = []
+    try:
+        with metrics.span("build_replacements"):
+            table = build_replacement_table(rows, mapping)
+        for i, (row_index, label) in enumerate(zip(positions, labels)):
+            tasks.append((int(row_index), batch.deck_filename(int(row_index), label), table.row(i)))
+    except Exception:
+        # Fall back to row by row so a bad row is reported instead of failing the batch
+        tasks = []
+        for (_, row), row_index in zip(rows.iterrows(), positions):
+            row_index = int(row_index)
+            try:
+                label = row[name_column] if name_column in row.index and not pd.isna(row[name_column]) else ""
+                tasks.append((row_index, batch.deck_filename(row_index, label), build_replacements(row, mapping)))
+            except Exception as e:
+                errors.append({"row_index": row_index, "error": str(e)})
+
+    if output == "deck":
+        import dataset_deck
+        import streaming
+        if not tasks:
+            return jsonify({"error": "No rows to render.", "errors": errors}), 400
+
+        def write(sink):
+            dataset_deck.render_dataset_deck(template_bytes, [t[2] for t in tasks], out=sink)
+
+        headers = {"Content-Disposition": 'attachment; filename="generated.pptx"'}
+        if errors:
+            headers["X-Skipped-Rows"] = ",".join(str(e["row_index"]) for e in errors)
+        return Response(streaming.stream_writes(write), mimetype=PPTX_MIMETYPE, headers=headers)
+
+    return Response(
+        batch.iter_batch_zip(template_bytes, tasks, errors),
+        mimetype="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="generated.zip"'},
+    )
+
+
+def _generate_job_output(template_stream, excel_stream, excel_filename: str,
+                         row_index: int, progress=None, key_column: str | None = None,
+                         key_value: str | None = None) -> dict:
+    """
+    Run a queued generation; the detached upload streams (or the dataset,
+    which `excel_stream` may be) are closed when it ends.
+    """
+    import template_cache
+
+    try:
+        with metrics.trace("job"):
+            with metrics.span("template_parse"):
+                template_key = template_cache.content_hash(template_stream)
+            with _admit("job", template_stream, excel_stream, excel_filename,
+                        rows=_rows_loaded(excel_stream, row_index, key_column), template_key=template_key):
+                output = render_output(
+                    template_stream, excel_stream, row_index, progress=progress, excel_filename=excel_filename,
+                    key_column=key_column, key_value=key_value, template_key=template_key,
+                )
+        if "file" in output:
+            # Kept in the output store; reopened when the result is downloaded
+            output.pop("file").close()
+            output["stored"] = True
+        return output
+    finally:
+        template_stream.close()
+        excel_stream.close()
+
+
+def _job_view(job: dict) -> dict:
+    view = dict(job)
+    view["status_url"] = f"/jobs/{job['id']}"
+    view["result_url"] = f"/jobs/{job['id']}/result"
+    return view
+
+
+@app.post("/jobs")
+def submit_job():
+    """
+    POST FormData: same fields as /generate.
+
+    Response (202):
+      job status JSON with `id`, `status_url` and `result_url`.
+      429 when the job queue is full.
+    """
+    import datasets
+    import jobs
+
+    if 'template' not in request.files:
+        return jsonify({"error": "Missing 'template' file"}), 400
+    excel_file, error = _workbook_source()
+    if error:
+        return error
+    try:
+        row_index = int(request.form.get("row_index", "0"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid 'row_index'. It must be an integer."}), 400
+    key_column, key_value = _row_key()
+
+    size_error = _template_size_error(request.files['template'])
+    if size_error:
+        return size_error
+
+    # The job reads the spooled uploads after this request has ended
+    template_stream = _detach_upload(request.files['template'])
+    excel_stream = excel_file if isinstance(excel_file, datasets.Dataset) else _detach_upload(excel_file)
+    try:
+        queue = jobs.get_job_queue()
+        job_id = queue.submit(_generate_job_output, template_stream, excel_stream, excel_file.filename, row_index,
+                              key_column=key_column, key_value=key_value)
+    except (jobs.QueueFullError, ValueError) as e:
+        template_stream.close()
+        excel_stream.close()
+        return jsonify({"error": str(e)}), 429 if isinstance(e, jobs.QueueFullError) else 500
+
+    log.info("job_queued", job_id=job_id, row_index=row_index)
+    return jsonify(_job_view(queue.status(job_id))), 202
+
+
+@app.get("/jobs/<job_id>")
+def job_status(job_id):
+    """Job status: queued / running / done / failed, with slides_done / slides_total progress."""
+    import jobs
+
+    job = jobs.get_job_queue().status(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(_job_view(job))
+
+
+@app.get("/jobs/<job_id>/result")
+def job_result(job_id):
+    """Download the generated pptx once the job is done."""
+    import jobs
+
+    queue = jobs.get_job_queue()
+    job = queue.status(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    if job["status"] == jobs.FAILED:
+        return jsonify({"error": job["error"]}), 500
+    if job["status"] != jobs.DONE:
+        return jsonify({"error": f"Job is {job['status']}"}), 409
+    output = dict(queue.result(job_id))
+    if "data" in output:
+        output["data"] = BytesIO(output["data"].getvalue())
+    elif output.pop("stored", False):
+        import output_store
+        store = output_store.get_output_store()
+        output["file"] = store.open(output["etag"]) if store is not None else None
+        if output["file"] is None:
+            return jsonify({"error": "Job result expired; submit the job again."}), 410
+    return send_output(output)
+
 
 if __name__ == "__main__":
-    print(f"[Backend] Starting server on port 8000")
-    print(f"[Backend] Temp directory: {TEMP_DIR}")
+    # Helper modules import `main`; reuse this module instead of loading it twice
+    import sys
+    sys.modules.setdefault("main", sys.modules[__name__])
+    log.info("starting", port=8000, temp_dir=str(TEMP_DIR))
+    # With the reloader, only the child process serves requests
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        import warmup
+        warmup.start()
     app.run(host="0.0.0.0", port=8000, debug=True)
@@ -0,0 +1,242 @@
+"""
+Request instrumentation: per-stage timing spans, per-request counts and a
+Prometheus text-format registry served at /metrics.
+
+A generation runs inside `trace(operation)`. Code along the pipeline wraps
+its stages in `span(stage)` and reports sizes with `count(kind, n)`; both
+are no-ops when no trace is active (batch worker processes, benchmarks).
+When the trace ends, the per-stage totals and counts are observed into
+histograms, and `Trace.server_timing()` renders them for the Server-Timing
+header. A trace kept open past its response headers (a streamed deck, see
+`Trace.defer`) has only its early stages in the header, so its complete
+timings are logged as a `trace_finished` record when it ends.
+
+Metrics are kept per process; with several gunicorn workers each worker
+reports its own.
+
+Settings (env):
+- SERVER_TIMING: 1 to add a Server-Timing header to /generate responses (default 0)
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from logs import get_logger
+
+log = get_logger("metrics")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 4, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096))
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DURATION_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += c
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+REQUESTS = Counter("ppt_requests_total", "Generations by operation and outcome.", ("operation", "status"))
+REQUEST_SECONDS = Histogram("ppt_request_duration_seconds", "Time per generation.", ("operation",))
+STAGE_SECONDS = Histogram("ppt_stage_duration_seconds", "Time per pipeline stage within a generation.",
+                          ("operation", "stage"))
+REQUEST_ITEMS = Histogram("ppt_request_items", "Shapes, runs and placeholders filled per generation.",
+                          ("operation", "kind"), buckets=COUNT_BUCKETS)
+OUTPUT_STORE = Counter("ppt_output_store_lookups_total", "Output store lookups by result.", ("result",))
+SLIDE_CACHE = Counter("ppt_slide_cache_lookups_total", "Rendered-slide cache lookups by result.", ("result",))
+OUTPUT_BYTES = Histogram("ppt_output_bytes", "Generated deck size before and after the optimization pass.",
+                         ("kind",), buckets=MEMORY_BUCKETS)
+FILL_SLIDES = Counter("ppt_fill_slides_total", "Slides rendered by the ooxml engine, serially or in the fill pool.",
+                      ("mode",))
+DATASETS = Counter("ppt_datasets_total", "Dataset uploads (created, existing) and opens (hit, miss).",
+                   ("operation", "result"))
+IMAGE_CACHE = Counter("ppt_image_cache_lookups_total", "Prepared-image cache lookups by result.", ("result",))
+ADMISSION = Counter("ppt_admission_total", "Admission decisions: admitted at once, queued first, or rejected.",
+                    ("operation", "result"))
+ADMISSION_WAIT = Histogram("ppt_admission_wait_seconds", "Time queued for memory before admission.", ("operation",))
+ADMISSION_RESERVED = Gauge("ppt_admission_reserved_bytes", "Estimated memory of the generations running now.")
+ADMISSION_QUEUED = Gauge("ppt_admission_queued", "Generations waiting for memory.")
+REQUEST_MEMORY = Histogram("ppt_request_memory_bytes",
+                           "Memory per generation: admission estimate and measured peak RSS growth.",
+                           ("operation", "kind"), buckets=MEMORY_BUCKETS)
+
+REGISTRY = [REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, REQUEST_ITEMS, OUTPUT_STORE, SLIDE_CACHE, FILL_SLIDES, IMAGE_CACHE,
+            DATASETS, OUTPUT_BYTES, ADMISSION, ADMISSION_WAIT, ADMISSION_RESERVED, ADMISSION_QUEUED, REQUEST_MEMORY]
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """Stage totals (seconds) and counts for one generation."""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.stages: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.deferred = False
+        self.finished = False
+
+    def defer(self) -> None:
+        """Keep the trace open after its `with` block; the caller must call finish()."""
+        self.deferred = True
+
+    def finish(self, status: str) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        self.duration = time.perf_counter() - self.started
+        REQUESTS.inc(operation=self.operation, status=status)
+        REQUEST_SECONDS.observe(self.duration, operation=self.operation)
+        for stage, seconds in self.stages.items():
+            STAGE_SECONDS.observe(seconds, operation=self.operation, stage=stage)
+        for kind, n in self.counts.items():
+            REQUEST_ITEMS.observe(n, operation=self.operation, kind=kind)
+        if self.deferred:
+            # Headers were sent before these stages ran
+            log.info("trace_finished", operation=self.operation, status=status,
+                     duration_ms=round(self.duration * 1000, 1), server_timing=self.server_timing())
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one metric per stage, durations in ms."""
+        parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        parts.append(f"total;dur={(self.duration or time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Trace | None] = ContextVar("ppt_trace", default=None)
+
+
+@contextmanager
+def trace(operation: str):
+    """Collect spans and counts for one generation; yields the Trace."""
+    t = Trace(operation)
+    token = _current.set(t)
+    status = "ok"
+    try:
+        yield t
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _current.reset(token)
+        if not t.deferred or status == "error":
+            t.finish(status)
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+@contextmanager
+def span(stage: str):
+    """Add the time spent in the block to `stage` of the current trace."""
+    t = _current.get()
+    if t is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        t.stages[stage] = t.stages.get(stage, 0.0) + time.perf_counter() - start
+
+
+def count(kind: str, n: int = 1) -> None:
+    """Add n to the `kind` count of the current trace."""
+    t = _current.get()
+    if t is not None:
+        t.counts[kind] = t.counts.get(kind, 0) + n
+
+
+def server_timing_enabled() -> bool:
+    return os.environ.get("SERVER_TIMING", "0").strip().lower() in ("1", "true", "yes")
@@ -0,0 +1,460 @@
+"""
+Direct OOXML fill engine.
+
+An alternative to the python-pptx engine behind `apply_replacements_to_ppt`
+(select it with PPT_FILL_ENGINE=ooxml or engine="ooxml"). The PPTX is opened
+as a ZIP; only slide parts whose text contains a placeholder are parsed with
+lxml and rewritten. Every other entry (masters, layouts, media, untouched
+slides) is copied byte-for-byte without being decompressed or recompressed,
+so the cost of a fill tracks the few slide XMLs that change rather than the
+size of the package.
+
+Formatting rules match the python-pptx engine:
+- placeholders split across runs are merged into the first run of the span
+- name placeholders get their own run colored NAME_COLOR
+- runs containing a missing-field text are colored MISSING_FIELD_COLOR
+- text frames get word wrap, first-slide text is capped at 44pt, and text
+  is shrunk to fit its box (slides without placeholders are copied unchanged)
+- image placeholders (see images.py) point to a new media part named by the
+  prepared image's content hash, so equal images are stored once
+"""
+
+import copy
+import posixpath
+import re
+import struct
+import zipfile
+import zlib
+from io import BytesIO
+
+from lxml import etree
+
+NS = {
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+
+SLIDE_PART = re.compile(r"^ppt/slides/slide\d+\.xml$")
+SLIDE_RELS_PART = re.compile(r"^ppt/slides/_rels/(slide\d+\.xml)\.rels$")
+CONTENT_TYPES_PART = "[Content_Types].xml"
+_FILL_TAGS = {f"{{{NS['a']}}}{t}" for t in ("noFill", "solidFill", "gradFill", "blipFill", "pattFill", "grpFill")}
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+FIRST_SLIDE_MAX_SIZE = 4400  # hundredths of a point (44pt)
+
+
+def _qn(tag: str) -> str:
+    prefix, local = tag.split(":")
+    return f"{{{NS[prefix]}}}{local}"
+
+
+# ---------- Run helpers ----------
+def _run_text(r) -> str:
+    t = r.find(_qn("a:t"))
+    return (t.text or "") if t is not None else ""
+
+
+def _set_run_text(r, text: str) -> None:
+    t = r.find(_qn("a:t"))
+    if t is None:
+        t = etree.SubElement(r, _qn("a:t"))
+    t.text = text
+
+
+def _set_run_color(r, hex_color: str) -> None:
+    """Same effect as `run.font.color.rgb = ...` in python-pptx."""
+    rpr = r.find(_qn("a:rPr"))
+    if rpr is None:
+        rpr = etree.Element(_qn("a:rPr"))
+        r.insert(0, rpr)
+    for child in list(rpr):
+        if child.tag in _FILL_TAGS:
+            rpr.remove(child)
+    fill = etree.Element(_qn("a:solidFill"))
+    etree.SubElement(fill, _qn("a:srgbClr"), val=hex_color)
+    ln = rpr.find(_qn("a:ln"))
+    if ln is not None:
+        ln.addnext(fill)
+    else:
+        rpr.insert(0, fill)
+
+
+def _clone_run(r, text: str):
+    clone = copy.deepcopy(r)
+    _set_run_text(clone, text)
+    r.addnext(clone)
+    return clone
+
+
+# ---------- Paragraph fill ----------
+def _merge_split_matches(p, matcher) -> None:
+    """Move every placeholder spanning several runs into the first run of the span."""
+    runs = p.findall(_qn("a:r"))
+    if len(runs) < 2:
+        return
+    texts = [_run_text(r) for r in runs]
+    full = "".join(texts)
+    changed = False
+    for match in matcher.finditer(full):
+        ms, me = match.span()
+        starts, pos = [], 0
+        for t in texts:
+            starts.append(pos)
+            pos += len(t)
+        spans = [i for i, (s, t) in enumerate(zip(starts, texts)) if s < me and s + len(t) > ms]
+        if len(spans) < 2:
+            continue
+        first, last = spans[0], spans[-1]
+        texts[first] = texts[first][: ms - starts[first]] + full[ms:me]
+        for i in range(first + 1, last):
+            texts[i] = ""
+        texts[last] = texts[last][me - starts[last]:]
+        changed = True
+    if changed:
+        for r, text in zip(runs, texts):
+            if _run_text(r) != text:
+                _set_run_text(r, text)
+
+
+def _fill_run(r, matcher, name_placeholders, name_color: str, missing_color: str, is_missing) -> bool:
+    original = _run_text(r)
+    if not original:
+        return False
+
+    pieces: list[str] = []
+    pos = 0
+    missing_highlight = False
+    name_match = None
+    for match in matcher.finditer(original):
+        ph = match.group(0)
+        replacement_text = matcher.replacements[ph]
+        if ph in name_placeholders and not is_missing(replacement_text):
+            name_match = match
+            break
+        pieces.append(original[pos:match.start()])
+        pieces.append(replacement_text)
+        pos = match.end()
+        if is_missing(replacement_text):
+            missing_highlight = True
+
+    if name_match is None and not pieces:
+        return False
+
+    if name_match is not None:
+        _set_run_text(r, "".join(pieces) + original[pos:name_match.start()])
+        name_run = _clone_run(r, matcher.replacements[name_match.group(0)])
+        _set_run_color(name_run, name_color)
+        after = original[name_match.end():]
+        if after:
+            after_run = _clone_run(r, after)
+            name_run.addnext(after_run)
+            _fill_run(after_run, matcher, name_placeholders, name_color, missing_color, is_missing)
+    else:
+        pieces.append(original[pos:])
+        _set_run_text(r, "".join(pieces))
+
+    if missing_highlight:
+        _set_run_color(r, missing_color)
+    return True
+
+
+def _body_extents(tx_body) -> tuple[int, int] | None:
+    """(width, height) in EMU of the shape or table cell holding a txBody."""
+    parent = tx_body.getparent()
+    try:
+        if tx_body.tag == _qn("p:txBody"):
+            ext = parent.find(f"{_qn('p:spPr')}/{_qn('a:xfrm')}/{_qn('a:ext')}")
+            return (int(ext.get("cx")), int(ext.get("cy"))) if ext is not None else None
+        tr = parent.getparent()
+        tbl = tr.getparent()
+        col = tr.findall(_qn("a:tc")).index(parent)
+        grid_cols = tbl.findall(f"{_qn('a:tblGrid')}/{_qn('a:gridCol')}")
+        return int(grid_cols[col].get("w")), int(tr.get("h"))
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return None
+
+
+def _auto_fit(tx_body, max_size: int | None, min_font_size: float = 8) -> None:
+    """XML counterpart of main.auto_fit_text for a txBody element."""
+    import text_fit
+    from main import DEFAULT_FONT_SIZE
+
+    runs = tx_body.findall(f"{_qn('a:p')}/{_qn('a:r')}")
+    if not "".join(_run_text(r) for r in runs).strip():
+        return
+    body_pr = tx_body.find(_qn("a:bodyPr"))
+    if body_pr is not None:
+        body_pr.set("wrap", "square")
+    rprs = [r.find(_qn("a:rPr")) for r in runs]
+    sized = [rpr for rpr in rprs if rpr is not None and rpr.get("sz")]
+    # Like auto_fit_text: the first sized run decides, then every sized run is set
+    if max_size is not None and sized and int(sized[0].get("sz")) > max_size:
+        for rpr in sized:
+            rpr.set("sz", str(max_size))
+
+    extents = _body_extents(tx_body)
+    if extents is None:
+        return
+    size_pt = int(sized[0].get("sz")) / 100 if sized else DEFAULT_FONT_SIZE
+    latin = sized[0].find(_qn("a:latin")) if sized else None
+    font_name = latin.get("typeface") if latin is not None else None
+
+    def inset(name: str, default: int) -> int:
+        value = body_pr.get(name) if body_pr is not None else None
+        return int(value) if value is not None else default
+
+    width_pt = (extents[0] - inset("lIns", 91440) - inset("rIns", 91440)) / 12700
+    height_pt = (extents[1] - inset("tIns", 45720) - inset("bIns", 45720)) / 12700
+    paragraphs = tuple(
+        "".join(t.text or "" for t in p.iter(_qn("a:t")))
+        for p in tx_body.findall(_qn("a:p"))
+    )
+    fitted = text_fit.fit_font_size(paragraphs, font_name, size_pt, min_font_size, width_pt, height_pt)
+    if fitted >= size_pt:
+        return
+    scale = fitted / size_pt
+    for r, rpr in zip(runs, rprs):
+        if rpr is None:
+            rpr = etree.Element(_qn("a:rPr"))
+            r.insert(0, rpr)
+        current = int(rpr.get("sz")) / 100 if rpr.get("sz") else size_pt
+        rpr.set("sz", str(int(max(min_font_size, round(current * scale * 2) / 2) * 100)))
+
+
+def fill_slide_xml(xml: bytes, matcher, first_slide: bool = False, embeds: dict[int, str] | None = None,
+                   fill_text: bool = True) -> bytes:
+    """
+    Fill every text body of one slide part and return the new XML.
+    `embeds`: picture position -> relationship id of its filled image.
+    """
+    import images
+    import metrics
+    from main import MISSING_FIELD_COLOR, NAME_COLOR, NAME_PLACEHOLDERS, _is_missing_field_text
+
+    with metrics.span("template_parse"):
+        root = etree.fromstring(xml)
+    if embeds:
+        images.set_pictures(root, embeds)
+    if not fill_text:
+        return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+    for tx_body in root.iter(_qn("p:txBody"), _qn("a:txBody")):
+        with metrics.span("replace"):
+            for p in tx_body.iter(_qn("a:p")):
+                _merge_split_matches(p, matcher)
+                for r in p.findall(_qn("a:r")):
+                    _fill_run(r, matcher, NAME_PLACEHOLDERS, str(NAME_COLOR), str(MISSING_FIELD_COLOR),
+                              _is_missing_field_text)
+        is_cell = tx_body.tag == _qn("a:txBody")
+        with metrics.span("auto_fit"):
+            _auto_fit(tx_body, FIRST_SLIDE_MAX_SIZE if first_slide and not is_cell else None)
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+# ---------- Package handling ----------
+def first_slide_part(zin: zipfile.ZipFile) -> str | None:
+    """Part name of the first slide in presentation order."""
+    try:
+        prs = etree.fromstring(zin.read("ppt/presentation.xml"))
+        rels = etree.fromstring(zin.read("ppt/_rels/presentation.xml.rels"))
+    except KeyError:
+        return None
+    first = prs.find(f"{_qn('p:sldIdLst')}/{_qn('p:sldId')}")
+    if first is None:
+        return None
+    rid = first.get(_qn("r:id"))
+    for rel in rels.iter(_qn("rel:Relationship")):
+        if rel.get("Id") == rid:
+            return posixpath.normpath(posixpath.join("ppt", rel.get("Target")))
+    return None
+
+
+def copy_entry_raw(src, zout: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    """Copy a ZIP entry's compressed bytes as-is (no inflate / deflate)."""
+    if info.file_size >= zipfile.ZIP64_LIMIT or info.compress_size >= zipfile.ZIP64_LIMIT:
+        zout.writestr(info, src.read(info))
+        return
+    fp = src.fp
+    fp.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(fp.read(_LOCAL_HEADER.size))
+    name_len, extra_len = header[-2], header[-1]
+    fp.seek(info.header_offset + _LOCAL_HEADER.size + name_len + extra_len)
+    raw = fp.read(info.compress_size)
+    _write_raw(zout, copy.copy(info), raw)
+
+
+def _write_raw(zout: zipfile.ZipFile, new: zipfile.ZipInfo, raw: bytes) -> None:
+    """Append an entry whose compressed bytes, CRC and sizes are already known."""
+    new.flag_bits &= ~0x08  # sizes and CRC go in the local header, no data descriptor
+    new.header_offset = zout.fp.tell()
+    zout.fp.write(new.FileHeader(zip64=False))
+    zout.fp.write(raw)
+    zout.filelist.append(new)
+    zout.NameToInfo[new.filename] = new
+    zout.start_dir = zout.fp.tell()
+
+
+def render_slide(xml: bytes, matcher, first_slide: bool = False, embeds: dict[int, str] | None = None,
+                 fill_text: bool = True):
+    """fill_slide_xml, deflated as it will be stored in the ZIP."""
+    from slide_cache import RenderedSlide
+
+    filled = fill_slide_xml(xml, matcher, first_slide, embeds, fill_text)
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return RenderedSlide(compressor.compress(filled) + compressor.flush(), zlib.crc32(filled), len(filled))
+
+
+def _write_part(zout: zipfile.ZipFile, info: zipfile.ZipInfo, data: bytes) -> None:
+    """Write a rewritten part under the metadata of the template's entry."""
+    new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    new_info.external_attr = info.external_attr
+    new_info.compress_type = zipfile.ZIP_DEFLATED
+    zout.writestr(new_info, data)
+
+
+def _prepare_images(zin: zipfile.ZipFile, slide_infos, pictures: dict, matcher) -> dict:
+    """
+    Images for the image placeholders with a usable value: slide part ->
+    {picture position: images.PreparedImage}. `pictures` caches each slide's
+    placeholders (part name -> PictureSlots).
+    """
+    import images
+    import metrics
+
+    filled: dict[str, dict] = {}
+    with metrics.span("images"):
+        for info in slide_infos:
+            slots = pictures.get(info.filename)
+            if slots is None:
+                slots = pictures[info.filename] = images.slide_pictures(zin.read(info))
+            for slot in slots:
+                value = images.image_value(slot.tokens, matcher.replacements)
+                prepared = images.prepare_image(value, slot.cx, slot.cy) if value is not None else None
+                if prepared is not None:
+                    filled.setdefault(info.filename, {})[slot.index] = prepared
+    return filled
+
+
+def _template_key(source) -> str:
+    import template_cache
+    if isinstance(source, (bytes, bytearray)):
+        return template_cache.template_hash(bytes(source))
+    return template_cache.stream_hash(source)
+
+
+def apply_replacements(template, replacements, progress=None, out=None, template_key: str | None = None):
+    """Fill a PPTX given as bytes or a seekable binary stream; returns the new package.
+
+    `progress(slides_done, slides_total)` is called after each slide part.
+    The package is written to `out` (any writable file object, seekable or
+    not) when given, else to a new BytesIO, which is returned rewound.
+
+    With the slide cache enabled (see slide_cache.py), slides whose placeholder
+    values are unchanged since an earlier fill of the same template are reused
+    instead of re-rendered. `template_key` is the template's content hash, if
+    the caller already has it. When enough slides need rendering, they are
+    filled in a process pool (see parallel_fill.py) before the package is
+    written.
+    """
+    import images
+    import metrics
+    import parallel_fill
+    import slide_cache
+    from main import _as_matcher
+
+    matcher = _as_matcher(replacements)
+    cache = slide_cache.get_slide_cache()
+    if cache is not None and template_key is None:
+        template_key = _template_key(template)
+    texts = cache.texts(template_key) if cache is not None else {}
+    pictures = cache.pictures(template_key) if cache is not None else {}
+
+    target = out if out is not None else BytesIO()
+    source = BytesIO(template) if isinstance(template, (bytes, bytearray)) else template
+    with zipfile.ZipFile(source) as zin, \
+            zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as zout:
+        first = first_slide_part(zin)
+        slide_infos = [info for info in zin.infolist() if SLIDE_PART.match(info.filename)]
+        total = len(slide_infos)
+        # Resolved up front: [Content_Types].xml and the slides' .rels may come before the slides
+        filled_images = _prepare_images(zin, slide_infos, pictures, matcher)
+        media = {img.part_name: img for placed in filled_images.values() for img in placed.values()}
+        # Slides to rewrite: part name -> (cache key, cached RenderedSlide or None, xml or None,
+        # first-slide flag, embeds, fill_text)
+        plans: dict[str, tuple] = {}
+        for info in slide_infos:
+            is_first = info.filename == first
+            xml = None
+            if info.filename not in texts:
+                xml = zin.read(info)
+                texts[info.filename] = slide_cache.paragraph_texts(xml)
+            deps = slide_cache.slide_dependencies(texts[info.filename], matcher)
+            placed = filled_images.get(info.filename, {})
+            # The first slide is always rewritten: its 44pt cap applies to every text frame
+            if not (is_first or deps or placed):
+                continue
+            embeds = {index: images.relationship_id(img) for index, img in placed.items()}
+            key = None
+            rendered = None
+            if cache is not None:
+                key = (template_key, info.filename, is_first, slide_cache.values_hash(deps, matcher.replacements),
+                       tuple(sorted(embeds.items())))
+                rendered = cache.get(key)
+                metrics.SLIDE_CACHE.inc(result="hit" if rendered is not None else "miss")
+            plans[info.filename] = (key, rendered, xml, is_first, embeds, bool(is_first or deps))
+        pending = [name for name, plan in plans.items() if plan[1] is None]
+        rendered_in_pool = {}
+        if parallel_fill.use_parallel(len(pending)):
+            jobs = {}
+            for name in pending:
+                _, _, xml, is_first, embeds, fill_text = plans[name]
+                jobs[name] = (xml if xml is not None else zin.read(name), is_first, embeds, fill_text)
+            rendered_in_pool = parallel_fill.render_slides(jobs, matcher.replacements) or {}
+        done = 0
+        for info in zin.infolist():
+            if media and info.filename == CONTENT_TYPES_PART:
+                with metrics.span("save"):
+                    _write_part(zout, info, images.add_content_types(zin.read(info),
+                                                                     {img.ext for img in media.values()}))
+                continue
+            rels_of = SLIDE_RELS_PART.match(info.filename)
+            if rels_of and f"ppt/slides/{rels_of.group(1)}" in filled_images:
+                placed = filled_images[f"ppt/slides/{rels_of.group(1)}"]
+                targets = {images.relationship_id(img): img.part_name for img in placed.values()}
+                with metrics.span("save"):
+                    _write_part(zout, info, images.add_image_relationships(zin.read(info), targets))
+                continue
+            if SLIDE_PART.match(info.filename):
+                done += 1
+                if progress:
+                    progress(done, total)
+                plan = plans.get(info.filename)
+                if plan is not None:
+                    key, rendered, xml, is_first, embeds, fill_text = plan
+                    if rendered is None:
+                        rendered = rendered_in_pool.get(info.filename)
+                        if rendered is None:
+                            rendered = render_slide(xml if xml is not None else zin.read(info), matcher, is_first,
+                                                    embeds, fill_text)
+                            metrics.FILL_SLIDES.inc(mode="serial")
+                        if cache is not None:
+                            cache.put(key, rendered)
+                    new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                    new_info.external_attr = info.external_attr
+                    new_info.compress_type = zipfile.ZIP_DEFLATED
+                    new_info.CRC = rendered.crc
+                    new_info.file_size = rendered.file_size
+                    new_info.compress_size = len(rendered.data)
+                    with metrics.span("save"):
+                        _write_raw(zout, new_info, rendered.data)
+                    continue
+            with metrics.span("save"):
+                copy_entry_raw(zin, zout, info)
+        for name, img in media.items():
+            if name not in zin.NameToInfo:
+                # Already compressed image data: stored, not deflated again
+                zout.writestr(zipfile.ZipInfo(name), img.data, compress_type=zipfile.ZIP_STORED)
+    if out is None:
+        target.seek(0)
+    return target
@@ -0,0 +1,314 @@
+"""
+Output optimization: a pass over a finished deck that makes it smaller.
+
+python-pptx's `save` and the ooxml engine write every part the template
+contained. With OUTPUT_OPTIMIZE on, each generated deck is rewritten at the
+ZIP level (no python-pptx, media is never decoded):
+- slide layouts no slide uses are dropped, then slide masters left without a
+  used layout (the first master and one of its layouts are always kept)
+- media parts with identical content are merged into one and relationships
+  are pointed at it (candidates are found by CRC-32 and size from the ZIP
+  directory, then confirmed by hash)
+- image relationships the part's XML no longer refers to are dropped (e.g.
+  the stand-in picture of an image placeholder filled by the ooxml engine)
+- parts no longer reachable through relationships from the package root are
+  dropped, e.g. the themes of dropped masters or unreferenced images
+- XML parts are deflated at OUTPUT_ZIP_LEVEL; media is copied compressed as
+  is, or stored when deflate made it larger
+
+Sizes before and after are logged (`output_optimized`) and observed in
+ppt_output_bytes. The deck has to be complete before it can be optimized, so
+a streamed response starts once the optimized deck is being written.
+
+Settings (env):
+- OUTPUT_OPTIMIZE: 1 to optimize generated decks (default 0)
+- OUTPUT_ZIP_LEVEL: deflate level 1-9 for XML parts, 0 to store them (default 6)
+"""
+
+import hashlib
+import os
+import posixpath
+import tempfile
+import zipfile
+from collections import defaultdict
+from io import BytesIO
+from typing import NamedTuple
+
+import metrics
+from logs import get_logger
+
+log = get_logger("optimize")
+
+_RT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+RT_SLIDE_LAYOUT = _RT + "slideLayout"
+RT_SLIDE_MASTER = _RT + "slideMaster"
+RT_IMAGE = _RT + "image"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+P_NS = "http://schemas.openxmlformats.org/presentationml/2006/main"
+R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+CONTENT_TYPES = "[Content_Types].xml"
+_XML_SUFFIXES = (".xml", ".rels")
+_SPOOL_BYTES = 16 * 1024 * 1024
+
+
+class OptimizeReport(NamedTuple):
+    before: int  # package bytes
+    after: int
+    layouts: int  # dropped
+    masters: int
+    media: int  # duplicates merged
+    parts: int  # parts dropped in total
+
+
+def enabled() -> bool:
+    return os.environ.get("OUTPUT_OPTIMIZE", "0").strip().lower() in ("1", "true", "yes")
+
+
+def zip_level() -> int:
+    try:
+        return min(9, max(0, int(os.environ.get("OUTPUT_ZIP_LEVEL", "6"))))
+    except ValueError:
+        return 6
+
+
+def settings_key() -> str:
+    """Suffix identifying the optimization settings in output keys ("" when disabled)."""
+    return f"+optimized:{zip_level()}" if enabled() else ""
+
+
+# ---------- Relationships ----------
+def rels_name(part: str) -> str:
+    """Name of the .rels part of a part ("" is the package itself)."""
+    directory, base = posixpath.split(part)
+    return posixpath.join(directory, "_rels", f"{base}.rels")
+
+
+def _resolve(source: str, target: str) -> str:
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source), target))
+
+
+class _Package:
+    """The parts of a ZIP package and its relationships, with XML parts edited in memory."""
+
+    def __init__(self, zin: zipfile.ZipFile):
+        self.zin = zin
+        self.names = set(zin.namelist())
+        self.parsed: dict[str, object] = {}  # part name -> lxml root, written back from the tree
+
+    def xml(self, name: str):
+        from lxml import etree
+
+        root = self.parsed.get(name)
+        if root is None:
+            root = self.parsed[name] = etree.fromstring(self.zin.read(name))
+        return root
+
+    def rels(self, part: str) -> list:
+        """Relationship elements of a part (empty if it has none)."""
+        name = rels_name(part)
+        if name not in self.names:
+            return []
+        return list(self.xml(name).iter(f"{{{REL_NS}}}Relationship"))
+
+    def targets(self, part: str, rel_type: str | None = None) -> list[tuple[object, str]]:
+        """(relationship, target part) for a part's internal relationships."""
+        return [
+            (rel, _resolve(part, rel.get("Target", "")))
+            for rel in self.rels(part)
+            if rel.get("TargetMode") != "External" and (rel_type is None or rel.get("Type") == rel_type)
+        ]
+
+    def drop_rel(self, rel) -> None:
+        rel.getparent().remove(rel)
+
+    def reachable(self) -> set[str]:
+        """Parts reachable through relationships from the package root."""
+        seen: set[str] = set()
+        stack = [""]
+        while stack:
+            part = stack.pop()
+            for _, target in self.targets(part):
+                if target not in seen and target in self.names:
+                    seen.add(target)
+                    stack.append(target)
+        return seen
+
+
+# ---------- Passes ----------
+def _drop_unused_layouts(pkg: _Package) -> tuple[int, int]:
+    """Drop layouts no slide uses and masters left without layouts. Returns (layouts, masters) dropped."""
+    presentation = next((t for _, t in pkg.targets("") if t.endswith("presentation.xml")), None)
+    if presentation is None:
+        return 0, 0
+    masters = [(rel, master, pkg.targets(master, RT_SLIDE_LAYOUT))
+               for rel, master in pkg.targets(presentation, RT_SLIDE_MASTER)]
+    master_parts = {master for _, master, _ in masters}
+    used = set()
+    for part in pkg.reachable():
+        if part not in master_parts:
+            used.update(t for _, t in pkg.targets(part, RT_SLIDE_LAYOUT))
+    any_used = any(t in used for _, _, layouts in masters for _, t in layouts)
+
+    dropped_layouts = dropped_masters = 0
+    for i, (master_rel, master, layouts) in enumerate(masters):
+        keep = {t for _, t in layouts if t in used}
+        if not keep:
+            if any_used or i > 0:
+                _remove_list_entry(pkg, presentation, f"{{{P_NS}}}sldMasterId", master_rel.get("Id"))
+                pkg.drop_rel(master_rel)
+                dropped_masters += 1
+                dropped_layouts += len(layouts)
+                continue
+            keep = {layouts[0][1]} if layouts else set()  # a deck keeps one master with one layout
+        for rel, layout in layouts:
+            if layout not in keep:
+                _remove_list_entry(pkg, master, f"{{{P_NS}}}sldLayoutId", rel.get("Id"))
+                pkg.drop_rel(rel)
+                dropped_layouts += 1
+    return dropped_layouts, dropped_masters
+
+
+def _remove_list_entry(pkg: _Package, part: str, tag: str, r_id: str) -> None:
+    for el in list(pkg.xml(part).iter(tag)):
+        if el.get(R_ID) == r_id:
+            el.getparent().remove(el)
+
+
+def _drop_unreferenced_images(pkg: _Package) -> None:
+    """Drop image relationships whose id does not appear in their part's XML."""
+    for part in pkg.reachable():
+        images = [rel for rel, _ in pkg.targets(part, RT_IMAGE)]
+        if not images or not part.endswith(".xml"):
+            continue
+        xml = pkg.zin.read(part)
+        for rel in images:
+            if f'"{rel.get("Id")}"'.encode() not in xml:
+                pkg.drop_rel(rel)
+
+
+def _merge_duplicate_media(pkg: _Package) -> int:
+    """Point relationships to duplicate media at one copy. Returns the number of duplicates."""
+    groups = defaultdict(list)
+    for info in pkg.zin.infolist():
+        if info.filename.startswith("ppt/media/") and info.file_size:
+            groups[(info.CRC, info.file_size)].append(info.filename)
+    canonical: dict[str, str] = {}
+    for names in groups.values():
+        if len(names) < 2:
+            continue
+        by_hash: dict[str, str] = {}
+        for name in sorted(names):
+            digest = hashlib.sha256(pkg.zin.read(name)).hexdigest()
+            if digest in by_hash:
+                canonical[name] = by_hash[digest]
+            else:
+                by_hash[digest] = name
+    if not canonical:
+        return 0
+    for name in list(pkg.names):
+        if not name.endswith(".rels"):
+            continue
+        directory = posixpath.dirname(posixpath.dirname(name))
+        source = posixpath.join(directory, posixpath.basename(name)[:-len(".rels")])
+        for rel, target in pkg.targets(source):
+            if target in canonical:
+                rel.set("Target", posixpath.relpath(canonical[target], posixpath.dirname(source)))
+    return len(canonical)
+
+
+def _content_types(pkg: _Package, kept: set[str]) -> None:
+    root = pkg.xml(CONTENT_TYPES)
+    for override in list(root.iter(f"{{{CT_NS}}}Override")):
+        if override.get("PartName", "").lstrip("/") not in kept:
+            root.remove(override)
+
+
+# ---------- Entry points ----------
+def optimize_package(source, out=None) -> tuple[object, OptimizeReport]:
+    """
+    Write an optimized copy of a package (bytes or seekable stream) to `out`
+    (any writable file object) or a new BytesIO, which is returned rewound.
+    Returns (target, report).
+    """
+    from lxml import etree
+
+    from ooxml_engine import copy_entry_raw
+
+    source = BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    before = source.seek(0, os.SEEK_END)
+    source.seek(0)
+    target = out if out is not None else BytesIO()
+    level = zip_level()
+    with zipfile.ZipFile(source) as zin:
+        pkg = _Package(zin)
+        layouts, masters = _drop_unused_layouts(pkg)
+        _drop_unreferenced_images(pkg)
+        media = _merge_duplicate_media(pkg)
+        reachable = pkg.reachable()
+        kept = {n for n in pkg.names if n in reachable}
+        kept |= {rels_name(p) for p in kept | {""}} & pkg.names
+        kept.add(CONTENT_TYPES)
+        _content_types(pkg, kept)
+
+        counter = _CountingWriter(target)
+        with zipfile.ZipFile(counter, "w") as zout:
+            for info in zin.infolist():
+                if info.filename not in kept:
+                    continue
+                new = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                new.external_attr = info.external_attr
+                if info.filename.endswith(_XML_SUFFIXES) or info.filename in pkg.parsed:
+                    root = pkg.parsed.get(info.filename)
+                    data = (zin.read(info) if root is None
+                            else etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True))
+                    if level:
+                        zout.writestr(new, data, compress_type=zipfile.ZIP_DEFLATED, compresslevel=level)
+                    else:
+                        zout.writestr(new, data, compress_type=zipfile.ZIP_STORED)
+                elif info.compress_type == zipfile.ZIP_DEFLATED and info.compress_size >= info.file_size:
+                    zout.writestr(new, zin.read(info), compress_type=zipfile.ZIP_STORED)
+                else:
+                    copy_entry_raw(zin, zout, info)
+    if out is None:
+        target.seek(0)
+    report = OptimizeReport(before, counter.written, layouts, masters, media, len(pkg.names) - len(kept))
+    metrics.OUTPUT_BYTES.observe(report.before, kind="before")
+    metrics.OUTPUT_BYTES.observe(report.after, kind="after")
+    log.info("output_optimized", **report._asdict())
+    return target, report
+
+
+def optimize_output(write, out=None):
+    """
+    Run `write(sink)` (a fill that writes a whole package) into a temp file and
+    write its optimized copy to `out`, or a new BytesIO, which is returned rewound.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES) as tmp:
+        write(tmp)
+        tmp.seek(0)
+        with metrics.span("optimize"):
+            target, _ = optimize_package(tmp, out)
+    return target
+
+
+class _CountingWriter:
+    """Write-only wrapper that counts bytes (`out` may be non-seekable)."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.written = 0
+
+    def write(self, data) -> int:
+        self.raw.write(data)
+        self.written += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.written
+
+    def flush(self) -> None:
+        if hasattr(self.raw, "flush"):
+            self.raw.flush()
@@ -0,0 +1,234 @@
+"""
+Bounded, content-addressed file store for generated decks.
+
+Each entry is a file named by its key (or a directory of files, see
+`open_dir`). A hit refreshes the entry's mtime, which doubles as the
+last-used time for both the TTL and LRU eviction. Writes are atomic (temp
+file + rename), and eviction re-scans the directory, so several gunicorn
+workers can share one store directory. Temp files left behind by a worker
+that died mid-write are swept once they are older than the TTL. Entries are
+handed out as open files (`open`, `write`), which stay readable when a
+concurrent eviction removes the entry.
+
+Settings (env):
+- OUTPUT_STORE_DIR: directory (default backend/temp/outputs)
+- OUTPUT_STORE_MAX_MB: total size budget; 0 disables the store (default 500)
+- OUTPUT_STORE_TTL: seconds an unused entry is kept (default 86400)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO
+
+
+class BoundedFileStore:
+    """Directory of `<key><suffix>` files capped by total size and idle time."""
+
+    def __init__(self, root: Path, max_bytes: int, ttl: float, suffix: str = ""):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key: str) -> Path:
+        return self.root / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Path | None:
+        """Path of a live entry (marking it as recently used), or None."""
+        path = self.path_for(key)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        if time.time() - st.st_mtime > self.ttl:
+            _remove(path)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def open(self, key: str) -> BinaryIO | None:
+        """A live file entry opened for reading (marking it as recently used), or None."""
+        path = self.path_for(key)
+        try:
+            f = open(path, "rb")
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+        if time.time() - os.fstat(f.fileno()).st_mtime > self.ttl:
+            f.close()
+            _remove(path)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # evicted since it was opened; the open file is still readable
+        return f
+
+    def write(self, key: str, write) -> BinaryIO:
+        """
+        Store the entry `write(file)` writes under key and return it opened for
+        reading, rewound (the caller closes it).
+        """
+        tmp = self.temp_path()
+        f = open(tmp, "w+b")
+        try:
+            write(f)
+            self.commit(key, tmp)
+        except BaseException:
+            f.close()
+            tmp.unlink(missing_ok=True)
+            raise
+        f.seek(0)
+        return f
+
+    def temp_path(self) -> Path:
+        """A fresh temp file path inside the store (ignored by eviction until committed)."""
+        return self.root / f".{uuid.uuid4().hex}.tmp"
+
+    def commit(self, key: str, tmp: Path) -> Path:
+        """Move a fully written temp file into place under key and evict if over budget."""
+        path = self.path_for(key)
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            if not path.is_dir():
+                raise
+            # A directory entry another process committed first; keys are content hashes
+            _remove(tmp)
+        self.evict(keep=path)
+        return path
+
+    @contextmanager
+    def open_write(self, key: str):
+        """Yield a file to write an entry into; it is committed only if the block succeeds."""
+        tmp = self.temp_path()
+        try:
+            with open(tmp, "wb") as f:
+                yield f
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        self.commit(key, tmp)
+
+    @contextmanager
+    def open_dir(self, key: str):
+        """Yield a directory to write a multi-file entry into; it is committed only if the block succeeds."""
+        tmp = self.temp_path()
+        tmp.mkdir()
+        try:
+            yield tmp
+        except BaseException:
+            _remove(tmp)
+            raise
+        self.commit(key, tmp)
+
+    def put(self, key: str, data: bytes) -> Path:
+        """Store bytes under key and evict old entries if over budget."""
+        with self.open_write(key) as f:
+            f.write(data)
+        return self.path_for(key)
+
+    def evict(self, keep: Path | None = None) -> None:
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        now = time.time()
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.root):
+                if entry.name.startswith("."):
+                    self._sweep_temp(entry, now)
+                    continue
+                try:
+                    st = entry.stat()
+                    size = _entry_size(entry)
+                except FileNotFoundError:
+                    continue
+                if now - st.st_mtime > self.ttl:
+                    _remove(Path(entry.path))
+                    continue
+                entries.append((st.st_mtime, size, Path(entry.path)))
+                total += size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if keep is not None and path == keep:
+                    continue
+                _remove(path)
+                total -= size
+
+    def _sweep_temp(self, entry: os.DirEntry, now: float) -> None:
+        """Remove a temp file or directory not written to for longer than the TTL."""
+        if not entry.name.endswith(".tmp"):
+            return
+        try:
+            if now - entry.stat().st_mtime > self.ttl:
+                _remove(Path(entry.path))
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        entries = [e for e in os.scandir(self.root) if not e.name.startswith(".")]
+        return {"entries": len(entries), "bytes": sum(_entry_size(e) for e in entries),
+                "max_bytes": self.max_bytes}
+
+
+def _entry_size(entry: os.DirEntry) -> int:
+    if entry.is_dir():
+        return sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+    return entry.stat().st_size
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def output_key(template_hash: str, replacements: dict[str, str], mapping_version: str, engine: str,
+               images: str = "") -> str:
+    """
+    Key for a generated deck: template hash + filled values + mapping version
+    + engine, and the content hashes of the images it uses (images.sources_key).
+    """
+    values_hash = hashlib.sha256(
+        json.dumps(replacements, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    parts = [template_hash, values_hash, mapping_version, engine]
+    if images:
+        parts.append(images)
+    raw = "\n".join(parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_output_store() -> BoundedFileStore | None:
+    """Process-wide store from the OUTPUT_STORE_* settings; None when disabled."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                max_mb = float(os.environ.get("OUTPUT_STORE_MAX_MB", "500"))
+                ttl = float(os.environ.get("OUTPUT_STORE_TTL", "86400"))
+            except ValueError:
+                max_mb, ttl = 500.0, 86400.0
+            if max_mb <= 0:
+                return None
+            root = os.environ.get("OUTPUT_STORE_DIR") or Path(__file__).parent / "temp" / "outputs"
+            _store = BoundedFileStore(Path(root), int(max_mb * 1024 * 1024), ttl, suffix=".pptx")
+        return _store
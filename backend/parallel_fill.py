@@ -0,0 +1,115 @@
+"""
+Parallel slide fill for the OOXML engine.
+
+Filling a slide is independent of every other slide: its XML part and the
+replacement table are all it needs. For large decks the ooxml engine hands
+the slides it has to render (those not served by the slide cache) to a
+process pool instead of rendering them one after another on one core. Each
+task carries a chunk of slide XMLs plus the replacement table; the worker
+fills and deflates them and sends back the parts as they will be stored, so
+the request process only writes them into the package in template order.
+
+The pool is started on first use and kept for the life of the process
+(one per gunicorn worker). If it breaks, the slides are rendered in the
+request process and a new pool is started next time. Processes that are
+themselves pool workers (batch rendering) always fill serially.
+
+Only the ooxml engine fills slides in parallel: the python-pptx engine
+edits one object graph for the whole deck.
+
+Settings (env):
+- FILL_WORKERS: worker processes for parallel fill; 0 or 1 disables (default 0)
+- FILL_PARALLEL_MIN_SLIDES: slides to render below which a fill stays serial (default 24)
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from logs import get_logger
+
+log = get_logger("parallel_fill")
+
+# Chunks per worker: small enough to balance uneven slides, large enough to amortize pickling the table
+CHUNKS_PER_WORKER = 4
+
+
+def get_workers() -> int:
+    try:
+        return max(0, int(os.environ.get("FILL_WORKERS", "0")))
+    except ValueError:
+        return 0
+
+
+def min_slides() -> int:
+    try:
+        return max(1, int(os.environ.get("FILL_PARALLEL_MIN_SLIDES", "24")))
+    except ValueError:
+        return 24
+
+
+def use_parallel(slides: int) -> bool:
+    """Whether `slides` slides to render should go to the pool."""
+    return (get_workers() > 1 and slides >= min_slides()
+            and multiprocessing.parent_process() is None)
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=get_workers())
+            _pool_pid = os.getpid()
+            log.info("fill_pool_started", workers=get_workers())
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_chunk(replacements: dict[str, str], items: list[tuple]) -> list:
+    """Fill a chunk of slides in a worker. `items`: (xml, first_slide, embeds, fill_text) per slide."""
+    from main import _as_matcher
+    from ooxml_engine import render_slide
+
+    matcher = _as_matcher(replacements)
+    return [render_slide(xml, matcher, first_slide, embeds, fill_text)
+            for xml, first_slide, embeds, fill_text in items]
+
+
+def render_slides(jobs: dict[str, tuple], replacements: dict[str, str]) -> dict | None:
+    """
+    Render slides in the pool. `jobs`: part name -> (xml, first_slide, embeds,
+    fill_text). Returns part name -> slide_cache.RenderedSlide, or None if the
+    pool failed (the caller then renders the slides itself).
+    """
+    names = list(jobs)
+    workers = get_workers()
+    size = max(1, -(-len(names) // (workers * CHUNKS_PER_WORKER)))
+    chunks = [names[i:i + size] for i in range(0, len(names), size)]
+    pool = _get_pool()
+    with metrics.span("parallel_fill"):
+        try:
+            futures = [pool.submit(_render_chunk, replacements, [jobs[name] for name in chunk]) for chunk in chunks]
+            rendered = {}
+            for chunk, future in zip(chunks, futures):
+                rendered.update(zip(chunk, future.result()))
+        except BrokenProcessPool as e:
+            log.warning("fill_pool_broken", error=str(e), slides=len(names))
+            _discard_pool(pool)
+            return None
+    metrics.FILL_SLIDES.inc(len(names), mode="parallel")
+    return rendered
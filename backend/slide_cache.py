@@ -0,0 +1,141 @@
+"""
+Incremental re-rendering for the OOXML engine.
+
+Each slide part depends only on the placeholders found in its own text. A
+rendered slide is cached under (template hash, part name, first-slide flag,
+hash of the values of those placeholders), already deflated, so when a
+reviewer edits one cell and regenerates, only the slides that use that
+cell's column are parsed and filled again; every other slide is written
+straight from the cache, and non-slide parts are copied raw as before.
+
+The paragraph texts of each template slide (what the dependencies are
+computed from) and its image placeholders are cached per template too, so
+an unchanged slide is not even decompressed.
+
+Settings (env):
+- SLIDE_CACHE_MB: memory budget for rendered slides; 0 disables (default 64)
+"""
+
+import hashlib
+import html
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+_TEXT_RE = re.compile(rb"<a:t(?:\s[^>]*)?>([^<]*)</a:t>")
+_PARAGRAPH_END = b"</a:p>"
+_MAX_TEMPLATES = 32
+
+
+class RenderedSlide(NamedTuple):
+    """A filled slide part as stored in the ZIP: raw deflate data, CRC-32 and size."""
+    data: bytes
+    crc: int
+    file_size: int
+
+
+def paragraph_texts(xml: bytes) -> tuple[str, ...]:
+    """Text of each paragraph of a slide part (runs joined), without building a tree."""
+    texts = []
+    for chunk in xml.split(_PARAGRAPH_END):
+        parts = _TEXT_RE.findall(chunk)
+        if parts:
+            texts.append("".join(html.unescape(t.decode("utf-8")) for t in parts))
+    return tuple(texts)
+
+
+def slide_dependencies(texts: tuple[str, ...], matcher) -> tuple[str, ...]:
+    """Placeholders (replacement keys) a slide uses, sorted."""
+    found = set()
+    for text in texts:
+        found.update(m.group(0) for m in matcher.finditer(text))
+    return tuple(sorted(found))
+
+
+def values_hash(dependencies: tuple[str, ...], replacements: dict[str, str]) -> str:
+    values = [(ph, replacements[ph]) for ph in dependencies]
+    return hashlib.sha256(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class SlideCache:
+    """Rendered slides (LRU, bounded by total bytes), per-template paragraph texts and image placeholders."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._slides: "OrderedDict[tuple, RenderedSlide]" = OrderedDict()
+        self._size = 0
+        self._texts: "OrderedDict[str, dict[str, tuple[str, ...]]]" = OrderedDict()
+        self._pictures: "OrderedDict[str, dict[str, tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _per_template(self, store: OrderedDict, template_key: str) -> dict:
+        with self._lock:
+            entries = store.get(template_key)
+            if entries is None:
+                entries = store[template_key] = {}
+                while len(store) > _MAX_TEMPLATES:
+                    store.popitem(last=False)
+            else:
+                store.move_to_end(template_key)
+            return entries
+
+    def texts(self, template_key: str) -> dict[str, tuple[str, ...]]:
+        """Mutable part name -> paragraph texts dict for a template."""
+        return self._per_template(self._texts, template_key)
+
+    def pictures(self, template_key: str) -> dict[str, tuple]:
+        """Mutable part name -> image placeholders (images.PictureSlot) dict for a template."""
+        return self._per_template(self._pictures, template_key)
+
+    def get(self, key: tuple) -> RenderedSlide | None:
+        with self._lock:
+            slide = self._slides.get(key)
+            if slide is None:
+                self.misses += 1
+                return None
+            self._slides.move_to_end(key)
+            self.hits += 1
+            return slide
+
+    def put(self, key: tuple, slide: RenderedSlide) -> None:
+        size = len(slide.data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._slides.pop(key, None)
+            if old is not None:
+                self._size -= len(old.data)
+            self._slides[key] = slide
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._slides.popitem(last=False)
+                self._size -= len(evicted.data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"slides": len(self._slides), "bytes": self._size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_slide_cache() -> SlideCache | None:
+    """Process-wide slide cache from SLIDE_CACHE_MB; None when disabled."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                max_mb = float(os.environ.get("SLIDE_CACHE_MB", "64"))
+            except ValueError:
+                max_mb = 64.0
+            if max_mb <= 0:
+                return None
+            _cache = SlideCache(int(max_mb * 1024 * 1024))
+        return _cache
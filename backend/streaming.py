@@ -0,0 +1,116 @@
+"""
+Streaming helpers for generated packages.
+
+`stream_writes(write)` runs `write(sink)` in a background thread and yields
+what it writes in chunks, so a deck can be sent to the client while it is
+still being saved instead of being built whole in memory first. The sink is
+non-seekable (zipfile then writes data descriptors, as for the batch ZIP)
+and bounded: the writer blocks when the client falls behind, and stops with
+BrokenPipeError if the client goes away.
+"""
+
+import contextvars
+import os
+import queue
+import threading
+
+CHUNK_SIZE = 256 * 1024
+_DONE = object()
+
+
+class ChunkPipe:
+    """Write-only file object that hands fixed-size chunks to a bounded queue."""
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, max_chunks: int = 8):
+        self.chunk_size = chunk_size
+        self._queue: queue.Queue = queue.Queue(maxsize=max_chunks)
+        self._buffer = bytearray()
+        self._pos = 0
+        self.cancelled = threading.Event()
+
+    def _put(self, item) -> None:
+        while True:
+            if self.cancelled.is_set():
+                raise BrokenPipeError("Client stopped reading the response")
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._pos += len(data)
+        while len(self._buffer) >= self.chunk_size:
+            self._put(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def finish(self, error: BaseException | None = None) -> None:
+        if error is None and self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+        self._put(error if error is not None else _DONE)
+
+    def get(self):
+        return self._queue.get()
+
+
+def stream_writes(write, tee_path: str | os.PathLike | None = None, on_close=None,
+                  chunk_size: int = CHUNK_SIZE):
+    """
+    Return an iterator over the bytes `write(sink)` writes, as it writes them.
+
+    `write` runs in the caller's context (so metric spans still reach the
+    active trace) but only once the first chunk is requested. With
+    `tee_path`, chunks are also written to that file, which is removed
+    unless the stream completes. `on_close(completed)` is called when the
+    iterator finishes or is closed.
+    """
+    ctx = contextvars.copy_context()
+    return _iter_writes(ctx, write, tee_path, on_close, chunk_size)
+
+
+def _iter_writes(ctx, write, tee_path, on_close, chunk_size):
+    pipe = ChunkPipe(chunk_size)
+
+    def run() -> None:
+        try:
+            ctx.run(write, pipe)
+            pipe.finish()
+        except BaseException as e:  # handed to the consumer
+            if not pipe.cancelled.is_set():
+                try:
+                    pipe.finish(e)
+                except BrokenPipeError:
+                    pass
+
+    threading.Thread(target=run, name="stream-writer", daemon=True).start()
+    tee = open(tee_path, "wb") if tee_path is not None else None
+    completed = False
+    try:
+        while True:
+            item = pipe.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            if tee is not None:
+                tee.write(item)
+            yield item
+        completed = True
+    finally:
+        # A writer still running sees this on its next write and stops
+        pipe.cancelled.set()
+        if tee is not None:
+            tee.close()
+            if not completed:
+                os.unlink(tee_path)
+        if on_close is not None:
+            on_close(completed)
@@ -0,0 +1,374 @@
+"""
+Compiled templates: parse a PPTX once, fill it many times.
+
+A template is compiled the first time its content hash is seen:
+- placeholders split across runs are merged into a single run up front
+- the exact slide / shape / table cell / paragraph / run of every placeholder is indexed
+- auto-fit is applied (frames without placeholders are fully fitted once)
+- image placeholders (pictures with a placeholder in their alt text, see
+  images.py) are indexed by slide and shape
+
+Compiled templates are kept in a bounded LRU cache (TEMPLATE_CACHE_SIZE env,
+default 16). A fill re-opens the normalized package and only touches the
+indexed runs, so its cost depends on the number of placeholders rather than
+on the size of the deck.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import cached_property
+from io import BytesIO
+from typing import NamedTuple
+
+from pptx import Presentation
+
+# Both placeholder syntaxes: [column] (mapping UI) and {{column}}
+PLACEHOLDER_PATTERN = re.compile(r"\{\{[^{}]+\}\}|\[[^\[\]]+\]")
+
+
+class RunLocation(NamedTuple):
+    """Where a placeholder lives. `cell` is (row, col) for table cells, else None."""
+    slide: int
+    shape_path: tuple[int, ...]
+    cell: tuple[int, int] | None
+    paragraph: int
+    run: int
+
+
+@dataclass
+class CompiledTemplate:
+    content_hash: str
+    data: bytes  # normalized package (split placeholders merged, auto-fit applied)
+    runs: dict[RunLocation, tuple[str, ...]] = field(default_factory=dict)
+    text: str = ""  # all paragraph text, newline-separated
+    split: set[tuple[RunLocation, str]] = field(default_factory=set)  # placeholders that spanned runs
+    shape_names: dict[tuple[int, tuple[int, ...]], str] = field(default_factory=dict)
+    pictures: dict[tuple[int, tuple[int, ...]], tuple[str, ...]] = field(default_factory=dict)
+
+    @property
+    def placeholders(self) -> set[str]:
+        return {ph for tokens in (*self.runs.values(), *self.pictures.values()) for ph in tokens}
+
+    def locations(self, placeholder: str) -> list[RunLocation]:
+        return [loc for loc, tokens in self.runs.items() if placeholder in tokens]
+
+    @cached_property
+    def placeholder_index(self) -> list[dict]:
+        """
+        Every placeholder with its locations, in document order (computed once per
+        compiled template), image placeholders last. Slides are numbered from 1.
+        """
+        index: dict[str, dict] = {}
+
+        def entry_for(ph: str) -> dict:
+            entry = index.get(ph)
+            if entry is None:
+                entry = index[ph] = {
+                    "placeholder": ph,
+                    "name": ph[2:-2] if ph.startswith("{{") else ph[1:-1],
+                    "syntax": "braces" if ph.startswith("{{") else "brackets",
+                    "locations": [],
+                }
+            return entry
+
+        for loc, tokens in self.runs.items():
+            for ph in tokens:
+                entry_for(ph)["locations"].append({
+                    "slide": loc.slide + 1,
+                    "shape": self.shape_names.get((loc.slide, loc.shape_path), ""),
+                    "shape_path": list(loc.shape_path),
+                    "cell": list(loc.cell) if loc.cell else None,
+                    "paragraph": loc.paragraph,
+                    "split": (loc, ph) in self.split,
+                })
+        for (slide, shape_path), tokens in self.pictures.items():
+            for ph in tokens:
+                entry_for(ph)["locations"].append({
+                    "slide": slide + 1,
+                    "shape": self.shape_names.get((slide, shape_path), ""),
+                    "shape_path": list(shape_path),
+                    "cell": None,
+                    "paragraph": None,
+                    "split": False,
+                    "image": True,
+                })
+        return list(index.values())
+
+    def covers(self, replacements: dict[str, str]) -> bool:
+        """True if every replacement key found in the template is an indexed placeholder."""
+        indexed = self.placeholders
+        return not any(
+            ph not in indexed and ph in self.text
+            for ph in replacements
+        )
+
+
+def template_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def stream_hash(stream, chunk_size: int = 1024 * 1024) -> str:
+    """sha256 of a seekable binary stream, read in chunks; the stream is rewound."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def content_hash(source) -> str:
+    """Cache key of a template given as bytes or a seekable binary stream."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return template_hash(bytes(source))
+    return stream_hash(source)
+
+
+def read_template_bytes(template_file) -> bytes:
+    """Read a template from a path or a file-like object."""
+    if hasattr(template_file, "read"):
+        return template_file.read()
+    with open(template_file, "rb") as f:
+        return f.read()
+
+
+# ---------- Shape walking ----------
+def _iter_shapes_with_path(shapes, prefix=()):
+    for idx, shape in enumerate(shapes):
+        path = prefix + (idx,)
+        yield path, shape
+        if hasattr(shape, "shapes"):  # group shape
+            yield from _iter_shapes_with_path(shape.shapes, path)
+
+
+def _iter_text_frames(slide):
+    """Yield (shape_path, cell, shape, text_frame) for every text frame on a slide, tables included."""
+    for path, shape in _iter_shapes_with_path(slide.shapes):
+        if hasattr(shape, "has_text_frame") and shape.has_text_frame:
+            yield path, None, shape, shape.text_frame
+        if hasattr(shape, "has_table") and shape.has_table:
+            for r, row in enumerate(shape.table.rows):
+                for c, cell in enumerate(row.cells):
+                    yield path, (r, c), shape, cell.text_frame
+
+
+def _resolve_shape(slide, shape_path):
+    shapes = slide.shapes
+    shape = None
+    for idx in shape_path:
+        shape = shapes[idx]
+        shapes = getattr(shape, "shapes", None)
+    return shape
+
+
+def _resolve_text_frame(slide, shape_path, cell):
+    """Return (shape, text_frame) for an indexed location."""
+    shape = _resolve_shape(slide, shape_path)
+    if cell is None:
+        return shape, shape.text_frame
+    return shape, shape.table.cell(*cell).text_frame
+
+
+# ---------- Compilation ----------
+def _run_at(starts: list[int], texts: list[str], offset: int) -> int:
+    for i, (start, text) in enumerate(zip(starts, texts)):
+        if start <= offset < start + len(text):
+            return i
+    raise IndexError(offset)
+
+
+def _merge_split_placeholders(paragraph) -> set[str]:
+    """
+    Move every placeholder that spans several runs into the first run of the span.
+    Returns the placeholders that were merged.
+    """
+    merged: set[str] = set()
+    runs = paragraph.runs
+    if len(runs) < 2:
+        return merged
+    texts = [r.text or "" for r in runs]
+    full = "".join(texts)
+    for match in PLACEHOLDER_PATTERN.finditer(full):
+        ms, me = match.span()
+        starts = []
+        pos = 0
+        for t in texts:
+            starts.append(pos)
+            pos += len(t)
+        first = _run_at(starts, texts, ms)
+        last = _run_at(starts, texts, me - 1)
+        if first == last:
+            continue
+        merged.add(match.group(0))
+        texts[first] = texts[first][: ms - starts[first]] + full[ms:me]
+        for i in range(first + 1, last):
+            texts[i] = ""
+        texts[last] = texts[last][me - starts[last]:]
+    for run, text in zip(runs, texts):
+        if run.text != text:
+            run.text = text
+    return merged
+
+
+def compile_template(data: bytes, content_hash: str | None = None) -> CompiledTemplate:
+    """Normalize a template and index the location of every placeholder."""
+    import images
+    from main import auto_fit_text, text_frame_extents
+
+    prs = Presentation(BytesIO(data))
+    compiled = CompiledTemplate(content_hash=content_hash or template_hash(data), data=b"")
+    text_parts: list[str] = []
+
+    for slide_idx, slide in enumerate(prs.slides):
+        for shape_path, shape in _iter_shapes_with_path(slide.shapes):
+            tokens = images.picture_tokens(shape)
+            if tokens:
+                compiled.pictures[(slide_idx, shape_path)] = tokens
+                compiled.shape_names[(slide_idx, shape_path)] = shape.name
+                # So the columns they map to are loaded like those of text placeholders
+                text_parts.append(" ".join(tokens))
+        for shape_path, cell, shape, text_frame in _iter_text_frames(slide):
+            has_placeholder = False
+            for p_idx, paragraph in enumerate(text_frame.paragraphs):
+                merged = _merge_split_placeholders(paragraph)
+                text_parts.append("".join(r.text or "" for r in paragraph.runs))
+                for r_idx, run in enumerate(paragraph.runs):
+                    tokens = PLACEHOLDER_PATTERN.findall(run.text or "")
+                    if tokens:
+                        loc = RunLocation(slide_idx, shape_path, cell, p_idx, r_idx)
+                        compiled.runs[loc] = tuple(dict.fromkeys(tokens))
+                        compiled.split.update((loc, ph) for ph in tokens if ph in merged)
+                        compiled.shape_names[(slide_idx, shape_path)] = shape.name
+                        has_placeholder = True
+            # Frames without placeholders never change, so they are fitted once here.
+            # Frames with placeholders are only shrunk at fill time, against the real text.
+            extents = None if has_placeholder else text_frame_extents(shape, cell)
+            if cell is None and slide_idx == 0:
+                auto_fit_text(text_frame, max_font_size=44, extents=extents)
+            else:
+                auto_fit_text(text_frame, extents=extents)
+
+    out = BytesIO()
+    prs.save(out)
+    compiled.data = out.getvalue()
+    compiled.text = "\n".join(text_parts)
+    return compiled
+
+
+# ---------- LRU cache ----------
+_cache: "OrderedDict[str, CompiledTemplate]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_size() -> int:
+    try:
+        return max(1, int(os.environ.get("TEMPLATE_CACHE_SIZE", "16")))
+    except ValueError:
+        return 16
+
+
+def get_cached_template(content_hash: str) -> CompiledTemplate | None:
+    """The compiled template with this content hash if it is in the cache, else None."""
+    with _cache_lock:
+        compiled = _cache.get(content_hash)
+        if compiled is not None:
+            _cache.move_to_end(content_hash)
+        return compiled
+
+
+def get_compiled_template(source, key: str | None = None) -> CompiledTemplate:
+    """
+    Return the compiled template for these bytes (or seekable binary stream),
+    compiling on first use. A stream is only hashed in chunks on a cache hit,
+    never read into memory whole. Pass the content hash as `key` when it is
+    already known, so the template is not hashed again.
+    """
+    data = bytes(source) if isinstance(source, (bytes, bytearray, memoryview)) else None
+    if key is None:
+        key = template_hash(data) if data is not None else stream_hash(source)
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+
+    if data is None:
+        data = source.read()
+        source.seek(0)
+    compiled = compile_template(data, key)
+
+    with _cache_lock:
+        _cache[key] = compiled
+        _cache.move_to_end(key)
+        while len(_cache) > _cache_size():
+            _cache.popitem(last=False)
+    return compiled
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+# ---------- Fill ----------
+def fill_compiled(compiled: CompiledTemplate, replacements: dict[str, str], progress=None, out=None):
+    """Fill only the indexed runs of a compiled template.
+
+    `progress(slides_done, slides_total)` is called after each slide is filled.
+    The package is saved into `out` (any writable file object, seekable or not)
+    when given, else into a new BytesIO, which is returned rewound.
+    """
+    import images
+    import metrics
+    from main import PlaceholderMatcher, auto_fit_text, replace_in_run, text_frame_extents
+
+    with metrics.span("template_parse"):
+        prs = Presentation(BytesIO(compiled.data))
+    slides = list(prs.slides)
+    matcher = PlaceholderMatcher(replacements)
+
+    # Resolve every target before editing: name highlighting inserts new runs
+    targets = []
+    frames = {}
+    for loc, tokens in compiled.runs.items():
+        if not any(ph in replacements for ph in tokens):
+            continue
+        frame_key = (loc.slide, loc.shape_path, loc.cell)
+        if frame_key not in frames:
+            frames[frame_key] = _resolve_text_frame(slides[loc.slide], loc.shape_path, loc.cell)
+        paragraph = frames[frame_key][1].paragraphs[loc.paragraph]
+        targets.append((loc.slide, paragraph, paragraph.runs[loc.run]))
+
+    done = 0
+    with metrics.span("replace"):
+        for slide_idx, paragraph, run in targets:
+            if progress and slide_idx > done:
+                done = slide_idx
+                progress(done, len(slides))
+            replace_in_run(paragraph, run, matcher)
+
+    with metrics.span("auto_fit"):
+        for (slide_idx, _, cell), (shape, text_frame) in frames.items():
+            extents = text_frame_extents(shape, cell)
+            if cell is None and slide_idx == 0:
+                auto_fit_text(text_frame, max_font_size=44, extents=extents)
+            else:
+                auto_fit_text(text_frame, extents=extents)
+    with metrics.span("images"):
+        for (slide_idx, shape_path), tokens in compiled.pictures.items():
+            if any(ph in replacements for ph in tokens):
+                slide = slides[slide_idx]
+                images.fill_picture(slide, _resolve_shape(slide, shape_path), tokens, replacements)
+    if progress:
+        progress(len(slides), len(slides))
+
+    target = out if out is not None else BytesIO()
+    with metrics.span("save"):
+        prs.save(target)
+    if out is None:
+        target.seek(0)
+    return target
@@ -0,0 +1,18 @@
+"""
+Test setup: backend modules are imported flat (as `python main.py` runs them),
+and the output store and datasets live in a per-session temp directory.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "benchmarks"))
+
+_tmp = tempfile.mkdtemp(prefix="ppt-tests-")
+os.environ.setdefault("OUTPUT_STORE_DIR", os.path.join(_tmp, "outputs"))
+os.environ.setdefault("DATASET_DIR", os.path.join(_tmp, "datasets"))
+os.environ.pop("DATABASE_URL", None)
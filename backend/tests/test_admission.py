@@ -0,0 +1,24 @@
+from io import BytesIO
+
+import admission
+import synthetic
+
+
+def test_deck_copies_scale_slide_xml_only():
+    info = admission.template_info(synthetic.make_template(slides=3, columns=4))
+    assert 0 < info.slide_xml_bytes < info.xml_bytes
+    one = admission.estimate(info)
+    fifty = admission.estimate(info, copies=50)
+    assert fifty - one == admission.PPTX_XML_FACTOR * info.slide_xml_bytes * 49
+
+
+def test_deck_copies_count_from_first_row(monkeypatch):
+    import main
+
+    monkeypatch.setattr(admission, "admit", lambda cost, operation: cost)
+    template = synthetic.make_template(slides=2, columns=4)
+    workbook = synthetic.make_workbook(rows=20, columns=4)
+    cost = main._admit("batch", template, BytesIO(workbook), "data.xlsx", rows=10, copies=None, first_row=8)
+    info = admission.template_info(template)
+    per_process = admission.estimate(info, engine=main.get_fill_engine(), copies=2)
+    assert cost == per_process + 10 * 4 * admission.CELL_BYTES
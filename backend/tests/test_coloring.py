@@ -0,0 +1,88 @@
+"""
+Name and missing-field coloring per case, for both fill engines.
+
+Runs are listed as (text, color) with empty runs left out; None is an
+inherited color. Differences from the original per-placeholder loop:
+- every occurrence of a name is colored, not only the first
+- a name at the start of a run, or followed by other placeholders in the
+  same run, is colored (it was left uncolored there)
+- a name next to a missing field keeps its color; only the missing-field
+  text and the text around it in that run are colored red
+- a placeholder split across runs is merged into the first run of its
+  span, so text in later runs keeps its own color (the whole paragraph
+  used to be merged into the first run); the full-scan fallback
+  (replace_in_text_runs) still merges the whole paragraph, as before
+"""
+
+from io import BytesIO
+
+import pytest
+from pptx import Presentation
+from pptx.util import Inches, Pt
+
+import main
+
+NAME = main.NAME_COLOR
+MISSING = main.MISSING_FIELD_COLOR
+MISSING_TEXT = "No missing field in excel"
+REPLACEMENTS = {"[Name]": "Ada", "[missing]": MISSING_TEXT, "[city]": "Paris"}
+
+CASES = {
+    "name": (["Hello [Name]!"], [("Hello ", None), ("Ada", NAME), ("!", None)]),
+    "name_twice": (["[Name] and [Name]"], [("Ada", NAME), (" and ", None), ("Ada", NAME)]),
+    "name_split": (["Hi [Na", "me] here"], [("Hi ", None), ("Ada", NAME), (" here", None)]),
+    "missing": (["Field: [missing]"], [("Field: " + MISSING_TEXT, MISSING)]),
+    "missing_split": (["x [miss", "ing] y"], [("x " + MISSING_TEXT, MISSING), (" y", None)]),
+    "name_then_missing": (["[Name] [missing]"], [("Ada", NAME), (" " + MISSING_TEXT, MISSING)]),
+    "missing_then_name": (["[missing] by [Name]"], [(MISSING_TEXT + " by ", MISSING), ("Ada", NAME)]),
+    "name_then_other": (["[Name] from [city]"], [("Ada", NAME), (" from Paris", None)]),
+    "other_then_name": (["[city]: [Name]"], [("Paris: ", None), ("Ada", NAME)]),
+    "name_then_split_other": (["[Name] in [ci", "ty]"], [("Ada", NAME), (" in Paris", None)]),
+    "name_then_missing_run": (["[Name] is", " [missing]"],
+                              [("Ada", NAME), (" is", None), (" " + MISSING_TEXT, MISSING)]),
+}
+
+# replace_in_text_runs, where it differs from the engines
+FULL_SCAN = {
+    "missing_split": [("x " + MISSING_TEXT + " y", MISSING)],
+    "name_then_split_other": [("Ada in Paris", None)],
+}
+
+
+def _template(runs: list[str]) -> bytes:
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    paragraph = slide.shapes.add_textbox(Inches(1), Inches(1), Inches(8), Inches(2)).text_frame.paragraphs[0]
+    for text in runs:
+        run = paragraph.add_run()
+        run.text = text
+        run.font.size = Pt(12)
+    out = BytesIO()
+    prs.save(out)
+    return out.getvalue()
+
+
+def _runs(prs) -> list[tuple[str, str | None]]:
+    paragraph = prs.slides[0].shapes[0].text_frame.paragraphs[0]
+    runs = []
+    for run in paragraph.runs:
+        if run.text:
+            color = run.font.color.rgb if run.font.color.type is not None else None
+            runs.append((run.text, str(color) if color is not None else None))
+    return runs
+
+
+@pytest.mark.parametrize("engine", main.FILL_ENGINES)
+@pytest.mark.parametrize("case", CASES)
+def test_coloring(case, engine):
+    runs, expected = CASES[case]
+    deck = main.apply_replacements_to_ppt(_template(runs), REPLACEMENTS, engine=engine)
+    assert _runs(Presentation(deck)) == expected
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_full_scan_coloring(case):
+    runs, expected = CASES[case]
+    prs = Presentation(BytesIO(_template(runs)))
+    main.replace_in_text_runs(prs.slides[0].shapes[0].text_frame, REPLACEMENTS)
+    assert _runs(prs) == FULL_SCAN.get(case, expected)
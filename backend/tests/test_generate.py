@@ -0,0 +1,88 @@
+from io import BytesIO
+
+import pytest
+
+import admission
+import main
+import metrics
+import synthetic
+
+
+@pytest.fixture
+def client():
+    main.app.config["TESTING"] = True
+    with main.app.test_client() as client:
+        yield client
+
+
+def _generate(client, template: bytes, workbook: bytes):
+    return client.post("/generate", data={
+        "template": (BytesIO(template), "template.pptx"),
+        "excel": (BytesIO(workbook), "data.xlsx"),
+        "row_index": "1",
+    })
+
+
+def test_repeated_generate_releases_admission(client):
+    template = synthetic.make_template(slides=2, columns=5)
+    workbook = synthetic.make_workbook(rows=3, columns=5)
+    etags = []
+    for _ in range(3):
+        response = _generate(client, template, workbook)
+        assert response.status_code == 200
+        assert response.data[:2] == b"PK"
+        etags.append(response.headers["ETag"])
+        response.close()
+        stats = admission.stats()
+        assert stats["reserved_bytes"] == 0
+        assert stats["running"] == 0
+    # The repeats were served from the output store
+    assert len(set(etags)) == 1
+
+
+def test_streamed_generate_logs_all_stages(client, monkeypatch):
+    records = []
+    monkeypatch.setattr(metrics.log, "info", lambda event, **fields: records.append((event, fields)))
+    monkeypatch.setenv("SERVER_TIMING", "1")
+    template = synthetic.make_template(slides=1, columns=4)
+    workbook = synthetic.make_workbook(rows=2, columns=4)
+    response = _generate(client, template, workbook)
+    assert response.status_code == 200
+    assert "template_parse;dur=" in response.headers["Server-Timing"]
+    response.data
+    response.close()
+    finished = [fields for event, fields in records if event == "trace_finished"]
+    assert len(finished) == 1
+    assert finished[0]["operation"] == "generate"
+    assert "replace;dur=" in finished[0]["server_timing"]
+    assert "save;dur=" in finished[0]["server_timing"]
+
+
+def test_empty_deck_batch_releases_admission(client):
+    template = synthetic.make_template(slides=1, columns=4)
+    workbook = synthetic.make_workbook(rows=6, columns=4)
+    response = client.post("/generate/batch", data={
+        "template": (BytesIO(template), "template.pptx"),
+        "excel": (BytesIO(workbook), "data.xlsx"),
+        "output": "deck",
+        "start": "6",
+    })
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "No rows to render."
+    response.close()
+    assert admission.stats()["reserved_bytes"] == 0
+
+
+def test_generate_hashes_template_once(client, monkeypatch):
+    import template_cache
+
+    calls = []
+    stream_hash = template_cache.stream_hash
+    monkeypatch.setattr(template_cache, "stream_hash", lambda stream: calls.append(1) or stream_hash(stream))
+    template = synthetic.make_template(slides=1, columns=3)
+    workbook = synthetic.make_workbook(rows=2, columns=3)
+    response = _generate(client, template, workbook)
+    assert response.status_code == 200
+    response.data
+    response.close()
+    assert len(calls) == 1
@@ -0,0 +1,35 @@
+import os
+import time
+
+from output_store import BoundedFileStore
+
+
+def test_open_entry_survives_eviction(tmp_path):
+    store = BoundedFileStore(tmp_path, max_bytes=10, ttl=60, suffix=".pptx")
+    store.put("a", b"12345678")
+    f = store.open("a")
+    store.put("b", b"12345678")  # over budget: evicts "a"
+    assert not store.path_for("a").exists()
+    with f:
+        assert f.read() == b"12345678"
+    assert store.open("a") is None
+
+
+def test_write_returns_rewound_file(tmp_path):
+    store = BoundedFileStore(tmp_path, max_bytes=100, ttl=60)
+    with store.write("a", lambda f: f.write(b"deck")) as f:
+        assert f.read() == b"deck"
+    assert store.path_for("a").read_bytes() == b"deck"
+
+
+def test_eviction_sweeps_stale_temp_files(tmp_path):
+    store = BoundedFileStore(tmp_path, max_bytes=100, ttl=60)
+    stale = store.temp_path()
+    stale.write_bytes(b"partial")
+    old = time.time() - 120
+    os.utime(stale, (old, old))
+    fresh = store.temp_path()
+    fresh.write_bytes(b"in progress")
+    store.put("a", b"deck")
+    assert not stale.exists()
+    assert fresh.exists()
@@ -0,0 +1,23 @@
+import pandas as pd
+
+import main
+import workbook_cache
+
+
+def test_replacement_table_with_nullable_columns():
+    df = pd.DataFrame({
+        "count": pd.array([3, pd.NA, 0], dtype="Int64"),
+        "name": pd.array(["  Ada   Lovelace ", pd.NA, ""], dtype="string"),
+    })
+    mapping = {"[count]": "count", "[name]": "name"}
+    table = main.build_replacement_table(df, mapping)
+    for i in range(len(df)):
+        assert table.row(i) == main.build_replacements(df.iloc[i], mapping)
+    assert table.row(0) == {"[count]": "3", "[name]": "Ada Lovelace"}
+    assert table.row(1) == {"[count]": "No count field in excel", "[name]": "No name field in excel"}
+
+
+def test_key_index_with_nullable_column():
+    df = pd.DataFrame({"candidate_id": pd.array(["a1", pd.NA, "b2"], dtype="string")})
+    workbook = workbook_cache.Workbook("hash", {"main": df})
+    assert workbook.find_row("candidate_id", "b2") == 2
@@ -0,0 +1,175 @@
+"""
+Shrink-to-fit text measurement.
+
+`fit_font_size` finds the largest font size (binary search, half-point steps,
+down to a minimum) at which word-wrapped text fits a box. Widths come from
+the real font file when it can be found (via Pillow), otherwise from a
+generic proportional-font metric.
+
+Both levels are cached: glyph-width tables per font, and fit results per
+(text, font, size, box) so fitting the same content across a batch is cheap.
+
+Extra font directories can be listed in FONT_DIRS (os.pathsep-separated).
+"""
+
+import math
+import os
+import re
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+LINE_SPACING = 1.2  # line height as a multiple of the font size
+UNITS_PER_EM = 1000
+
+_FONT_SUFFIXES = (".ttf", ".otf", ".ttc")
+
+
+# ---------- Font lookup ----------
+def _font_dirs() -> list[Path]:
+    dirs = [Path(d) for d in os.environ.get("FONT_DIRS", "").split(os.pathsep) if d]
+    if sys.platform.startswith("win"):
+        dirs.append(Path(os.environ.get("WINDIR", r"C:\Windows")) / "Fonts")
+    elif sys.platform == "darwin":
+        dirs += [Path("/Library/Fonts"), Path("/System/Library/Fonts"), Path.home() / "Library/Fonts"]
+    else:
+        dirs += [Path("/usr/share/fonts"), Path("/usr/local/share/fonts"), Path.home() / ".fonts"]
+    return dirs
+
+
+def _font_key(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+@lru_cache(maxsize=1)
+def _font_index() -> dict[str, str]:
+    """Normalized file stem -> font path, for every font file in the font dirs."""
+    index: dict[str, str] = {}
+    for root in _font_dirs():
+        if not root.is_dir():
+            continue
+        for dirpath, _, files in os.walk(root):
+            for name in files:
+                stem, suffix = os.path.splitext(name)
+                if suffix.lower() in _FONT_SUFFIXES:
+                    index.setdefault(_font_key(stem), os.path.join(dirpath, name))
+    return index
+
+
+def find_font_file(font_name: str | None) -> str | None:
+    if not font_name:
+        return None
+    index = _font_index()
+    key = _font_key(font_name)
+    for candidate in (key, key + "regular", key + "mt"):
+        if candidate in index:
+            return index[candidate]
+    return None
+
+
+# ---------- Glyph widths ----------
+def _fallback_width(ch: str) -> int:
+    """Approximate advance width (per 1000 em) of a generic sans-serif font."""
+    if ch == " ":
+        return 278
+    if ch in "iljI.,:;'|!`":
+        return 250
+    if ch in "frt()[]{}-\"":
+        return 333
+    if ch in "mwMW":
+        return 833
+    if ch.isupper():
+        return 667
+    if ch.isdigit():
+        return 556
+    if ord(ch) > 0x2E80:  # CJK and wider scripts
+        return 1000
+    return 520
+
+
+class FontMetrics:
+    """Advance widths in 1/1000 em for one font, measured lazily and memoized."""
+
+    def __init__(self, font_name: str | None):
+        self.font_name = font_name
+        self._font = None
+        path = find_font_file(font_name)
+        if path:
+            try:
+                from PIL import ImageFont
+                self._font = ImageFont.truetype(path, UNITS_PER_EM)
+            except Exception:
+                self._font = None
+        self._widths: dict[str, float] = {}
+
+    @property
+    def is_fallback(self) -> bool:
+        return self._font is None
+
+    def char_width(self, ch: str) -> float:
+        width = self._widths.get(ch)
+        if width is None:
+            width = self._font.getlength(ch) if self._font is not None else _fallback_width(ch)
+            self._widths[ch] = width
+        return width
+
+    def text_width(self, text: str, size_pt: float) -> float:
+        """Width of text in points at the given size."""
+        return sum(self.char_width(ch) for ch in text) * size_pt / UNITS_PER_EM
+
+
+@lru_cache(maxsize=64)
+def font_metrics(font_name: str | None) -> FontMetrics:
+    return FontMetrics(font_name)
+
+
+# ---------- Layout ----------
+def count_lines(paragraphs: tuple[str, ...], metrics: FontMetrics, size_pt: float, width_pt: float) -> int:
+    """Number of lines after greedy word wrapping at width_pt."""
+    space = metrics.char_width(" ") * size_pt / UNITS_PER_EM
+    lines = 0
+    for text in paragraphs:
+        lines += 1
+        current = 0.0
+        for word in text.split():
+            w = metrics.text_width(word, size_pt)
+            if current and current + space + w > width_pt:
+                lines += 1
+                current = 0.0
+            if w > width_pt:
+                # A word longer than the line wraps on its own
+                extra = math.ceil(w / width_pt) - 1
+                lines += extra
+                w -= extra * width_pt
+            current = w if not current else current + space + w
+    return lines
+
+
+def text_fits(paragraphs: tuple[str, ...], font_name: str | None, size_pt: float,
+              width_pt: float, height_pt: float) -> bool:
+    metrics = font_metrics(font_name)
+    lines = count_lines(paragraphs, metrics, size_pt, width_pt)
+    return lines * size_pt * LINE_SPACING <= height_pt
+
+
+@lru_cache(maxsize=4096)
+def fit_font_size(paragraphs: tuple[str, ...], font_name: str | None, size_pt: float,
+                  min_size_pt: float, width_pt: float, height_pt: float) -> float:
+    """
+    Largest size <= size_pt (in half points, >= min_size_pt) at which the text fits
+    width_pt x height_pt. Returns size_pt unchanged if it already fits, and
+    min_size_pt if nothing fits.
+    """
+    if width_pt <= 0 or height_pt <= 0 or text_fits(paragraphs, font_name, size_pt, width_pt, height_pt):
+        return size_pt
+    lo = math.ceil(min_size_pt * 2)
+    hi = math.floor(size_pt * 2) - 1
+    best = min_size_pt
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if text_fits(paragraphs, font_name, mid / 2, width_pt, height_pt):
+            best = mid / 2
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return best
@@ -0,0 +1,133 @@
+"""
+Boot-time warm-up.
+
+Importing `main` is kept cheap (pandas, numpy and python-pptx are imported
+where they are used, the database is only touched on first use), so after a
+cold start the server answers /health right away. `start()` then does the
+first-use work in a background thread of each server process:
+- imports: pandas, numpy, python-pptx, lxml, openpyxl and the fill modules
+- mapping: loads the mapping snapshot (and creates the DB tables)
+- templates: compiles the templates listed in WARMUP_TEMPLATES into the
+  template cache
+
+Requests are served meanwhile. A generation that arrives early waits only
+for the step it needs that is still running (imports are shared, a compiled
+template is reused), not for the whole warm-up. Step durations are reported
+by `status()` (and /health) and observed under the `warmup` operation in
+/metrics.
+
+Settings (env):
+- WARMUP: 0 to skip the warm-up (default 1)
+- WARMUP_TEMPLATES: template files or directories of .pptx files to
+  precompile, separated by os.pathsep (default none)
+"""
+
+import importlib
+import os
+import threading
+import time
+from pathlib import Path
+
+import metrics
+from logs import get_logger
+
+log = get_logger("warmup")
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+_state: dict = {"state": PENDING, "pid": None, "steps": {}, "templates": 0, "error": None}
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.environ.get("WARMUP", "1").strip().lower() not in ("0", "false", "no")
+
+
+def template_paths() -> list[Path]:
+    """The .pptx files named by WARMUP_TEMPLATES (directories are expanded)."""
+    paths = []
+    for entry in os.environ.get("WARMUP_TEMPLATES", "").split(os.pathsep):
+        entry = entry.strip()
+        if not entry:
+            continue
+        path = Path(entry)
+        if path.is_dir():
+            paths.extend(sorted(path.glob("*.pptx")))
+        elif path.is_file():
+            paths.append(path)
+        else:
+            log.warning("warmup_template_missing", path=entry)
+    return paths
+
+
+_WARM_MODULES = (
+    "lxml.etree", "numpy", "openpyxl", "pandas", "pptx", "pptx.util",
+    "data_loader", "ooxml_engine", "output_store", "template_cache", "text_fit",
+)
+
+
+def _import_modules() -> None:
+    for name in _WARM_MODULES:
+        importlib.import_module(name)
+
+
+def _load_mapping() -> None:
+    from main import load_join_config, load_mapping_config
+    load_mapping_config()
+    load_join_config()
+
+
+def _compile_templates() -> int:
+    import template_cache
+    compiled = 0
+    for path in template_paths():
+        try:
+            template_cache.get_compiled_template(path.read_bytes())
+            compiled += 1
+        except Exception as e:
+            log.warning("warmup_template_failed", path=str(path), error=str(e))
+    return compiled
+
+
+def run() -> None:
+    """Run every warm-up step in this thread."""
+    with _lock:
+        _state.update(state=RUNNING, pid=os.getpid(), steps={}, error=None)
+    started = time.perf_counter()
+    try:
+        with metrics.trace("warmup") as trace:
+            with metrics.span("imports"):
+                _import_modules()
+            with metrics.span("mapping"):
+                _load_mapping()
+            with metrics.span("templates"):
+                templates = _compile_templates()
+    except Exception as e:
+        log.exception("warmup_failed", error=str(e))
+        with _lock:
+            _state.update(state=FAILED, error=str(e))
+        return
+    with _lock:
+        _state.update(state=DONE, steps={k: round(v, 3) for k, v in trace.stages.items()}, templates=templates)
+    log.info("warmup_done", seconds=round(time.perf_counter() - started, 3), templates=templates,
+             **{f"{k}_s": round(v, 3) for k, v in trace.stages.items()})
+
+
+def start() -> threading.Thread | None:
+    """Start the warm-up in a daemon thread, once per process (if WARMUP allows it)."""
+    if not enabled():
+        return None
+    with _lock:
+        if _state["pid"] == os.getpid():
+            return None
+        _state.update(pid=os.getpid())
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def status() -> dict:
+    with _lock:
+        if _state["pid"] != os.getpid():
+            return {"state": PENDING if enabled() else "disabled"}
+        return {k: v for k, v in _state.items() if k != "pid"}
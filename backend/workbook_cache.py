@@ -0,0 +1,215 @@
+"""
+Cached workbooks with key indexes: rows by key, fields from related sheets.
+
+A workbook is loaded whole (every sheet) the first time its content hash is
+seen and kept in a bounded LRU cache (WORKBOOK_CACHE_SIZE env, default 4).
+The first sheet is the main data sheet. A stored dataset (datasets.py) is
+cached under its id, which is the same content hash.
+
+Each (sheet, column) used as a key gets a hash index, built once per cached
+workbook the first time it is needed: normalized cell value -> row positions.
+With it:
+- `find_row` selects a main-sheet row by key (e.g. candidate_id) in O(1)
+- `add_joined_columns` pulls fields from related sheets through the declared
+  joins, one dict lookup per row and field instead of a scan of the sheet
+
+Joined fields are named `sheet!column` (first related row) or
+`sheet[n]!column` (n-th related row, from 1), and a join is declared per
+related sheet: its rows whose `sheetColumn` equals the main row's
+`excelColumn` are the related rows.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# sheet!column or sheet[n]!column; sheet names cannot contain [ or ]
+_JOINED_FIELD = re.compile(r"^(?P<sheet>[^!\[\]]+?)(?:\[(?P<n>\d+)\])?!(?P<column>.+)$")
+
+
+class JoinedField(NamedTuple):
+    sheet: str
+    n: int  # 1-based position among the related rows
+    column: str
+
+
+class Join(NamedTuple):
+    """Rows of `sheet` whose `sheet_column` equals the main row's `excel_column`."""
+    sheet: str
+    sheet_column: str
+    excel_column: str
+
+
+def parse_joined_field(name: str) -> JoinedField | None:
+    """The JoinedField for 'sheet!column' / 'sheet[n]!column', else None (a plain column)."""
+    match = _JOINED_FIELD.match(name)
+    if match is None:
+        return None
+    n = int(match.group("n") or 1)
+    if n < 1:
+        return None
+    return JoinedField(match.group("sheet").strip(), n, match.group("column").strip())
+
+
+def parse_joins(config: list[dict]) -> dict[str, Join]:
+    """Join declarations from the mapping config, by sheet name."""
+    joins = {}
+    for item in config:
+        sheet = (item.get("sheet") or "").strip()
+        excel_column = (item.get("excelColumn") or "").strip()
+        if sheet and excel_column:
+            sheet_column = (item.get("sheetColumn") or "").strip() or excel_column
+            joins[sheet] = Join(sheet, sheet_column, excel_column)
+    return joins
+
+
+def _index_keys(values: np.ndarray) -> np.ndarray:
+    """Index keys for cell values: normalized text, NaN for empty cells."""
+    from main import normalize_values
+    return normalize_values(values, blank_as_missing=True)
+
+
+@dataclass
+class Workbook:
+    content_hash: str
+    sheets: dict[str, pd.DataFrame]
+    _indexes: dict[tuple[str, str], dict[str, list[int]]] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def main_sheet(self) -> str:
+        return next(iter(self.sheets))
+
+    @property
+    def main(self) -> pd.DataFrame:
+        return self.sheets[self.main_sheet]
+
+    def index(self, sheet: str, column: str) -> dict[str, list[int]]:
+        """Normalized value -> row positions for a column, built on first use."""
+        key = (sheet, column)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                return index
+        df = self.sheets[sheet]
+        index = {}
+        for position, value in enumerate(_index_keys(df[column].to_numpy(dtype=object))):
+            if isinstance(value, str):
+                index.setdefault(value, []).append(position)
+        with self._lock:
+            self._indexes[key] = index
+        return index
+
+    def find_row(self, column: str, value) -> int:
+        """Position of the first main-sheet row whose `column` equals `value`."""
+        from main import _normalize
+
+        if column not in self.main.columns:
+            raise ValueError(f"Unknown key column '{column}'.")
+        positions = self.index(self.main_sheet, column).get(_normalize(value))
+        if not positions:
+            raise ValueError(f"No row with {column} = '{value}'.")
+        return positions[0]
+
+    def add_joined_columns(self, rows: pd.DataFrame, fields: list[str], joins: dict[str, Join]) -> pd.DataFrame:
+        """
+        A copy of `rows` (main-sheet rows) with one column per joined field,
+        holding the related row's value or None when there is none. Fields of
+        an unknown sheet or column are left out, so they read as missing.
+        """
+        rows = rows.copy()
+        for name in fields:
+            joined = parse_joined_field(name)
+            join = joins.get(joined.sheet)
+            if join is None:
+                raise ValueError(f"No join declared for sheet '{joined.sheet}'.")
+            related = self.sheets.get(join.sheet)
+            if related is None or joined.column not in related.columns or join.excel_column not in rows.columns:
+                continue
+            if join.sheet_column not in related.columns:
+                raise ValueError(f"Join column '{join.sheet_column}' not found in sheet '{join.sheet}'.")
+            index = self.index(join.sheet, join.sheet_column)
+            source = related[joined.column].to_numpy(dtype=object)
+            values = []
+            for key in _index_keys(rows[join.excel_column].to_numpy(dtype=object)):
+                positions = index.get(key) if isinstance(key, str) else None
+                values.append(source[positions[joined.n - 1]] if positions and len(positions) >= joined.n else None)
+            rows[name] = pd.Series(values, index=rows.index, dtype=object)
+        return rows
+
+
+# ---------- LRU cache ----------
+_cache: "OrderedDict[str, Workbook]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_size() -> int:
+    try:
+        return max(1, int(os.environ.get("WORKBOOK_CACHE_SIZE", "4")))
+    except ValueError:
+        return 4
+
+
+def get_workbook(source, filename: str | None = None) -> Workbook:
+    """
+    Return the cached workbook for a path, bytes or seekable binary stream,
+    loading every sheet on first use.
+    """
+    import data_loader
+    import template_cache
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        from io import BytesIO
+        key = hashlib.sha256(source).hexdigest()
+        source = BytesIO(source)
+    elif hasattr(source, "read"):
+        key = template_cache.stream_hash(source)
+    else:
+        with open(source, "rb") as f:
+            key = template_cache.stream_hash(f)
+
+    def load() -> dict[str, pd.DataFrame]:
+        sheets = data_loader.load_sheets(source, filename)
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return sheets
+
+    return _cached(key, load)
+
+
+def get_dataset_workbook(dataset) -> Workbook:
+    """
+    Return the cached workbook for a stored dataset (datasets.Dataset). The
+    dataset id is the workbook's content hash, so the upload and the dataset
+    share one cache entry.
+    """
+    return _cached(dataset.id, dataset.load_sheets)
+
+
+def _cached(key: str, load) -> Workbook:
+    with _cache_lock:
+        workbook = _cache.get(key)
+        if workbook is not None:
+            _cache.move_to_end(key)
+            return workbook
+
+    workbook = Workbook(key, load())
+
+    with _cache_lock:
+        _cache[key] = workbook
+        _cache.move_to_end(key)
+        while len(_cache) > _cache_size():
+            _cache.popitem(last=False)
+    return workbook
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()